@@ -0,0 +1,83 @@
+import os
+import time
+import asyncio
+
+import numpy as np
+from dotenv import load_dotenv
+
+from azure.search.documents.aio import SearchClient as AsyncSearchClient
+from azure.search.documents.models import VectorizedQuery
+from azure.core.credentials import AzureKeyCredential as SearchKeyCredential
+
+from vector_index import LocalVectorIndex, DOC_FIELDS
+
+# ---------------------------------------------
+# Retrieval latency: local index vs Azure Search
+# ---------------------------------------------
+# Uses the stored document vectors (plus a little noise) as queries, so no
+# embedding calls are made and both backends see identical inputs.
+#   python bench_retrieval.py [n_queries]
+
+load_dotenv()
+
+LOCAL_INDEX_PATH = os.getenv("LOCAL_INDEX_PATH", "data/vector_index")
+K = int(os.getenv("BENCH_K", "5"))
+
+
+def summarize(name, samples_ms):
+    a = np.asarray(samples_ms)
+    print(
+        f"{name:>7}: n={len(a)}  mean={a.mean():.3f}ms  p50={np.percentile(a, 50):.3f}ms  "
+        f"p95={np.percentile(a, 95):.3f}ms  p99={np.percentile(a, 99):.3f}ms"
+    )
+
+
+def queries(index, n, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, len(index), size=n)
+    noise = rng.normal(0, 0.01, size=(n, index.vectors.shape[1])).astype(np.float32)
+    return np.asarray(index.vectors[rows]) + noise
+
+
+def bench_local(index, qs):
+    samples = []
+    for q in qs:
+        t0 = time.perf_counter()
+        index.search(q, k=K, select=DOC_FIELDS)
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    return samples
+
+
+async def bench_azure(qs):
+    client = AsyncSearchClient(
+        endpoint=os.getenv("AZURE_SEARCH_ENDPOINT"),
+        index_name=os.getenv("AZURE_SEARCH_INDEX_NAME"),
+        credential=SearchKeyCredential(os.getenv("AZURE_SEARCH_ADMIN_KEY")),
+    )
+    samples = []
+    async with client:
+        for q in qs:
+            t0 = time.perf_counter()
+            results = await client.search(
+                search_text="",
+                vector_queries=[VectorizedQuery(vector=q.tolist(), fields="contentVector", k_nearest_neighbors=K)],
+                select=DOC_FIELDS,
+            )
+            [r async for r in results]
+            samples.append((time.perf_counter() - t0) * 1000.0)
+    return samples
+
+
+if __name__ == "__main__":
+    import sys
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    index = LocalVectorIndex(LOCAL_INDEX_PATH)
+    qs = queries(index, n)
+    print(f"Index: {len(index)} docs x {index.vectors.shape[1]} dims, k={K}")
+
+    summarize("local", bench_local(index, qs))
+    if os.getenv("AZURE_SEARCH_ENDPOINT") and os.getenv("AZURE_SEARCH_ADMIN_KEY"):
+        summarize("azure", asyncio.run(bench_azure(qs)))
+    else:
+        print("  azure: skipped (AZURE_SEARCH_* not set)")
@@ -1,82 +1,336 @@
 import os
+import json
+import time
+import random
+import asyncio
+import hashlib
 from dotenv import load_dotenv
 
-from azure.search.documents import SearchClient
+import numpy as np
+from azure.search.documents.aio import SearchClient
 from azure.core.credentials import AzureKeyCredential as SearchKeyCredential
-from openai import AzureOpenAI
+from openai import AsyncAzureOpenAI
 
-from upload_rag_data import load_csv
+from upload_rag_data import iter_csv
+from response_cache import write_kb_version
+from vector_index import build as build_local_index
+from tokens import count_tokens
 
 # Load .env variables
 load_dotenv()
 
 # -----------------------------
-# Azure OpenAI Embeddings Client
+# Azure OpenAI Embeddings config
 # -----------------------------
 endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
 api_key = os.getenv("OPENAI_API_KEY")
 deployment_name = os.getenv("AZURE_OPENAI_EMBEDDINGS_DEPLOYMENT", "fraud-embed")
 api_version = os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-01")
 
-embed_client = AzureOpenAI(
-    api_version=api_version,
-    azure_endpoint=endpoint,
-    api_key=api_key
-)
-
 # -----------------------------
 # Azure Search config
 # -----------------------------
 search_endpoint = os.getenv("AZURE_SEARCH_ENDPOINT", "https://fraudsearch00.search.windows.net")
 admin_key = os.getenv("AZURE_SEARCH_ADMIN_KEY")
 index_name = "fraud-rag-index-v2"
+local_index_path = os.getenv("LOCAL_INDEX_PATH", "data/vector_index")
 
-search_client = SearchClient(
-    endpoint=search_endpoint,
-    index_name=index_name,
-    credential=SearchKeyCredential(admin_key)
-)
+# -----------------------------
+# Pipeline config
+# -----------------------------
+KB_CSV_PATH = os.getenv("KB_CSV_PATH", "data/rag_knowledge_base.csv")
+INGEST_STATE_DIR = os.getenv("INGEST_STATE_DIR", "data/ingest")
+EMBED_BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", "8000"))
+EMBED_BATCH_MAX_ROWS = int(os.getenv("EMBED_BATCH_MAX_ROWS", "128"))
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "4"))
+INGEST_MAX_RETRIES = int(os.getenv("INGEST_MAX_RETRIES", "5"))
+INGEST_BACKOFF_SEC = float(os.getenv("INGEST_BACKOFF_SEC", "1"))
 
 # -----------------------------
-# Embedding function (Foundry)
+# Ingestion state (manifest + vector spool)
 # -----------------------------
-def embed_batch(texts):
-    result = embed_client.embeddings.create(
-        model=deployment_name,
-        input=texts
-    )
-    return result.data[0].embedding if len(texts) == 1 else [item.embedding for item in result.data]
+# <INGEST_STATE_DIR>/<deployment>/
+#   manifest.jsonl   header {"spool", "dims"}, then one line per ingested row:
+#                    {"id", "hash", "offset", "doc"}; later lines win
+#   vectors.<n>.f32  raw float32 embeddings, row `offset` of the spool
+#
+# A row is appended only after its batch is embedded and uploaded, and
+# both files are fsynced per batch, so a crashed run resumes where it
+# stopped. Rows whose hash matches the manifest are skipped. Rows no longer
+# in the CSV are deleted from Azure Search and dropped from the manifest
+# (kept for a retry if the delete fails). The local vector index is rebuilt
+# from the spool at the end of every run.
+
+def row_hash(row):
+    raw = json.dumps(row, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(f"{index_name}\x00{raw}".encode("utf-8")).hexdigest()
+
+
+class IngestState:
+    def __init__(self, state_dir):
+        self.dir = state_dir
+        self.manifest_path = os.path.join(state_dir, "manifest.jsonl")
+        self.spool_name = "vectors.0.f32"
+        self.dims = None
+        self.entries = {}  # id -> manifest line
+        os.makedirs(state_dir, exist_ok=True)
+
+        if os.path.exists(self.manifest_path):
+            good = 0
+            with open(self.manifest_path, "rb") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break  # torn last line from a crash
+                    if "spool" in entry:
+                        self.spool_name, self.dims = entry["spool"], entry["dims"]
+                    else:
+                        self.entries[entry["id"]] = entry
+                    good += len(line)
+            # Drop the torn tail so new lines are not appended after it.
+            os.truncate(self.manifest_path, good)
+
+        self.n_vectors = 0
+        if self.dims and os.path.exists(self.spool_path):
+            self.n_vectors = os.path.getsize(self.spool_path) // (4 * self.dims)
+        self._manifest = open(self.manifest_path, "a", encoding="utf-8")
+        self._spool = open(self.spool_path, "ab")
+        # Anything past n_vectors * dims is a torn write; later appends overwrite
+        # it. Without a header no vector in the spool is referenced: start empty.
+        self._spool.truncate(self.n_vectors * 4 * self.dims if self.dims else 0)
+
+    @property
+    def spool_path(self):
+        return os.path.join(self.dir, self.spool_name)
+
+    def unchanged(self, row_id, h):
+        entry = self.entries.get(row_id)
+        return entry is not None and entry["hash"] == h
+
+    def record(self, docs, hashes, vectors):
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if self.dims is None:
+            self.dims = int(matrix.shape[1])
+            # Durable before any vector is, so offsets always have a known width.
+            self._write_line({"spool": self.spool_name, "dims": self.dims})
+            self._manifest.flush()
+            os.fsync(self._manifest.fileno())
+
+        self._spool.write(matrix.tobytes())
+        self._spool.flush()
+        os.fsync(self._spool.fileno())
+
+        for i, (doc, h) in enumerate(zip(docs, hashes)):
+            entry = {"id": doc["id"], "hash": h, "offset": self.n_vectors + i, "doc": doc}
+            self.entries[doc["id"]] = entry
+            self._manifest.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._manifest.flush()
+        os.fsync(self._manifest.fileno())
+        self.n_vectors += len(docs)
+
+    def _write_line(self, entry):
+        self._manifest.write(json.dumps(entry) + "\n")
+
+    def stale_ids(self, live_ids):
+        """Ingested rows that are no longer in the CSV."""
+        live = set(live_ids)
+        return [i for i in self.entries if i not in live]
+
+    def finish(self, live_ids, index_path, retain_ids=()):
+        """
+        Build the local index for the rows still in the CSV and compact the
+        spool if rows were edited or removed. retain_ids (removed rows whose
+        Azure Search delete failed) stay in the manifest, out of the index,
+        so the next run retries the delete. Returns the indexed row count.
+        """
+        self._spool.close()
+        self._manifest.close()
+        if self.dims is None:
+            return 0  # nothing ingested yet, so no index to build
+
+        ids = [i for i in live_ids if i in self.entries]
+        indexed = len(ids)
+        ids += [i for i in retain_ids if i in self.entries]
+        offsets = [self.entries[i]["offset"] for i in ids]
+        if offsets:
+            spool = np.memmap(self.spool_path, dtype=np.float32, mode="r").reshape(-1, self.dims)
+            vectors = np.asarray(spool[offsets])
+            del spool
+        else:
+            vectors = np.empty((0, self.dims), dtype=np.float32)
+        # Rebuilt even when empty, so rows removed from the CSV stop being served.
+        docs = [self.entries[i]["doc"] for i in ids[:indexed]]
+        build_local_index(docs, vectors[:indexed], index_path, deployment=deployment_name)
+
+        if len(ids) < self.n_vectors:
+            old_spool = self.spool_path
+            self.spool_name = f"vectors.{int(self.spool_name.split('.')[1]) + 1}.f32"
+            with open(self.spool_path, "wb") as f:
+                f.write(vectors.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+            # The manifest replace is the commit point; the old spool is unused after it.
+            tmp = self.manifest_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(json.dumps({"spool": self.spool_name, "dims": self.dims}) + "\n")
+                for offset, i in enumerate(ids):
+                    entry = dict(self.entries[i], offset=offset)
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.manifest_path)
+            os.remove(old_spool)
+        return indexed
 
 # -----------------------------
-# Upload to Azure Search
+# Batching, retries, progress
 # -----------------------------
-def upload_documents(docs):
-    batch = []
-    for doc in docs:
-        batch.append(doc)
-        if len(batch) == 10:
-            search_client.upload_documents(documents=batch)
-            batch = []
+def token_batches(rows, max_tokens, max_rows):
+    """Group rows so each embeddings call stays under the token budget."""
+    batch, tokens = [], 0
+    for row in rows:
+        n = count_tokens(row["content"])
+        if batch and (tokens + n > max_tokens or len(batch) >= max_rows):
+            yield batch
+            batch, tokens = [], 0
+        batch.append(row)
+        tokens += n
     if batch:
-        search_client.upload_documents(documents=batch)
+        yield batch
+
+
+async def with_retry(name, call):
+    for attempt in range(INGEST_MAX_RETRIES + 1):
+        try:
+            return await call()
+        except Exception as e:
+            if attempt == INGEST_MAX_RETRIES:
+                raise
+            delay = INGEST_BACKOFF_SEC * (2 ** attempt) * (0.5 + random.random())
+            print(f"{name} failed ({e}); retry {attempt + 1}/{INGEST_MAX_RETRIES} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+
+class Progress:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.seen = 0
+        self.skipped = 0
+        self.ingested = 0
+        self.failed = 0
+        self.deleted = 0
+
+    def rate(self):
+        return self.seen / max(time.perf_counter() - self.started, 1e-9)
+
+    def report(self, prefix="Progress"):
+        print(
+            f"{prefix}: {self.seen} rows ({self.skipped} unchanged, {self.ingested} ingested, "
+            f"{self.failed} failed, {self.deleted} deleted) - {self.rate():.1f} rows/sec"
+        )
 
 # -----------------------------
-# Main
+# Pipeline
 # -----------------------------
-def main():
-    rows = load_csv("data/rag_knowledge_base.csv")
-    contents = [r["content"] for r in rows]
+async def ingest(csv_path=KB_CSV_PATH):
+    state = IngestState(os.path.join(INGEST_STATE_DIR, deployment_name))
+    progress = Progress()
+    live_ids = []
+
+    def changed_rows():
+        for row in iter_csv(csv_path):
+            progress.seen += 1
+            live_ids.append(row["id"])
+            h = row_hash(row)
+            if state.unchanged(row["id"], h):
+                progress.skipped += 1
+                continue
+            row["_hash"] = h
+            yield row
+
+    embed_client = AsyncAzureOpenAI(api_version=api_version, azure_endpoint=endpoint, api_key=api_key)
+    search_client = SearchClient(
+        endpoint=search_endpoint,
+        index_name=index_name,
+        credential=SearchKeyCredential(admin_key),
+    )
 
-    print(f"Embedding {len(contents)} rows...")
+    async def embed(texts):
+        result = await embed_client.embeddings.create(model=deployment_name, input=texts)
+        return [item.embedding for item in sorted(result.data, key=lambda d: d.index)]
 
-    vectors = embed_batch(contents)
+    async def delete(ids):
+        results = await search_client.delete_documents(documents=[{"id": i} for i in ids])
+        failed = [r.key for r in results if not r.succeeded]
+        if failed:
+            raise RuntimeError(f"{len(failed)} deletes rejected, e.g. {failed[:3]}")
+
+    async def upload(docs):
+        results = await search_client.upload_documents(documents=docs)
+        failed = [r.key for r in results if not r.succeeded]
+        if failed:
+            raise RuntimeError(f"{len(failed)} documents rejected, e.g. {failed[:3]}")
+
+    async def process(batch):
+        try:
+            vectors = await with_retry("embed", lambda: embed([r["content"] for r in batch]))
+            hashes = [r.pop("_hash") for r in batch]
+            docs = [{k: v for k, v in r.items() if k != "content"} for r in batch]
+            await with_retry("upload", lambda: upload([dict(d, contentVector=v) for d, v in zip(docs, vectors)]))
+            state.record(docs, hashes, vectors)
+            progress.ingested += len(batch)
+        except Exception as e:
+            progress.failed += len(batch)
+            print(f"Batch of {len(batch)} rows failed after retries: {e}")
+        finally:
+            slots.release()
+        progress.report()
+
+    # The generator assembles the next batch before slots.acquire() returns,
+    # so at most INGEST_CONCURRENCY batches are in flight plus one waiting:
+    # INGEST_CONCURRENCY + 1 in memory, however large the CSV.
+    slots = asyncio.Semaphore(INGEST_CONCURRENCY)
+    tasks = set()
+    async with embed_client, search_client:
+        for batch in token_batches(changed_rows(), EMBED_BATCH_TOKENS, EMBED_BATCH_MAX_ROWS):
+            await slots.acquire()
+            task = asyncio.create_task(process(batch))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks)
+
+        # Rows removed from the CSV are removed from Azure Search too.
+        stale = state.stale_ids(live_ids)
+        undeleted = []
+        for start in range(0, len(stale), EMBED_BATCH_MAX_ROWS):
+            ids = stale[start:start + EMBED_BATCH_MAX_ROWS]
+            try:
+                await with_retry("delete", lambda: delete(ids))
+                progress.deleted += len(ids)
+            except Exception as e:
+                undeleted.extend(ids)
+                print(f"Deleting {len(ids)} removed rows failed after retries: {e}")
+
+    indexed = state.finish(live_ids, local_index_path, retain_ids=undeleted)
+    progress.report("Done")
+    print(f"Local vector index: {indexed} documents at {local_index_path}")
+    return progress
+
+# -----------------------------
+# Main
+# -----------------------------
+def main():
+    progress = asyncio.run(ingest())
 
-    for i, row in enumerate(rows):
-        row["contentVector"] = vectors[i]
-        del row["content"]
+    if progress.ingested or progress.deleted:
+        # Bump the knowledge base version so cached /explain and /search answers are dropped.
+        version = write_kb_version()
+        print(f"Knowledge base version: {version}")
 
-    upload_documents(rows)
-    print(f"Uploaded {len(rows)} documents to Azure Search")
+    if progress.failed:
+        raise SystemExit(f"{progress.failed} rows failed; re-run to resume")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,204 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Set, Tuple
+
+import numpy as np
+
+# ---------------------------------------------
+# Two-Tier Embedding Cache
+# ---------------------------------------------
+# Tier 1: in-memory LRU with size and TTL limits.
+# Tier 2: optional persistent SQLite store shared across restarts/workers.
+# Keys are the normalized text plus the embeddings deployment name, so a
+# model change never serves stale vectors. Vectors are float32 arrays.
+#
+# The async pipeline uses aget()/aput(), which keep SQLite off the event
+# loop: disk reads run in a worker thread and disk writes are write-behind.
+
+DISK_BUSY_TIMEOUT_SEC = float(os.getenv("EMBED_CACHE_DISK_BUSY_TIMEOUT_SEC", "5"))
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.split()).casefold()
+
+
+def cache_key(text: str, deployment: str) -> str:
+    raw = f"{deployment}\x00{normalize_text(text)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, max_items: int = 1024, ttl_sec: float = 86400.0, disk_path: Optional[str] = None):
+        self.max_items = max_items
+        self.ttl_sec = ttl_sec
+        self.disk_path = disk_path or None
+
+        self._mem: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (created, vector)
+        self._lock = threading.Lock()
+        # The disk tier has its own lock, so memory hits never wait on SQLite.
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._writes: Set[asyncio.Future] = set()
+
+        # stats
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.disk_errors = 0
+
+        if self.disk_path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.disk_path)), exist_ok=True)
+            # WAL lets readers in other workers proceed during a write; the
+            # busy timeout waits out the remaining writer-writer contention.
+            self._db = sqlite3.connect(self.disk_path, check_same_thread=False, timeout=DISK_BUSY_TIMEOUT_SEC)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings "
+                "(key TEXT PRIMARY KEY, created REAL NOT NULL, vector BLOB NOT NULL)"
+            )
+            self._db.commit()
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl_sec > 0 and now - created > self.ttl_sec
+
+    def _mem_get(self, key: str, now: float) -> Optional[np.ndarray]:
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is None:
+                return None
+            created, vector = entry
+            if not self._expired(created, now):
+                self._mem.move_to_end(key)
+                self.memory_hits += 1
+                return vector
+            del self._mem[key]
+            self.expirations += 1
+            return None
+
+    def _disk_get(self, key: str, now: float) -> Optional[np.ndarray]:
+        """Blocking SQLite read; called from a worker thread by aget()."""
+        try:
+            with self._db_lock:
+                row = self._db.execute("SELECT created, vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+                if row is not None and self._expired(row[0], now):
+                    self._db.execute("DELETE FROM embeddings WHERE key = ?", (key,))
+                    self._db.commit()
+                    self.expirations += 1
+                    row = None
+        except sqlite3.Error as e:
+            self.disk_errors += 1
+            print(f"Embedding cache disk read failed: {e}")
+            return None
+        if row is None:
+            return None
+        vector = np.frombuffer(row[1], dtype=np.float32)
+        with self._lock:
+            self._insert(key, row[0], vector)
+            self.disk_hits += 1
+        return vector
+
+    def _disk_put(self, key: str, created: float, blob: bytes):
+        """Blocking SQLite write; run in a worker thread by aput()."""
+        try:
+            with self._db_lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, created, vector) VALUES (?, ?, ?)",
+                    (key, created, blob),
+                )
+                self._db.commit()
+        except sqlite3.Error as e:
+            self.disk_errors += 1
+            print(f"Embedding cache disk write failed: {e}")
+
+    def _miss(self) -> None:
+        with self._lock:
+            self.misses += 1
+
+    def _prepare(self, text: str, deployment: str, vector) -> Tuple[str, float, np.ndarray]:
+        vector = np.asarray(vector, dtype=np.float32)
+        vector.setflags(write=False)
+        key = cache_key(text, deployment)
+        created = time.time()
+        with self._lock:
+            self._insert(key, created, vector)
+        return key, created, vector
+
+    def get(self, text: str, deployment: str) -> Optional[np.ndarray]:
+        """Blocking lookup, for sync callers (threadpool endpoints, scripts)."""
+        key = cache_key(text, deployment)
+        now = time.time()
+        vector = self._mem_get(key, now)
+        if vector is None and self._db is not None:
+            vector = self._disk_get(key, now)
+        if vector is None:
+            self._miss()
+        return vector
+
+    def put(self, text: str, deployment: str, vector) -> np.ndarray:
+        key, created, vector = self._prepare(text, deployment, vector)
+        if self._db is not None:
+            self._disk_put(key, created, vector.tobytes())
+        return vector
+
+    async def aget(self, text: str, deployment: str) -> Optional[np.ndarray]:
+        """get() for the event loop: memory hits inline, disk reads in a worker thread."""
+        key = cache_key(text, deployment)
+        now = time.time()
+        vector = self._mem_get(key, now)
+        if vector is None and self._db is not None:
+            vector = await asyncio.to_thread(self._disk_get, key, now)
+        if vector is None:
+            self._miss()
+        return vector
+
+    async def aput(self, text: str, deployment: str, vector) -> np.ndarray:
+        """
+        put() for the event loop. The memory tier is updated inline; the disk
+        write goes to a worker thread behind the caller (write-behind).
+        """
+        key, created, vector = self._prepare(text, deployment, vector)
+        if self._db is not None:
+            write = asyncio.get_running_loop().run_in_executor(None, self._disk_put, key, created, vector.tobytes())
+            self._writes.add(write)
+            write.add_done_callback(self._writes.discard)
+        return vector
+
+    def _insert(self, key: str, created: float, vector: np.ndarray):
+        self._mem[key] = (created, vector)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_items:
+            self._mem.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM embeddings")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "items": len(self._mem),
+            "max_items": self.max_items,
+            "ttl_sec": self.ttl_sec,
+            "disk_path": self.disk_path,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "disk_errors": self.disk_errors,
+            "disk_writes_pending": len(self._writes),
+            "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+        }
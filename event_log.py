@@ -0,0 +1,419 @@
+import math
+import os
+import re
+import threading
+import time
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+# ---------------------------------------------
+# Append-Only Columnar Event Log
+# ---------------------------------------------
+# Scored events and analyst actions are appended to in-memory buffers (a
+# list append on the event loop) and written out by flush(), which the app
+# runs in a worker thread, as Parquet segments:
+#   <dir>/events/events-<first_ms>-<last_ms>-<n>.parquet
+#   <dir>/actions/actions-<first_ms>-<last_ms>-<n>.parquet
+# The time range in the file name lets queries skip segments without
+# opening them; only the requested columns are read from the rest.
+# Runs of small segments are merged by compact() so the file count stays
+# manageable on a long-running backend.
+#
+# With several worker processes only one of them (writer=True) appends and
+# flushes; the others read the same directory and pick up new or compacted
+# segments with refresh() before each query.
+
+EVENT_SCHEMA = pa.schema([
+    ("event_id", pa.string()),
+    ("ts", pa.float64()),
+    ("risk_band", pa.string()),
+    ("decision", pa.string()),
+    ("fraud_probability", pa.float64()),
+    ("latency_ms", pa.float64()),
+    ("proposed", pa.string()),
+    ("source", pa.string()),
+    ("device_os", pa.string()),
+    ("payment_type", pa.string()),
+])
+
+ACTION_SCHEMA = pa.schema([
+    ("event_id", pa.string()),
+    ("ts", pa.float64()),
+    ("action", pa.string()),
+    ("notes", pa.string()),
+])
+
+EVENT_COLUMNS = EVENT_SCHEMA.names
+_SEGMENT = re.compile(r"^(events|actions)-(\d+)-(\d+)-(\d+)\.parquet$")
+
+
+def _str_or_none(v: Any) -> Optional[str]:
+    return None if v is None else str(v)
+
+
+class Segment:
+    def __init__(self, path: str, first_ts: float, last_ts: float, rows: int):
+        self.path = path
+        self.first_ts = first_ts
+        self.last_ts = last_ts
+        self.rows = rows
+
+
+class EventLog:
+    def __init__(
+        self,
+        path: str,
+        flush_interval_sec: float = 10.0,
+        flush_max_rows: int = 5000,
+        compact_min_segments: int = 16,
+        compact_target_rows: int = 200_000,
+        writer: bool = True,
+    ):
+        self.path = path
+        self.writer = writer
+        self.flush_interval_sec = flush_interval_sec
+        self.flush_max_rows = flush_max_rows
+        self.compact_min_segments = compact_min_segments
+        self.compact_target_rows = compact_target_rows
+
+        self._lock = threading.Lock()        # buffers + segment lists
+        self._flush_lock = threading.Lock()  # one flush/compaction at a time
+        self._events: List[Dict[str, Any]] = []
+        self._actions: List[Dict[str, Any]] = []
+        self._flushing_events: List[Dict[str, Any]] = []
+        self._flushing_actions: List[Dict[str, Any]] = []
+        self._last_flush = time.time()
+        self._seq = 0
+        self._pending_delete: List[str] = []
+
+        self.segments: Dict[str, List[Segment]] = {"events": [], "actions": []}
+        for kind in self.segments:
+            os.makedirs(os.path.join(path, kind), exist_ok=True)
+            self.segments[kind] = self._scan(kind)
+
+        # stats
+        self.events_written = 0
+        self.actions_written = 0
+        self.flushes = 0
+        self.flush_ms_last = 0.0
+        self.compactions = 0
+
+    def _scan(self, kind: str, known: Optional[Dict[str, Segment]] = None) -> List[Segment]:
+        out = []
+        folder = os.path.join(self.path, kind)
+        for name in os.listdir(folder):
+            m = _SEGMENT.match(name)
+            if not m or m.group(1) != kind:
+                continue
+            path = os.path.join(folder, name)
+            seg = (known or {}).get(path)
+            if seg is None:
+                try:
+                    rows = pq.ParquetFile(path).metadata.num_rows
+                except FileNotFoundError:
+                    continue  # compacted away by the writer meanwhile
+                seg = Segment(path, int(m.group(2)) / 1000.0, int(m.group(3)) / 1000.0, rows)
+            out.append(seg)
+            self._seq = max(self._seq, int(m.group(4)) + 1)
+        out.sort(key=lambda s: (s.first_ts, s.path))
+        return out
+
+    def refresh(self):
+        """Re-list segments written by another process (readers only)."""
+        for kind in self.segments:
+            with self._lock:
+                known = {s.path: s for s in self.segments[kind]}
+            segments = self._scan(kind, known)
+            with self._lock:
+                self.segments[kind] = segments
+
+    # -------- writes (event loop) --------
+    # The lock is only ever held for list swaps and copies, never for I/O.
+    def append_event(self, event: Dict[str, Any]):
+        with self._lock:
+            self._events.append(event)
+
+    def append_action(self, record: Dict[str, Any]):
+        with self._lock:
+            self._actions.append(record)
+
+    def due(self, now: float) -> bool:
+        if not self.writer:
+            return False
+        if not self._events and not self._actions:
+            return False
+        return len(self._events) >= self.flush_max_rows or now - self._last_flush >= self.flush_interval_sec
+
+    # -------- flush (worker thread) --------
+    def flush(self):
+        with self._flush_lock:
+            start = time.perf_counter()
+            with self._lock:
+                events, self._events = self._events, []
+                actions, self._actions = self._actions, []
+                self._flushing_events, self._flushing_actions = events, actions
+                self._last_flush = time.time()
+
+            events_done = actions_done = False
+            try:
+                # Publishing a segment and dropping its rows from the flushing
+                # buffer happen under one lock, so readers never see them twice.
+                if events:
+                    seg = self._write("events", self._event_table(events))
+                    with self._lock:
+                        self.segments["events"] = self.segments["events"] + [seg]
+                        self._flushing_events = []
+                    events_done = True
+                    self.events_written += len(events)
+                if actions:
+                    seg = self._write("actions", self._action_table(actions))
+                    with self._lock:
+                        self.segments["actions"] = self.segments["actions"] + [seg]
+                        self._flushing_actions = []
+                    actions_done = True
+                    self.actions_written += len(actions)
+            finally:
+                # A failed write keeps its rows buffered for the next flush.
+                with self._lock:
+                    if not events_done:
+                        self._events = events + self._events
+                    if not actions_done:
+                        self._actions = actions + self._actions
+                    self._flushing_events, self._flushing_actions = [], []
+
+            for path in self._pending_delete:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            self._pending_delete = []
+            for kind in self.segments:
+                self._compact(kind)
+
+            self.flushes += 1
+            self.flush_ms_last = (time.perf_counter() - start) * 1000.0
+
+    def _event_table(self, events: List[Dict[str, Any]]) -> pa.Table:
+        return pa.table({
+            "event_id": [e["event_id"] for e in events],
+            "ts": [e["ts"] for e in events],
+            "risk_band": [e["risk_band"] for e in events],
+            "decision": [e["decision"] for e in events],
+            "fraud_probability": [e["fraud_probability"] for e in events],
+            "latency_ms": [e["latency_ms"] for e in events],
+            "proposed": [_str_or_none(e.get("proposed")) for e in events],
+            "source": [_str_or_none(e.get("source")) for e in events],
+            "device_os": [_str_or_none(e.get("device_os")) for e in events],
+            "payment_type": [_str_or_none(e.get("payment_type")) for e in events],
+        }, schema=EVENT_SCHEMA)
+
+    def _action_table(self, actions: List[Dict[str, Any]]) -> pa.Table:
+        return pa.table({
+            "event_id": [a["event_id"] for a in actions],
+            "ts": [a["ts"] for a in actions],
+            "action": [a["action"] for a in actions],
+            "notes": [a.get("notes") for a in actions],
+        }, schema=ACTION_SCHEMA)
+
+    def _write(self, kind: str, table: pa.Table) -> Segment:
+        """Write a segment file; the caller publishes it in self.segments."""
+        ts = table.column("ts")
+        first, last = pc.min(ts).as_py(), pc.max(ts).as_py()
+        name = f"{kind}-{math.floor(first * 1000)}-{math.ceil(last * 1000)}-{self._seq}.parquet"
+        self._seq += 1
+        path = os.path.join(self.path, kind, name)
+        tmp = path + ".tmp"
+        pq.write_table(table, tmp, compression="zstd")
+        os.replace(tmp, path)
+        return Segment(path, first, last, table.num_rows)
+
+    def _compact(self, kind: str):
+        """Merge the oldest run of small segments into one."""
+        run: List[Segment] = []
+        for seg in self.segments[kind]:
+            if seg.rows >= self.compact_target_rows // 2:
+                if len(run) >= self.compact_min_segments:
+                    break
+                run = []
+                continue
+            run.append(seg)
+            if sum(s.rows for s in run) >= self.compact_target_rows:
+                break
+        if len(run) < self.compact_min_segments:
+            return
+
+        merged = self._write(kind, pa.concat_tables(pq.read_table(s.path) for s in run))
+        with self._lock:
+            keep = [s for s in self.segments[kind] if s not in run]
+            self.segments[kind] = sorted(keep + [merged], key=lambda s: (s.first_ts, s.path))
+        # Deleted on the next flush, so queries that listed them can finish.
+        self._pending_delete.extend(s.path for s in run)
+        self.compactions += 1
+
+    # -------- queries (any thread) --------
+    def _buffered(self, kind: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            if kind == "events":
+                return self._flushing_events + self._events
+            return self._flushing_actions + self._actions
+
+    def query(self, *args, **kwargs) -> Tuple[List[Dict[str, Any]], Optional[Tuple[float, str]]]:
+        if self.writer:
+            return self._query(*args, **kwargs)
+        self.refresh()
+        try:
+            return self._query(*args, **kwargs)
+        except FileNotFoundError:
+            # A segment was compacted away mid-query; its merged file is listed now.
+            self.refresh()
+            return self._query(*args, **kwargs)
+
+    def _query(
+        self,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        risk_bands: Optional[Sequence[str]] = None,
+        decisions: Optional[Sequence[str]] = None,
+        limit: int = 100,
+        cursor: Optional[Tuple[float, str]] = None,
+        columns: Optional[Sequence[str]] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[Tuple[float, str]]]:
+        """
+        Events newest first. cursor is (ts, event_id) of the last row of the
+        previous page; returns (rows, next cursor or None).
+        """
+        columns = [c for c in (columns or EVENT_COLUMNS) if c in EVENT_COLUMNS]
+        read_cols = list(dict.fromkeys(columns + ["event_id", "ts"]
+                                       + (["risk_band"] if risk_bands else [])
+                                       + (["decision"] if decisions else [])))
+        upper = until
+        if cursor is not None:
+            upper = cursor[0] if upper is None else min(upper, cursor[0])
+
+        def matching(table: pa.Table) -> pa.Table:
+            mask = None
+
+            def both(m, cond):
+                return cond if m is None else pc.and_(m, cond)
+
+            ts = table.column("ts")
+            if since is not None:
+                mask = both(mask, pc.greater_equal(ts, since))
+            if until is not None:
+                mask = both(mask, pc.less_equal(ts, until))
+            if cursor is not None:
+                before = pc.or_(
+                    pc.less(ts, cursor[0]),
+                    pc.and_(pc.equal(ts, cursor[0]), pc.less(table.column("event_id"), cursor[1])),
+                )
+                mask = both(mask, before)
+            if risk_bands:
+                mask = both(mask, pc.is_in(table.column("risk_band"), pa.array(list(risk_bands))))
+            if decisions:
+                mask = both(mask, pc.is_in(table.column("decision"), pa.array(list(decisions))))
+            return table if mask is None else table.filter(mask)
+
+        parts: List[pa.Table] = []
+        found = 0
+
+        buffered = self._buffered("events")
+        if buffered:
+            table = self._event_table(buffered).select(read_cols)
+            part = matching(table)
+            parts.append(part)
+            found += part.num_rows
+
+        with self._lock:
+            segments = list(self.segments["events"])
+        for seg in sorted(segments, key=lambda s: s.last_ts, reverse=True):
+            # Segments are written in time order: once a page (plus the one
+            # row that proves there is a next page) is collected, any segment
+            # that ends before its oldest row cannot contribute.
+            if found > limit and parts:
+                oldest = _page_floor(parts, limit + 1)
+                if seg.last_ts < oldest:
+                    break
+            if since is not None and seg.last_ts < since:
+                continue
+            if upper is not None and seg.first_ts > upper:
+                continue
+            part = matching(pq.read_table(seg.path, columns=read_cols))
+            if part.num_rows:
+                parts.append(part)
+                found += part.num_rows
+
+        if not parts:
+            return [], None
+        table = pa.concat_tables(parts)
+        if not table.num_rows:
+            return [], None
+        order = pc.sort_indices(table, sort_keys=[("ts", "descending"), ("event_id", "descending")])
+        table = table.take(order.slice(0, limit + 1))
+
+        rows = table.slice(0, limit).to_pylist()
+        next_cursor = None
+        if table.num_rows > limit:
+            next_cursor = (rows[-1]["ts"], rows[-1]["event_id"])
+        for row in rows:
+            for c in set(row) - set(columns):
+                del row[c]
+        return rows, next_cursor
+
+    def actions_for(self, event_ids: Sequence[str]) -> Dict[str, str]:
+        """Latest analyst action per event id (buffered + flushed)."""
+        if not event_ids:
+            return {}
+        if not self.writer:
+            self.refresh()
+        wanted = pa.array(list(set(event_ids)))
+        latest: Dict[str, Tuple[float, str]] = {}
+
+        with self._lock:
+            segments = list(self.segments["actions"])
+        for seg in segments:
+            table = pq.read_table(seg.path, columns=["event_id", "ts", "action"])
+            table = table.filter(pc.is_in(table.column("event_id"), wanted))
+            for row in table.to_pylist():
+                prev = latest.get(row["event_id"])
+                if prev is None or row["ts"] >= prev[0]:
+                    latest[row["event_id"]] = (row["ts"], row["action"])
+
+        ids = set(event_ids)
+        for a in self._buffered("actions"):
+            if a["event_id"] in ids:
+                prev = latest.get(a["event_id"])
+                if prev is None or a["ts"] >= prev[0]:
+                    latest[a["event_id"]] = (a["ts"], a["action"])
+        return {k: v[1] for k, v in latest.items()}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            segments = {k: list(v) for k, v in self.segments.items()}
+            buffered = len(self._events) + len(self._flushing_events)
+        return {
+            "path": self.path,
+            "writer": self.writer,
+            "buffered_events": buffered,
+            "buffered_actions": len(self._actions),
+            "events_written": self.events_written,
+            "actions_written": self.actions_written,
+            "segments": {k: len(v) for k, v in segments.items()},
+            "rows_on_disk": {k: sum(s.rows for s in v) for k, v in segments.items()},
+            "bytes_on_disk": {
+                k: sum(os.path.getsize(s.path) for s in v if os.path.exists(s.path))
+                for k, v in segments.items()
+            },
+            "flushes": self.flushes,
+            "flush_ms_last": round(self.flush_ms_last, 2),
+            "compactions": self.compactions,
+        }
+
+
+def _page_floor(parts: List[pa.Table], n: int) -> float:
+    """ts of the n-th newest row collected so far."""
+    ts = np.concatenate([p.column("ts").to_numpy() for p in parts])
+    return float(np.partition(ts, len(ts) - n)[len(ts) - n])
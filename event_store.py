@@ -0,0 +1,118 @@
+import os
+import sys
+import time
+from collections import OrderedDict, deque
+from itertools import islice
+from typing import Dict, Any, List, Optional
+
+# ---------------------------------------------
+# Bounded Event Store
+# ---------------------------------------------
+# Scored events indexed by event_id in arrival order, so analyst actions
+# are applied in O(1) and eviction pops from the old end. Retention is
+# bounded by count (max_events) and age (max_age_sec); an action for an
+# event that has aged out is still kept in the action log.
+
+SIZE_SAMPLE = 32
+
+
+def _approx_size(obj: Any) -> int:
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_approx_size(k) + _approx_size(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(_approx_size(v) for v in obj)
+    return size
+
+
+class EventStore:
+    def __init__(self, max_events: int = 10000, max_age_sec: float = 3600.0, max_actions: int = 500):
+        self.max_events = max_events
+        self.max_age_sec = max_age_sec
+
+        self._events: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.actions: deque = deque(maxlen=max_actions)  # newest first
+
+        # stats
+        self.added = 0
+        self.evicted_count = 0
+        self.evicted_age = 0
+        self.actions_applied = 0
+        self.actions_missed = 0
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def _evict(self, now: float):
+        while len(self._events) > self.max_events:
+            self._events.popitem(last=False)
+            self.evicted_count += 1
+        cutoff = now - self.max_age_sec
+        while self._events:
+            oldest = next(iter(self._events.values()))
+            if oldest["ts"] >= cutoff:
+                break
+            self._events.popitem(last=False)
+            self.evicted_age += 1
+
+    def clear(self):
+        self._events.clear()
+        self.actions.clear()
+
+    def add(self, event: Dict[str, Any]):
+        self._events[event["event_id"]] = event
+        self.added += 1
+        self._evict(event["ts"])
+
+    def get(self, event_id: str) -> Optional[Dict[str, Any]]:
+        return self._events.get(event_id)
+
+    def recent(self, n: int) -> List[Dict[str, Any]]:
+        """Newest first."""
+        return list(islice(reversed(self._events.values()), n))
+
+    def apply_action(self, record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Log the action and mark its event; returns the event if still retained."""
+        self.actions.appendleft(record)
+        event = self._events.get(record["event_id"])
+        if event is None:
+            self.actions_missed += 1
+            return None
+        event["analyst_action"] = record["action"]
+        self.actions_applied += 1
+        return event
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        self._evict(now)
+
+        sample = self.recent(SIZE_SAMPLE)
+        per_event = sum(_approx_size(e) for e in sample) / len(sample) if sample else 0.0
+        actions_bytes = sum(_approx_size(a) for a in self.actions)
+        oldest = next(iter(self._events.values()), None)
+        return {
+            "events": len(self._events),
+            "max_events": self.max_events,
+            "max_age_sec": self.max_age_sec,
+            "oldest_age_sec": round(now - oldest["ts"], 1) if oldest else None,
+            "added": self.added,
+            "evicted_count": self.evicted_count,
+            "evicted_age": self.evicted_age,
+            "actions": len(self.actions),
+            "actions_applied": self.actions_applied,
+            "actions_missed": self.actions_missed,
+            "memory": {
+                "approx_event_bytes": int(per_event),
+                "approx_events_bytes": int(per_event * len(self._events)),
+                "approx_actions_bytes": actions_bytes,
+                "process_rss_bytes": _process_rss(),
+            },
+        }
+
+
+def _process_rss() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
@@ -0,0 +1,129 @@
+import math
+import threading
+from typing import Dict, Any, List, Sequence, Iterable
+
+import numpy as np
+
+# ---------------------------------------------
+# Precompiled Feature Encoder
+# ---------------------------------------------
+# Maps raw feature dicts straight onto the model's column layout
+# (feature_columns.joblib) without building a DataFrame per call.
+#
+# One-hot columns follow pd.get_dummies(..., drop_first=True) as it was
+# applied to the training frame: every category that has a column sets it
+# to 1, while the dropped reference level and categories never seen in
+# training encode as all zeros.
+
+
+class FeatureEncoder:
+    def __init__(self, feature_columns: Sequence[str], cat_cols: Sequence[str]):
+        self.feature_columns = list(feature_columns)
+        self.cat_cols = list(cat_cols)
+        self.n_features = len(self.feature_columns)
+
+        # category -> column index, per categorical column
+        self.category_index: Dict[str, Dict[str, int]] = {c: {} for c in self.cat_cols}
+        # (raw feature name, column index) for everything that is not a dummy
+        self.numeric_index: List[tuple] = []
+
+        # Longest prefix first so e.g. "device_os_" wins over a shorter match.
+        prefixes = sorted(self.cat_cols, key=len, reverse=True)
+        for i, name in enumerate(self.feature_columns):
+            owner = next((c for c in prefixes if name.startswith(c + "_")), None)
+            if owner is None:
+                self.numeric_index.append((name, i))
+            else:
+                self.category_index[owner][name[len(owner) + 1:]] = i
+
+        self._local = threading.local()
+
+    def _row_buffer(self) -> np.ndarray:
+        # One preallocated row per thread: sync endpoints run in a threadpool.
+        buf = getattr(self._local, "row", None)
+        if buf is None:
+            buf = np.zeros((1, self.n_features), dtype=np.float32)
+            self._local.row = buf
+        return buf
+
+    def encode_into(self, features: Dict[str, Any], out: np.ndarray) -> np.ndarray:
+        """
+        Write one feature dict into a preallocated float32 row.
+        Absent numeric features are 0 (same as reindex(fill_value=0));
+        explicit None is treated as missing (NaN) like an empty CSV cell.
+        """
+        out.fill(0.0)
+
+        for name, i in self.numeric_index:
+            if name not in features:
+                continue
+            value = features[name]
+            out[i] = np.nan if value is None else float(value)
+
+        for c in self.cat_cols:
+            i = self.category_index[c].get(_category_key(features.get(c)))
+            if i is not None:
+                out[i] = 1.0
+
+        return out
+
+    def encode_one(self, features: Dict[str, Any]) -> np.ndarray:
+        """
+        Encode a single transaction into a (1, n_features) float32 matrix.
+        The returned array is reused by the next call on the same thread.
+        """
+        row = self._row_buffer()
+        self.encode_into(features, row[0])
+        return row
+
+    def encode_many(self, rows: Iterable[Dict[str, Any]]) -> np.ndarray:
+        """
+        Encode a list of transactions into a fresh (n_rows, n_features) matrix.
+        """
+        rows = list(rows)
+        X = np.zeros((len(rows), self.n_features), dtype=np.float32)
+        for r, features in enumerate(rows):
+            self.encode_into(features, X[r])
+        return X
+
+    def encode_columns(self, columns: Dict[str, Sequence[Any]]) -> np.ndarray:
+        """
+        Encode a columnar body ({feature: [v0, v1, ...]}) in one pass per column.
+        All columns must have the same length.
+        """
+        lengths = {len(v) for v in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError("All columns must have the same length.")
+        n_rows = lengths.pop() if lengths else 0
+
+        X = np.zeros((n_rows, self.n_features), dtype=np.float32)
+
+        for name, i in self.numeric_index:
+            values = columns.get(name)
+            if values is None:
+                continue
+            X[:, i] = np.asarray(
+                [np.nan if v is None else v for v in values], dtype=np.float64
+            )
+
+        rows = np.arange(n_rows)
+        for c in self.cat_cols:
+            values = columns.get(c)
+            if values is None:
+                continue
+            lookup = self.category_index[c]
+            idx = np.fromiter(
+                (lookup.get(_category_key(v), -1) for v in values),
+                dtype=np.int64,
+                count=n_rows,
+            )
+            hit = idx >= 0
+            X[rows[hit], idx[hit]] = 1.0
+
+        return X
+
+
+def _category_key(value: Any) -> Any:
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return "unknown"
+    return str(value)
@@ -3,10 +3,26 @@ import { type KPIs, type FraudEvent } from '@shared/schema';
 
 // Define the shape of messages we expect from the backend
 type WebSocketMessage = 
-  | { type: 'snapshot'; kpis: KPIs; recent_events: FraudEvent[] }
-  | { type: 'tick'; kpis: KPIs; event: FraudEvent };
+  | { type: 'snapshot'; stream: string; seq: number; kpis: KPIs; recent_events: FraudEvent[] }
+  | { type: 'resume'; stream: string; since: number; seq: number }
+  | { type: 'tick'; seq: number; kpis: KPIs; event: FraudEvent }
+  | { type: 'frame'; seq: number; kpis: KPIs; events: FraudEvent[] };
 
 const THROTTLE_INTERVAL_MS = 1500;
+const RETRY_INTERVALS_MS = [1000, 2000, 5000, 10000, 30000];
+
+const mapEvent = (ev: any): FraudEvent => ({
+  id: ev.event_id || ev.id || `${ev.ts}-${ev.source}-${ev.device_os}`,
+  timestamp: ev.ts ? new Date(ev.ts * 1000).toISOString() : (ev.timestamp || new Date().toISOString()),
+  riskBand: ev.risk_band || 'N/A',
+  decision: ev.decision || 'N/A',
+  fraudProbability: ev.fraud_probability ?? 0,
+  latencyMs: ev.latency_ms ?? 0,
+  source: ev.source || 'Unknown',
+  deviceOs: ev.device_os || 'Unknown',
+  paymentType: ev.payment_type || 'Unknown',
+  analystAction: ev.analyst_action || null,
+});
 
 export function useWebSocket() {
   const [isConnected, setIsConnected] = useState(false);
@@ -21,19 +37,28 @@ export function useWebSocket() {
   const reconnectTimeoutRef = useRef<NodeJS.Timeout>();
   const eventQueueRef = useRef<FraudEvent[]>([]);
   const throttleIntervalRef = useRef<NodeJS.Timeout>();
+  // Where we are in the server's stream, so a reconnect only asks for what it missed.
+  const streamRef = useRef<string | null>(null);
+  const lastSeqRef = useRef<number | null>(null);
+  const retryCountRef = useRef(0);
 
   const connect = () => {
     // Read backend URL from environment or fallback to current host
-    const wsUrl = import.meta.env.VITE_BACKEND_WS_URL || 
+    const baseWsUrl = import.meta.env.VITE_BACKEND_WS_URL || 
                  "wss://fraud-backend.ashybeach-527389a2.eastus2.azurecontainerapps.io/ws";
 
+    // Ask for batched frames instead of one message per event.
+    const url = new URL(baseWsUrl);
+    url.searchParams.set('mode', 'frame');
+    if (streamRef.current && lastSeqRef.current !== null) {
+      url.searchParams.set('stream', streamRef.current);
+      url.searchParams.set('since', String(lastSeqRef.current));
+    }
+    const wsUrl = url.toString();
+
     console.log("Connecting to WebSocket:", wsUrl);
     const ws = new WebSocket(wsUrl);
 
-    // Reconnection logic state
-    const retryIntervals = [1000, 2000, 5000];
-    const retryCountRef = { current: 0 };
-
     ws.onopen = () => {
       setIsConnected(true);
       retryCountRef.current = 0;
@@ -45,10 +70,11 @@ export function useWebSocket() {
       console.warn("⚠️ WebSocket closed", e);
       console.log('WebSocket disconnected, attempting reconnect...');
       
-      const interval = retryIntervals[Math.min(retryCountRef.current, retryIntervals.length - 1)];
+      // Back off, with jitter so many dashboards do not reconnect in lockstep.
+      const base = RETRY_INTERVALS_MS[Math.min(retryCountRef.current, RETRY_INTERVALS_MS.length - 1)];
       retryCountRef.current++;
-      
-      reconnectTimeoutRef.current = setTimeout(connect, interval);
+
+      reconnectTimeoutRef.current = setTimeout(connect, base * (0.5 + Math.random()));
     };
 
     ws.onerror = (error) => {
@@ -61,40 +87,32 @@ export function useWebSocket() {
         const data = JSON.parse(event.data);
         console.log('Incoming WebSocket message:', data);
 
+        if (typeof data.seq === 'number' && data.type !== 'snapshot' && data.type !== 'resume') {
+          // Already seen (e.g. replayed after a snapshot that included it).
+          if (lastSeqRef.current !== null && data.seq <= lastSeqRef.current) return;
+          lastSeqRef.current = data.seq;
+        }
+
         if (data.type === 'snapshot') {
+          streamRef.current = data.stream ?? null;
+          lastSeqRef.current = data.seq ?? null;
           setKpis(data.kpis);
           eventQueueRef.current = [];
-          const mappedEvents = (data.recent_events || []).map((ev: any) => ({
-            id: ev.event_id || ev.id || `${ev.ts}-${ev.source}-${ev.device_os}`,
-            timestamp: ev.ts ? new Date(ev.ts * 1000).toISOString() : (ev.timestamp || new Date().toISOString()),
-            riskBand: ev.risk_band || 'N/A',
-            decision: ev.decision || 'N/A',
-            fraudProbability: ev.fraud_probability ?? 0,
-            latencyMs: ev.latency_ms ?? 0,
-            source: ev.source || 'Unknown',
-            deviceOs: ev.device_os || 'Unknown',
-            paymentType: ev.payment_type || 'Unknown',
-            analystAction: ev.analyst_action || null,
-          }));
+          const mappedEvents = (data.recent_events || []).map(mapEvent);
           setEvents(mappedEvents.slice(0, 50));
+        } else if (data.type === 'resume') {
+          // Missed messages follow; current state is kept.
+          streamRef.current = data.stream;
         } else if (data.type === 'tick') {
           setKpis(data.kpis);
           if (data.event) {
-            const mappedEvent: FraudEvent = {
-              id: data.event.event_id || data.event.id || `${data.event.ts}-${data.event.source}-${data.event.device_os}`,
-              timestamp: data.event.ts ? new Date(data.event.ts * 1000).toISOString() : (data.event.timestamp || new Date().toISOString()),
-              riskBand: data.event.risk_band || 'N/A',
-              decision: data.event.decision || 'N/A',
-              fraudProbability: data.event.fraud_probability ?? 0,
-              latencyMs: data.event.latency_ms ?? 0,
-              source: data.event.source || 'Unknown',
-              deviceOs: data.event.device_os || 'Unknown',
-              paymentType: data.event.payment_type || 'Unknown',
-              analystAction: data.event.analyst_action || null,
-            };
-
-            eventQueueRef.current.push(mappedEvent);
+            eventQueueRef.current.push(mapEvent(data.event));
           }
+        } else if (data.type === 'frame') {
+          setKpis(data.kpis);
+          // Frames list events newest first; the queue plays oldest first.
+          const frameEvents = (data.events || []).map(mapEvent).reverse();
+          eventQueueRef.current.push(...frameEvents);
         }
       } catch (err) {
         console.error('Failed to parse WS message:', err);
@@ -1,3 +1,14 @@
+import csv
+import json
+import os
+import tempfile
+import threading
+from typing import Dict, Any, List, Optional, Callable, Sequence, Tuple
+
+import numpy as np
+
+from embedding_cache import cache_key
+
 # ---------------------------------------------
 # Historical Fraud Cases for RAG Ingestion
 # ---------------------------------------------
@@ -63,4 +74,145 @@ historical_cases_store = [
         "details": "Two transactions within 10 minutes: one in Texas, one in New York. Impossible travel time.",
         "decision": "Flagged as fraud due to impossible travel velocity."
     }
-]
\ No newline at end of file
+]
+
+
+# ---------------------------------------------
+# Indexed Historical Case Store
+# ---------------------------------------------
+# Cases keyed by case_id (O(1) lookup) plus one unit-normalized embedding
+# per case (summary + details) for top-k similarity when no case_id is
+# linked. Cases load from .jsonl / .json / .csv with the columns
+# case_id, summary, details, decision; the ten cases above are the default.
+#
+# Embeddings are computed once and persisted next to the case file as
+# <vectors_path>, keyed by case text and embeddings deployment, so restarts
+# only embed new or edited cases. The file is an .npz holding the keys and
+# the float32 matrix together, replaced in one os.replace: keys can never be
+# paired with another write's rows.
+
+CASE_FIELDS = ["case_id", "summary", "details", "decision"]
+
+
+def load_cases(path: str) -> List[Dict[str, Any]]:
+    if path.endswith(".jsonl"):
+        with open(path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    if path.endswith(".json"):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    with open(path, newline="", encoding="utf-8") as f:
+        return [{k: r.get(k, "") for k in CASE_FIELDS} for r in csv.DictReader(f)]
+
+
+def case_text(case: Dict[str, Any]) -> str:
+    return f"{case.get('summary', '')} {case.get('details', '')}".strip()
+
+
+def load_vectors(vectors_path: str) -> Dict[str, np.ndarray]:
+    """Persisted {key: vector}; empty if missing or in the old two-file format."""
+    try:
+        stored = np.load(vectors_path)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(stored, np.lib.npyio.NpzFile):
+        return {}
+    with stored:
+        keys = stored["keys"].tolist()
+        vectors = stored["vectors"]
+    if len(keys) != len(vectors):
+        print(f"Ignoring case embeddings at {vectors_path}: keys do not match the vectors")
+        return {}
+    return dict(zip(keys, vectors))
+
+
+def save_vectors(vectors_path: str, keys: List[str], matrix: np.ndarray):
+    """Keys and matrix in one file, swapped in with a single os.replace."""
+    directory = os.path.dirname(os.path.abspath(vectors_path))
+    os.makedirs(directory, exist_ok=True)
+    # A unique temp file per writer: workers embedding at the same time never
+    # rename each other's half-written output into place.
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".cases-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, keys=np.array(keys), vectors=matrix)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, vectors_path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+class HistoricalCaseStore:
+    def __init__(self, cases: Sequence[Dict[str, Any]]):
+        self.cases: List[Dict[str, Any]] = list(cases)
+        self.by_id: Dict[str, Dict[str, Any]] = {c["case_id"]: c for c in self.cases}
+        self.vectors: Optional[np.ndarray] = None  # (n_cases, dims), unit rows
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path: Optional[str]) -> "HistoricalCaseStore":
+        if path and os.path.exists(path):
+            return cls(load_cases(path))
+        return cls(historical_cases_store)
+
+    def __len__(self) -> int:
+        return len(self.cases)
+
+    def get(self, case_id: str) -> Optional[Dict[str, Any]]:
+        return self.by_id.get(case_id)
+
+    @property
+    def searchable(self) -> bool:
+        return self.vectors is not None
+
+    def ensure_embeddings(
+        self,
+        embed_texts: Callable[[List[str]], List[Sequence[float]]],
+        deployment: str,
+        vectors_path: Optional[str] = None,
+        batch_size: int = 256,
+    ) -> int:
+        """
+        Load persisted case embeddings and embed only the missing ones.
+        Returns the number of cases embedded by this call.
+        """
+        keys = [cache_key(case_text(c), deployment) for c in self.cases]
+        known = load_vectors(vectors_path) if vectors_path else {}
+
+        missing = [i for i, k in enumerate(keys) if k not in known]
+        for start in range(0, len(missing), batch_size):
+            chunk = missing[start:start + batch_size]
+            vectors = embed_texts([case_text(self.cases[i]) for i in chunk])
+            for i, v in zip(chunk, vectors):
+                known[keys[i]] = np.asarray(v, dtype=np.float32)
+
+        if not self.cases:
+            return 0
+        matrix = np.stack([np.asarray(known[k], dtype=np.float32) for k in keys])
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix /= norms
+
+        if vectors_path and missing:
+            save_vectors(vectors_path, keys, matrix)
+
+        with self._lock:
+            self.vectors = matrix
+        return len(missing)
+
+    def similar(self, query_vector, k: int = 3) -> List[Tuple[Dict[str, Any], float]]:
+        """Top-k cases by cosine similarity; empty until embeddings are loaded."""
+        vectors = self.vectors
+        if vectors is None or not len(vectors) or k <= 0:
+            return []
+
+        q = np.asarray(query_vector, dtype=np.float32)
+        norm = float(np.linalg.norm(q))
+        sims = vectors @ (q / norm if norm else q)
+
+        k = min(k, len(sims))
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top], kind="stable")]
+        return [(self.cases[int(i)], float(sims[i])) for i in top]
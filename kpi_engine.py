@@ -0,0 +1,210 @@
+import math
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+# ---------------------------------------------
+# Incremental KPI Engine
+# ---------------------------------------------
+# Per-second buckets in a ring sized to the longest window. Every window keeps
+# running totals (counts by risk band, latency sum, latency sketch): a record
+# adds to each total, and a bucket leaving a window is subtracted once.
+# Latency percentiles come from a log-bucketed histogram sketch, which merges
+# by plain addition, so windows and buckets combine without keeping raw samples.
+
+WINDOWS = {"1m": 60, "5m": 300, "15m": 900, "1h": 3600}
+
+
+class LatencySketch:
+    """
+    Fixed log-scale bins: bin i covers [min_ms * gamma^i, min_ms * gamma^(i+1)).
+    Relative error of a reported percentile is about (gamma - 1) / 2.
+    """
+
+    def __init__(self, min_ms: float = 0.01, max_ms: float = 60000.0, gamma: float = 1.08):
+        self.min_ms = min_ms
+        self.gamma = gamma
+        self._log_gamma = math.log(gamma)
+        self.n_bins = int(math.ceil(math.log(max_ms / min_ms) / self._log_gamma)) + 1
+
+    def bin(self, value_ms: float) -> int:
+        if value_ms <= self.min_ms:
+            return 0
+        i = int(math.log(value_ms / self.min_ms) / self._log_gamma)
+        return min(i, self.n_bins - 1)
+
+    def value(self, i: int) -> float:
+        # Geometric midpoint of the bin.
+        return self.min_ms * self.gamma ** (i + 0.5)
+
+    def quantile(self, counts: np.ndarray, q: float) -> float:
+        total = int(counts.sum())
+        if total == 0:
+            return 0.0
+        rank = q * (total - 1)
+        i = int(np.searchsorted(np.cumsum(counts), rank, side="right"))
+        return self.value(min(i, self.n_bins - 1))
+
+
+class _Totals:
+    def __init__(self, n_bins: int):
+        self.count = 0
+        self.high = 0
+        self.medium = 0
+        self.latency_sum = 0.0
+        self.sketch = np.zeros(n_bins, dtype=np.int64)
+
+    def reset(self):
+        self.count = self.high = self.medium = 0
+        self.latency_sum = 0.0
+        self.sketch.fill(0)
+
+
+class KPIEngine:
+    def __init__(self, windows: Optional[Dict[str, int]] = None, sketch: Optional[LatencySketch] = None):
+        self.windows = dict(windows or WINDOWS)
+        self.sketch = sketch or LatencySketch()
+        self.size = max(self.windows.values())
+
+        # ring buffer of per-second buckets
+        self.sec = np.full(self.size, -1, dtype=np.int64)
+        self.count = np.zeros(self.size, dtype=np.int64)
+        self.high = np.zeros(self.size, dtype=np.int64)
+        self.medium = np.zeros(self.size, dtype=np.int64)
+        self.latency_sum = np.zeros(self.size, dtype=np.float64)
+        self.bins = np.zeros((self.size, self.sketch.n_bins), dtype=np.int32)
+
+        self.totals = {name: _Totals(self.sketch.n_bins) for name in self.windows}
+        self.now_sec: Optional[int] = None
+        # oldest second still counted in each window
+        self.tail = {name: 0 for name in self.windows}
+
+    def _advance(self, now_sec: int):
+        if self.now_sec is None or now_sec - self.now_sec >= self.size:
+            for t in self.totals.values():
+                t.reset()
+            self.sec.fill(-1)
+            self.now_sec = now_sec
+            for name in self.windows:
+                self.tail[name] = now_sec
+            return
+        if now_sec <= self.now_sec:
+            return
+
+        self.now_sec = now_sec
+        for name, width in self.windows.items():
+            totals = self.totals[name]
+            new_tail = now_sec - width + 1
+            for s in range(self.tail[name], new_tail):
+                slot = s % self.size
+                if self.sec[slot] != s:
+                    continue
+                totals.count -= int(self.count[slot])
+                totals.high -= int(self.high[slot])
+                totals.medium -= int(self.medium[slot])
+                totals.latency_sum -= float(self.latency_sum[slot])
+                totals.sketch -= self.bins[slot]
+            self.tail[name] = max(self.tail[name], new_tail)
+
+    def record(self, ts: float, risk_band: str, latency_ms: float):
+        self._advance(int(ts))
+        s = self.now_sec
+        slot = s % self.size
+        if self.sec[slot] != s:
+            self.sec[slot] = s
+            self.count[slot] = self.high[slot] = self.medium[slot] = 0
+            self.latency_sum[slot] = 0.0
+            self.bins[slot].fill(0)
+
+        high = 1 if risk_band == "HIGH" else 0
+        medium = 1 if risk_band == "MEDIUM" else 0
+        b = self.sketch.bin(latency_ms)
+
+        self.count[slot] += 1
+        self.high[slot] += high
+        self.medium[slot] += medium
+        self.latency_sum[slot] += latency_ms
+        self.bins[slot, b] += 1
+
+        for totals in self.totals.values():
+            totals.count += 1
+            totals.high += high
+            totals.medium += medium
+            totals.latency_sum += latency_ms
+            totals.sketch[b] += 1
+
+    # -------- state transfer (state bus sync to a late-joining worker) --------
+    def export_slots(self) -> List[list]:
+        """Live per-second buckets as [sec, count, high, medium, latency_sum, bins, bin counts]."""
+        if self.now_sec is None:
+            return []
+        out = []
+        for s in range(self.now_sec - self.size + 1, self.now_sec + 1):
+            slot = s % self.size
+            if self.sec[slot] != s:
+                continue
+            nz = np.flatnonzero(self.bins[slot])
+            out.append([
+                s, int(self.count[slot]), int(self.high[slot]), int(self.medium[slot]),
+                float(self.latency_sum[slot]), nz.tolist(), self.bins[slot, nz].tolist(),
+            ])
+        return out
+
+    def restore(self, now_sec: Optional[int]):
+        """Drop everything and restart at now_sec; follow with restore_slots()."""
+        self.sec.fill(-1)
+        for t in self.totals.values():
+            t.reset()
+        self.now_sec = now_sec
+        for name, width in self.windows.items():
+            self.tail[name] = now_sec - width + 1 if now_sec is not None else 0
+
+    def restore_slots(self, slots: List[list]):
+        for s, count, high, medium, latency_sum, nz, counts in slots:
+            if self.now_sec is None or not self.now_sec - self.size < s <= self.now_sec:
+                continue
+            slot = s % self.size
+            self.sec[slot] = s
+            self.count[slot] = count
+            self.high[slot] = high
+            self.medium[slot] = medium
+            self.latency_sum[slot] = latency_sum
+            self.bins[slot].fill(0)
+            self.bins[slot, nz] = counts
+            for name, totals in self.totals.items():
+                if s >= self.tail[name]:
+                    totals.count += count
+                    totals.high += high
+                    totals.medium += medium
+                    totals.latency_sum += latency_sum
+                    totals.sketch[nz] += counts
+
+    def window(self, name: str, now: float) -> Dict[str, Any]:
+        self._advance(int(now))
+        t = self.totals[name]
+        width = self.windows[name]
+        return {
+            "txn_count": t.count,
+            "txn_per_min": round(t.count * 60.0 / width, 2),
+            "alerts": t.high + t.medium,
+            "high_risk_pct": round((t.high / t.count) * 100, 2) if t.count else 0.0,
+            "avg_latency_ms": round(t.latency_sum / t.count, 2) if t.count else 0.0,
+            "latency_p50_ms": round(self.sketch.quantile(t.sketch, 0.50), 3),
+            "latency_p95_ms": round(self.sketch.quantile(t.sketch, 0.95), 3),
+            "latency_p99_ms": round(self.sketch.quantile(t.sketch, 0.99), 3),
+        }
+
+    def compute(self, now: float) -> Dict[str, Any]:
+        windows = {name: self.window(name, now) for name in self.windows}
+        one_min = windows.get("1m") or next(iter(windows.values()))
+        return {
+            # Original 60s KPI block, unchanged keys.
+            "txn_per_min": one_min["txn_count"],
+            "alerts_per_min": one_min["alerts"],
+            "high_risk_pct": one_min["high_risk_pct"],
+            "avg_latency_ms": one_min["avg_latency_ms"],
+            "latency_p50_ms": one_min["latency_p50_ms"],
+            "latency_p95_ms": one_min["latency_p95_ms"],
+            "latency_p99_ms": one_min["latency_p99_ms"],
+            "windows": windows,
+        }
@@ -0,0 +1,184 @@
+import asyncio
+import time
+from collections import deque
+from typing import Dict, Any, Callable, Awaitable, Optional
+
+import numpy as np
+
+from metrics import Histogram
+
+# ---------------------------------------------
+# Configurable-Rate Replay Load Generator
+# ---------------------------------------------
+# Replays the dataset at a target events-per-second rate instead of the demo
+# cadence. Every tick, the profile says how many events became due; those
+# are queued with their scheduled time, scored in batches through the normal
+# scoring path and published through the normal broadcast path. Events that
+# fall further behind than max_lag_sec are dropped (and counted), so the
+# achieved rate vs. target shows where the stack saturates.
+#
+# Profiles:
+#   constant - target_eps throughout
+#   ramp     - linear from ramp_start_eps to target_eps over ramp_sec
+#   poisson  - Poisson arrivals with mean target_eps
+
+PROFILES = {"constant", "ramp", "poisson"}
+RATE_WINDOW_SEC = 10.0
+
+REPLAY_LAG_SECONDS = Histogram(
+    "fraud_replay_lag_seconds", "Delay from a batch's scheduled time until all of it is published.")
+
+
+class LoadGenerator:
+    def __init__(
+        self,
+        profile: str = "constant",
+        target_eps: float = 100.0,
+        ramp_start_eps: float = 1.0,
+        ramp_sec: float = 60.0,
+        tick_ms: float = 50.0,
+        max_batch: int = 512,
+        max_lag_sec: float = 5.0,
+        seed: Optional[int] = None,
+        clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    ):
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown load profile: {profile}")
+        self.profile = profile
+        self.target_eps = target_eps
+        self.ramp_start_eps = ramp_start_eps
+        self.ramp_sec = max(ramp_sec, 1e-9)
+        self.tick = tick_ms / 1000.0
+        self.max_batch = max_batch
+        self.max_lag_sec = max_lag_sec
+        self._rng = np.random.default_rng(seed)
+        self.clock = clock  # injectable so tests can drive time
+        self.sleep = sleep
+
+        self.started_at: Optional[float] = None
+        self._carry = 0.0
+        self._pending: deque = deque()  # [scheduled_ts, count]
+        self._published: deque = deque()  # (ts, count) for the achieved rate
+
+        # stats
+        self.generated = 0
+        self.published = 0
+        self.dropped = 0
+        self.in_flight = 0
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+        self.lag_ms_sum = 0.0
+        self.batches = 0
+
+    def rate(self, elapsed: float) -> float:
+        if self.profile == "ramp":
+            frac = min(1.0, elapsed / self.ramp_sec)
+            return self.ramp_start_eps + (self.target_eps - self.ramp_start_eps) * frac
+        return self.target_eps
+
+    def _due(self, t0: float, t1: float) -> int:
+        mean = self.rate((t0 + t1) / 2 - self.started_at) * (t1 - t0)
+        if self.profile == "poisson":
+            return int(self._rng.poisson(mean))
+        self._carry += mean
+        n = int(self._carry)
+        self._carry -= n
+        return n
+
+    @property
+    def backlog(self) -> int:
+        return sum(n for _, n in self._pending)
+
+    def _drop_stale(self, now: float):
+        while self._pending and now - self._pending[0][0] > self.max_lag_sec:
+            self.dropped += self._pending.popleft()[1]
+
+    def _take(self, limit: int):
+        """Pop up to `limit` due events; returns (count, oldest scheduled ts)."""
+        taken, oldest = 0, None
+        while self._pending and taken < limit:
+            ts, n = self._pending[0]
+            oldest = ts if oldest is None else oldest
+            k = min(n, limit - taken)
+            taken += k
+            if k == n:
+                self._pending.popleft()
+            else:
+                self._pending[0][1] = n - k
+        return taken, oldest
+
+    async def run(
+        self,
+        n_rows: int,
+        score_rows: Callable[[np.ndarray], Awaitable[list]],
+        publish: Callable[[int, Dict[str, Any]], Awaitable[None]],
+    ):
+        """
+        score_rows(row_indices) -> list of scored dicts
+        publish(row_index, scored) -> broadcasts one event
+        """
+        cursor = 0
+        self.started_at = last = self.clock()
+
+        while True:
+            await self.sleep(self.tick)
+            now = self.clock()
+
+            n = self._due(last, now)
+            last = now
+            if n:
+                self._pending.append([now, n])
+                self.generated += n
+            self._drop_stale(now)
+
+            count, oldest = self._take(self.max_batch)
+            if not count:
+                continue
+
+            idx = (cursor + np.arange(count)) % n_rows
+            cursor = (cursor + count) % n_rows
+
+            self.in_flight = count
+            scores = await score_rows(idx)
+            for j, scored in zip(idx, scores):
+                await publish(int(j), scored)
+                self.in_flight -= 1
+                self.published += 1
+
+            done = self.clock()
+            lag_ms = (done - oldest) * 1000.0
+            REPLAY_LAG_SECONDS.observe(done - oldest)
+            self.last_lag_ms = lag_ms
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+            self.lag_ms_sum += lag_ms
+            self.batches += 1
+            self._published.append((done, count))
+
+    def achieved_eps(self, now: float) -> float:
+        while self._published and now - self._published[0][0] > RATE_WINDOW_SEC:
+            self._published.popleft()
+        if self.started_at is None:
+            return 0.0
+        window = min(RATE_WINDOW_SEC, max(now - self.started_at, 1e-9))
+        return sum(n for _, n in self._published) / window
+
+    def stats(self) -> Dict[str, Any]:
+        now = self.clock()
+        elapsed = now - self.started_at if self.started_at else 0.0
+        return {
+            "profile": self.profile,
+            "running_sec": round(elapsed, 1),
+            "target_eps": round(self.rate(elapsed), 2),
+            "achieved_eps": round(self.achieved_eps(now), 2),
+            "generated": self.generated,
+            "published": self.published,
+            "dropped": self.dropped,
+            "backlog": self.backlog,
+            "in_flight": self.in_flight,
+            "scoring_lag_ms": {
+                "last": round(self.last_lag_ms, 2),
+                "avg": round(self.lag_ms_sum / self.batches, 2) if self.batches else 0.0,
+                "max": round(self.max_lag_ms, 2),
+            },
+        }
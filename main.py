@@ -1,20 +1,54 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Response, WebSocket, WebSocketDisconnect, Header
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Dict, Any, List, Optional, Literal
-import pandas as pd
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, ValidationError
+from typing import Dict, Any, List, Optional, Literal, Tuple
+import numpy as np
 import joblib
 import time
 import asyncio
 from collections import deque
 import os
 import uuid
+import json
+import hmac
 
 # ---------------------------
 # RAG ENGINE IMPORTS
 # ---------------------------
-from rag_engine import explain, explain_with_rag, retrieve_docs, embed_query
-from historical_cases import historical_cases_store
+from rag_engine import (
+    aembed_query,
+    aexplain,
+    aexplain_with_rag,
+    aretrieve_docs,
+    embedding_cache,
+    aexplain_stream,
+    build_prompt,
+    embed_texts,
+    embeddings_deployment,
+    RAGStageTimeout,
+    RAGUnavailable,
+    rag_status,
+    aclose_clients,
+)
+from historical_cases import HistoricalCaseStore
+from prompt_builder import PromptBuilder, Section
+from feature_encoder import FeatureEncoder
+from micro_batcher import MicroBatcher
+from tree_evaluator import load_predictor
+from scoring_pool import ScoringPool
+from kpi_engine import KPIEngine
+from ws_broadcast import Broadcaster, dumps
+from event_store import EventStore
+from event_log import EventLog
+from replay_cache import load_or_build
+from load_generator import LoadGenerator
+from response_cache import SemanticResponseCache
+from state_bus import make_bus
+from metrics import Histogram, Counter, Gauge, render as render_metrics
+from tracing import TraceMiddleware, span
+from profiler import SamplingProfiler, ProfilerBusy
 
 # ---------------------------
 # MODEL / DATA CONFIG
@@ -22,15 +56,98 @@ from historical_cases import historical_cases_store
 MODEL_PATH = "model/xgb_fraud_model.joblib"
 COLS_PATH = "model/feature_columns.joblib"
 DATA_PATH = "data/transactions.csv"
+REPLAY_CACHE_DIR = os.getenv("REPLAY_CACHE_DIR", "data/cache")
+REPLAY_CHUNK_ROWS = int(os.getenv("REPLAY_CHUNK_ROWS", "64"))
+
+# demo = one event per 0.5 s plus spike bursts; load = target-rate load generation
+REPLAY_MODE = os.getenv("REPLAY_MODE", "demo").lower()
+LOAD_PROFILE = os.getenv("LOAD_PROFILE", "constant").lower()  # constant | ramp | poisson
+LOAD_TARGET_EPS = float(os.getenv("LOAD_TARGET_EPS", "100"))
+LOAD_RAMP_START_EPS = float(os.getenv("LOAD_RAMP_START_EPS", "1"))
+LOAD_RAMP_SEC = float(os.getenv("LOAD_RAMP_SEC", "60"))
+LOAD_TICK_MS = float(os.getenv("LOAD_TICK_MS", "50"))
+LOAD_MAX_BATCH = int(os.getenv("LOAD_MAX_BATCH", "512"))
+LOAD_MAX_LAG_SEC = float(os.getenv("LOAD_MAX_LAG_SEC", "5"))
 
 SPIKE_ENABLED = os.getenv("SPIKE_ENABLED", "true").lower() == "true"
 SPIKE_EVERY_SEC = float(os.getenv("SPIKE_EVERY_SEC", "20"))
 SPIKE_BURST_COUNT = int(os.getenv("SPIKE_BURST_COUNT", "25"))
 SPIKE_BURST_SLEEP = float(os.getenv("SPIKE_BURST_SLEEP", "0.08"))
 
-model = joblib.load(MODEL_PATH)
+INFERENCE_ENGINE = os.getenv("INFERENCE_ENGINE", "xgboost").lower()  # xgboost | compiled
+COMPILED_MAX_ROWS = int(os.getenv("COMPILED_MAX_ROWS", "8"))
+
+# 0 = score in-process; N > 0 = dispatch to N worker processes.
+SCORING_WORKERS = int(os.getenv("SCORING_WORKERS", "0"))
+
+WS_SEND_QUEUE_MAX = int(os.getenv("WS_SEND_QUEUE_MAX", "256"))
+WS_SLOW_CLIENT_POLICY = os.getenv("WS_SLOW_CLIENT_POLICY", "drop_oldest").lower()  # drop_oldest | coalesce | disconnect
+WS_SEND_TIMEOUT_SEC = float(os.getenv("WS_SEND_TIMEOUT_SEC", "5"))
+WS_REPLAY_BUFFER = int(os.getenv("WS_REPLAY_BUFFER", "1024"))  # messages kept per mode for ?since= resume
+WS_RESUME_GRACE_SEC = float(os.getenv("WS_RESUME_GRACE_SEC", "60"))
+WS_SNAPSHOT_MAX_AGE_SEC = float(os.getenv("WS_SNAPSHOT_MAX_AGE_SEC", "5"))
+
+RESPONSE_CACHE_MAX_ITEMS = int(os.getenv("RESPONSE_CACHE_MAX_ITEMS", "512"))
+RESPONSE_CACHE_TTL_SEC = float(os.getenv("RESPONSE_CACHE_TTL_SEC", "900"))
+RESPONSE_CACHE_THRESHOLD = float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.95"))
+
+HISTORICAL_CASES_PATH = os.getenv("HISTORICAL_CASES_PATH", "data/historical_cases.jsonl")
+HISTORICAL_CASES_VECTORS = os.getenv("HISTORICAL_CASES_VECTORS", "data/cache/historical_cases.npy")
+HISTORICAL_TOP_K = int(os.getenv("HISTORICAL_TOP_K", "3"))
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "2000"))
+PROMPT_ITEM_MAX_TOKENS = int(os.getenv("PROMPT_ITEM_MAX_TOKENS", "250"))
+PROMPT_DEDUPE_THRESHOLD = float(os.getenv("PROMPT_DEDUPE_THRESHOLD", "0.85"))
+
+# Events kept for analyst actions (by count and age); the snapshot sends the newest few.
+EVENT_RETENTION_MAX = int(os.getenv("EVENT_RETENTION_MAX", "10000"))
+EVENT_RETENTION_SEC = float(os.getenv("EVENT_RETENTION_SEC", "3600"))
+RECENT_EVENTS_SNAPSHOT = int(os.getenv("RECENT_EVENTS_SNAPSHOT", "50"))
+
+# Persistent history for /events (Parquet segments, flushed off the event loop).
+EVENT_LOG_ENABLED = os.getenv("EVENT_LOG_ENABLED", "true").lower() == "true"
+EVENT_LOG_DIR = os.getenv("EVENT_LOG_DIR", "data/events")
+EVENT_LOG_FLUSH_SEC = float(os.getenv("EVENT_LOG_FLUSH_SEC", "10"))
+EVENT_LOG_FLUSH_MAX_ROWS = int(os.getenv("EVENT_LOG_FLUSH_MAX_ROWS", "5000"))
+
+# local = single worker; unix = several workers (uvicorn --workers N) sharing
+# one elected producer over a Unix-socket bus.
+STATE_BUS = os.getenv("STATE_BUS", "local").lower()
+STATE_BUS_SOCKET = os.getenv("STATE_BUS_SOCKET", "/tmp/fraud-state-bus.sock")
+STATE_BUS_LOCK = os.getenv("STATE_BUS_LOCK", "/tmp/fraud-state-bus.lock")
+
+# Admin endpoints (/admin/*) require this value in X-Admin-Token; unset = disabled.
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+# Requests slower than this are kept with their trace spans for /admin/traces.
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "500"))
+TRACE_KEEP = int(os.getenv("TRACE_KEEP", "100"))
+
+FRAME_INTERVAL_MS = float(os.getenv("FRAME_INTERVAL_MS", "1000"))
+# Newest events kept for the next frame; older ones are coalesced away (the
+# frame's KPI block still counts them) if frame_loop falls behind a burst.
+FRAME_MAX_EVENTS = int(os.getenv("FRAME_MAX_EVENTS", "500"))
+
+MICROBATCH_ENABLED = os.getenv("MICROBATCH_ENABLED", "true").lower() == "true"
+MICROBATCH_MAX_WAIT_MS = float(os.getenv("MICROBATCH_MAX_WAIT_MS", "2"))
+MICROBATCH_MAX_SIZE = int(os.getenv("MICROBATCH_MAX_SIZE", "64"))
+
+MODEL_WARMUP_ROUNDS = int(os.getenv("MODEL_WARMUP_ROUNDS", "3"))
+
+# The model (and xgboost behind it) is loaded and warmed by a startup task,
+# so /live answers right away and /ready reports when scoring can start.
+model = None
+predictor = None
+inference_engine = None
 feature_columns = joblib.load(COLS_PATH)
 
+scoring_pool = ScoringPool(
+    SCORING_WORKERS,
+    MODEL_PATH,
+    fallback=lambda X: predictor.predict_proba(X)[:, 1],
+    engine=INFERENCE_ENGINE,
+    compiled_max_rows=COMPILED_MAX_ROWS,
+)
+
 # ---------------------------
 # APP & CORS
 # ---------------------------
@@ -43,13 +160,35 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Cache", "Server-Timing"],
 )
 
+slow_traces: deque = deque(maxlen=TRACE_KEEP)
+app.add_middleware(TraceMiddleware, slow_ms=TRACE_SLOW_MS, keep=slow_traces)
+profiler = SamplingProfiler()
+
+response_cache = SemanticResponseCache(
+    max_items=RESPONSE_CACHE_MAX_ITEMS,
+    ttl_sec=RESPONSE_CACHE_TTL_SEC,
+    threshold=RESPONSE_CACHE_THRESHOLD,
+)
+
+# Falls back to the built-in cases when HISTORICAL_CASES_PATH is missing;
+# embeddings load in the background after startup (see load_case_embeddings).
+historical_store = HistoricalCaseStore.from_file(HISTORICAL_CASES_PATH)
+
+prompt_builder = PromptBuilder(PROMPT_TOKEN_BUDGET, PROMPT_ITEM_MAX_TOKENS, PROMPT_DEDUPE_THRESHOLD)
+# (prompt_tokens, latency_ms) of recent uncached analyst explains, for /rag/stats.
+explain_samples: deque = deque(maxlen=1000)
+
 # ---------------------------
 # CONSTANTS
 # ---------------------------
 CAT_COLS = ["payment_type", "employment_status", "housing_status", "source", "device_os"]
 
+# Built once: category/column lookup tables instead of per-call get_dummies.
+encoder = FeatureEncoder(feature_columns, CAT_COLS)
+
 # ---------------------------
 # REQUEST MODELS
 # ---------------------------
@@ -57,6 +196,12 @@ class PredictRequest(BaseModel):
     features: Dict[str, Any]
 
 
+class BatchPredictRequest(BaseModel):
+    # Either a list of feature dicts, or a columnar body {feature: [values...]}.
+    items: Optional[List[Dict[str, Any]]] = None
+    columns: Optional[Dict[str, List[Any]]] = None
+
+
 class Transaction(BaseModel):
     amount: float
     merchant: str
@@ -87,31 +232,42 @@ class AnalystActionRequest(BaseModel):
 # ---------------------------
 # RAG CONTEXT BUILDERS
 # ---------------------------
-def build_rules_context(query: str) -> str:
+def response_context(endpoint: str, tx: Optional[Transaction], case_id: Optional[str] = None) -> str:
     """
-    Use Azure Search (backed by rag_knowledge_base.csv) to pull relevant rules/incidents.
+    Everything besides the query that changes the answer: cached responses
+    are only reused within the same context.
     """
-    vector = embed_query(query)
-    docs = retrieve_docs(vector, k=5)
-
-    lines = []
-    for doc in docs:
-        title = doc.get("title")
-        description = doc.get("description")
-        doc_type = doc.get("type")
-        severity = doc.get("severity")
-        tags = doc.get("tags")
-        created_at = doc.get("created_at")
-
-        lines.append(
-            f"- [{doc_type} | severity={severity} | created={created_at} | tags={tags}]\n"
-            f"  {title}: {description}"
-        )
+    tx_key = tx.model_dump_json() if tx else ""
+    return f"{endpoint}|{tx_key}|{case_id or ''}"
 
-    if not lines:
-        return "No specific rules or knowledge base entries were found for this query."
 
-    return "Relevant Fraud Rules and Knowledge Base Entries:\n" + "\n".join(lines)
+def format_rule(doc: Dict[str, Any]) -> str:
+    return (
+        f"- [{doc.get('type')} | severity={doc.get('severity')} | created={doc.get('created_at')} | tags={doc.get('tags')}]\n"
+        f"  {doc.get('title')}: {doc.get('description')}"
+    )
+
+
+def clean_doc(doc: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": doc.get("id"),
+        "title": doc.get("title"),
+        "description": doc.get("description"),
+        "tags": doc.get("tags"),
+        "type": doc.get("type"),
+        "severity": doc.get("severity"),
+        "created_at": doc.get("created_at"),
+        "score": doc.get("@search.score"),
+    }
+
+
+async def retrieve_rules(query: str) -> List[Dict[str, Any]]:
+    """
+    Use Azure Search (backed by rag_knowledge_base.csv) to pull relevant rules/incidents.
+    """
+    with span("retrieve_rules"):
+        vector = await aembed_query(query)
+        return await aretrieve_docs(vector, k=5)
 
 
 def build_transaction_context(tx: Optional[Transaction]) -> str:
@@ -132,48 +288,148 @@ Transaction Details:
 """
 
 
-def build_historical_context(case_id: Optional[str], query: str) -> str:
+def format_case(case: Dict[str, Any], label: str) -> str:
+    return f"""{label} (ID: {case['case_id']}):
+Summary: {case['summary']}
+Details: {case['details']}
+Decision: {case['decision']}
+"""
+
+
+async def retrieve_historical(case_id: Optional[str], query: str, tx: Optional[Transaction] = None) -> List[Tuple[float, str]]:
     """
-    Pull a specific historical case by ID (simple version).
-    Later, you can extend this to similarity search over historical_cases_store.
+    (score, formatted case) for the linked case if given; otherwise the top-k
+    cases most similar to the query (plus the transaction, when present).
     """
     if case_id:
-        match = next((c for c in historical_cases_store if c["case_id"] == case_id), None)
+        match = historical_store.get(case_id)
         if match:
-            return f"""Historical Case (ID: {match['case_id']}):
-Summary: {match['summary']}
-Details: {match['details']}
-Decision: {match['decision']}
+            # Ranked above any similarity match.
+            return [(2.0, format_case(match, "Historical Case"))]
+
+    if not historical_store.searchable:
+        return []
+
+    text = query if tx is None else f"{query}\n{build_transaction_context(tx)}"
+    matches = historical_store.similar(await aembed_query(text), k=HISTORICAL_TOP_K)
+    return [
+        (score, format_case(case, f"Similar Historical Case {i} (similarity {score:.2f})"))
+        for i, (case, score) in enumerate(matches, start=1)
+    ]
+
+
+def load_case_embeddings():
+    try:
+        embedded = historical_store.ensure_embeddings(embed_texts, embeddings_deployment, HISTORICAL_CASES_VECTORS)
+        print(f"Historical cases ready: {len(historical_store)} cases ({embedded} newly embedded)")
+    except Exception as e:
+        print(f"Historical case embeddings unavailable, similarity search disabled: {e}")
+
+
+ANALYST_PROMPT = """
+You are a senior fraud analyst for a real-time fraud detection system.
+
+User Question:
+{query}
+
+{tx_context}
+
+{rules_context}
+
+Historical Context:
+{historical_context}
+
+Task:
+1. Explain clearly why this transaction was likely flagged (or not) based on the rules, knowledge base, and transaction details.
+2. Reference specific rules, patterns, or historical cases when possible.
+3. If the decision is uncertain, say so and explain what additional data would help.
+4. Use concise, human-readable language suitable for an internal fraud operations dashboard.
 """
 
-    return "No specific historical case linked."
+
+def build_analyst_prompt(
+    query: str,
+    tx_context: str,
+    docs: List[Dict[str, Any]],
+    cases: List[Tuple[float, str]],
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Fit rules/KB docs and historical cases into PROMPT_TOKEN_BUDGET, best
+    first. Returns (prompt, stats with prompt_tokens).
+    """
+    sections = {
+        "rules_context": Section(
+            "Relevant Fraud Rules and Knowledge Base Entries:",
+            "No specific rules or knowledge base entries were found for this query.",
+            [(doc.get("@search.score") or 0.0, format_rule(doc)) for doc in docs],
+        ),
+        "historical_context": Section("", "No specific historical case linked.", cases),
+    }
+    with span("build_prompt"):
+        return prompt_builder.build(
+            lambda **parts: ANALYST_PROMPT.format(query=query, tx_context=tx_context, **parts),
+            sections,
+        )
+
+
+def record_explain(prompt_tokens: int, start: float):
+    explain_samples.append((prompt_tokens, (time.perf_counter() - start) * 1000.0))
+
+
+def explain_stats() -> Dict[str, Any]:
+    if not explain_samples:
+        return {"samples": 0}
+    tokens, latency = np.asarray(explain_samples, dtype=np.float64).T
+    return {
+        "samples": len(explain_samples),
+        "budget_tokens": PROMPT_TOKEN_BUDGET,
+        "prompt_tokens_p50": int(np.percentile(tokens, 50)),
+        "prompt_tokens_p95": int(np.percentile(tokens, 95)),
+        "latency_ms_p50": round(float(np.percentile(latency, 50)), 2),
+        "latency_ms_p95": round(float(np.percentile(latency, 95)), 2),
+    }
 
 
 # ---------------------------
 # FRAUD MODEL SCORING
 # ---------------------------
-def score_one(features: Dict[str, Any]) -> Dict[str, Any]:
-    start = time.perf_counter()
+# Scoring metrics, observed on every path below.
+SCORE_ENCODE_SECONDS = Histogram(
+    "fraud_score_encode_seconds", "Feature encoding time per scoring call.", ["path"])
+SCORE_PREDICT_SECONDS = Histogram(
+    "fraud_score_predict_seconds", "Model predict time per scoring call.", ["path"])
+PREDICT_REQUEST_SECONDS = Histogram(
+    "fraud_predict_request_seconds", "/predict latency from request to scored result.", ["mode"])
+EVENT_DELIVERY_SECONDS = Histogram(
+    "fraud_event_delivery_seconds", "Time from an event being scored to this worker applying it.")
+
+
+def risk_decision(prob: float):
+    if prob >= 0.75:
+        return "HIGH", "BLOCK"
+    if prob >= 0.40:
+        return "MEDIUM", "REVIEW"
+    return "LOW", "ALLOW"
 
-    df = pd.DataFrame([features])
 
-    for c in CAT_COLS:
-        if c not in df.columns:
-            df[c] = "unknown"
+def score_one(features: Dict[str, Any]) -> Dict[str, Any]:
+    with span("score_one"):
+        return _score_one(features)
 
-    df = pd.get_dummies(df, columns=CAT_COLS, drop_first=True)
-    df = df.reindex(columns=feature_columns, fill_value=0)
 
-    prob = float(model.predict_proba(df)[0][1])
+def _score_one(features: Dict[str, Any]) -> Dict[str, Any]:
+    start = time.perf_counter()
 
-    if prob >= 0.75:
-        risk_band, decision = "HIGH", "BLOCK"
-    elif prob >= 0.40:
-        risk_band, decision = "MEDIUM", "REVIEW"
-    else:
-        risk_band, decision = "LOW", "ALLOW"
+    X = encoder.encode_one(features)
+    encoded = time.perf_counter()
 
-    latency_ms = (time.perf_counter() - start) * 1000.0
+    prob = float(scoring_pool.predict(X)[0])
+    risk_band, decision = risk_decision(prob)
+
+    end = time.perf_counter()
+    SCORE_ENCODE_SECONDS.observe(encoded - start, "one")
+    SCORE_PREDICT_SECONDS.observe(end - encoded, "one")
+    latency_ms = (end - start) * 1000.0
 
     return {
         "fraud_probability": round(prob, 4),
@@ -183,29 +439,211 @@ def score_one(features: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
+def score_matrix(X, start: Optional[float] = None) -> List[Dict[str, Any]]:
+    """
+    Score an already-encoded (n_rows, n_features) matrix with one model call.
+    latency_ms on each row is the latency of the whole call (since `start`):
+    what that row actually waited, which is what the latency KPIs report.
+    """
+    if start is None:
+        start = time.perf_counter()
+    if len(X) == 0:
+        return []
+
+    predict_start = time.perf_counter()
+    probs = scoring_pool.predict(X)
+    end = time.perf_counter()
+    SCORE_PREDICT_SECONDS.observe(end - predict_start, "batch")
+
+    latency_ms = (end - start) * 1000.0
+
+    results = []
+    for p in probs:
+        prob = float(p)
+        risk_band, decision = risk_decision(prob)
+        results.append({
+            "fraud_probability": round(prob, 4),
+            "risk_band": risk_band,
+            "decision": decision,
+            "latency_ms": round(latency_ms, 2),
+        })
+    return results
+
+
+def score_batch(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    start = time.perf_counter()
+    X = encoder.encode_many(rows)
+    SCORE_ENCODE_SECONDS.observe(time.perf_counter() - start, "batch")
+    return score_matrix(X, start)
+
+
+batcher = MicroBatcher(
+    score_batch,
+    max_wait_ms=MICROBATCH_MAX_WAIT_MS,
+    max_batch_size=MICROBATCH_MAX_SIZE,
+)
+
 # ---------------------------
 # BASIC ENDPOINTS
 # ---------------------------
 @app.get("/health")
 def health():
+    """Kept for existing probes; same as /live."""
+    return {"status": "ok"}
+
+
+@app.get("/live")
+def live():
+    """The process is up and its event loop answers; says nothing about the model."""
     return {"status": "ok"}
 
 
+@app.get("/ready")
+def ready():
+    """
+    503 until the model is loaded and warmed and the replay data is loaded
+    (on the producer; other workers need a connection to it instead).
+    """
+    checks = readiness_checks()
+    ok = all(checks.values())
+    if ok:
+        mark_ready()
+    body = {
+        "ready": ok,
+        "checks": checks,
+        "error": startup_error,
+        "time_to_ready_sec": round(ready_at - PROCESS_STARTED_AT, 3) if ready_at else None,
+        "uptime_sec": round(time.time() - PROCESS_STARTED_AT, 3),
+        "startup_timings_sec": startup_timings,
+        "rag": rag_status(),
+    }
+    return JSONResponse(body, status_code=200 if ok else 503)
+
+
 @app.get("/")
 def root():
     return {"status": "running"}
 
 
+def not_ready_response() -> JSONResponse:
+    return JSONResponse({"error": "Model is still loading; retry once /ready returns 200."}, status_code=503)
+
+
 @app.post("/predict")
-def predict(req: PredictRequest):
-    return score_one(req.features)
+async def predict(req: PredictRequest):
+    if not model_ready.is_set():
+        return not_ready_response()
+    start = time.perf_counter()
+    try:
+        if MICROBATCH_ENABLED and batcher.running:
+            # Queue wait plus the shared batch's encode and predict.
+            with span("score_microbatch"):
+                result = await batcher.submit(req.features)
+            PREDICT_REQUEST_SECONDS.observe(time.perf_counter() - start, "microbatch")
+        else:
+            result = await run_in_threadpool(score_one, req.features)
+            PREDICT_REQUEST_SECONDS.observe(time.perf_counter() - start, "direct")
+    except (TypeError, ValueError) as e:
+        # Same message as /predict/batch; only this request fails, not its batch.
+        return JSONResponse({"error": f"Invalid features: {e}"}, status_code=422)
+    return result
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition format."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+# ---------------------------
+# ADMIN: PROFILING + TRACES
+# ---------------------------
+def admin_denied(token: Optional[str]) -> Optional[JSONResponse]:
+    if not ADMIN_TOKEN:
+        return JSONResponse({"error": "Admin endpoints are disabled (set ADMIN_TOKEN)."}, status_code=403)
+    if not token or not hmac.compare_digest(token, ADMIN_TOKEN):
+        return JSONResponse({"error": "Invalid admin token."}, status_code=403)
+    return None
+
+
+@app.get("/admin/profile")
+async def admin_profile(
+    seconds: float = 10.0,
+    interval_ms: float = 10.0,
+    idle: bool = False,
+    x_admin_token: Optional[str] = Header(None),
+):
+    """
+    Sample stacks of every thread for `seconds` and return them in
+    collapsed-stack format (flamegraph.pl / speedscope). idle=true keeps
+    threads parked waiting for work.
+    """
+    denied = admin_denied(x_admin_token)
+    if denied is not None:
+        return denied
+    try:
+        text, stats = await asyncio.to_thread(profiler.sample, seconds, interval_ms / 1000.0, idle)
+    except ProfilerBusy as e:
+        return JSONResponse({"error": str(e)}, status_code=409)
+    return PlainTextResponse(text, headers={f"X-Profile-{k.replace('_', '-')}": str(v) for k, v in stats.items()})
+
+
+@app.get("/admin/traces")
+def admin_traces(limit: int = 20, x_admin_token: Optional[str] = Header(None)):
+    """Most recent requests slower than TRACE_SLOW_MS, newest first, with their spans."""
+    denied = admin_denied(x_admin_token)
+    if denied is not None:
+        return denied
+    traces = list(slow_traces)[::-1][:max(limit, 0)]
+    return {"slow_ms": TRACE_SLOW_MS, "count": len(slow_traces), "traces": traces}
+
+
+@app.get("/predict/stats")
+def predict_stats():
+    return {
+        "inference_engine": inference_engine,
+        "microbatch_enabled": MICROBATCH_ENABLED,
+        **batcher.stats(),
+        "scoring_pool": scoring_pool.stats(),
+    }
+
+
+@app.post("/predict/batch")
+def predict_batch(req: BatchPredictRequest):
+    """
+    Vectorized scoring: encode every row into one matrix, call the model once.
+    """
+    if not model_ready.is_set():
+        return not_ready_response()
+    if (req.items is None) == (req.columns is None):
+        return JSONResponse({"error": "Provide exactly one of 'items' or 'columns'."}, status_code=422)
+
+    start = time.perf_counter()
+    try:
+        if req.items is not None:
+            X = encoder.encode_many(req.items)
+        else:
+            X = encoder.encode_columns(req.columns)
+    except (TypeError, ValueError) as e:
+        return JSONResponse({"error": f"Invalid features: {e}"}, status_code=422)
+    SCORE_ENCODE_SECONDS.observe(time.perf_counter() - start, "batch")
+
+    results = score_matrix(X, start)
+    batch_latency_ms = (time.perf_counter() - start) * 1000.0
+
+    return {
+        "count": len(results),
+        "results": results,
+        "batch_latency_ms": round(batch_latency_ms, 2),
+        "latency_ms_per_row": round(batch_latency_ms / len(results), 4) if results else 0.0,
+    }
 
 
 # ---------------------------
 # UPDATED RAG SEARCH ENDPOINT
 # ---------------------------
 @app.post("/search")
-def search_rag(req: SearchRequest):
+async def search_rag(req: SearchRequest, response: Response):
     """
     Hybrid search:
     - Uses the user query
@@ -220,117 +658,279 @@ def search_rag(req: SearchRequest):
             f" amount={req.transaction.amount}"
         )
 
-    vector = embed_query(combined_query)
-    docs = retrieve_docs(vector, k=10)
-
-    cleaned = []
-    for doc in docs:
-        cleaned.append({
-            "id": doc.get("id"),
-            "title": doc.get("title"),
-            "description": doc.get("description"),
-            "tags": doc.get("tags"),
-            "type": doc.get("type"),
-            "severity": doc.get("severity"),
-            "created_at": doc.get("created_at"),
-            "score": doc.get("@search.score"),
-        })
-    return {"results": cleaned}
+    try:
+        vector = await aembed_query(combined_query)
+    except (RAGStageTimeout, RAGUnavailable) as e:
+        return {"error": str(e)}
+
+    context = response_context("search", req.transaction)
+    cached = response_cache.get(context, vector)
+    response.headers["X-Cache"] = "HIT" if cached is not None else "MISS"
+    if cached is not None:
+        return cached
+
+    try:
+        docs = await aretrieve_docs(vector, k=10)
+    except (RAGStageTimeout, RAGUnavailable) as e:
+        return {"error": str(e)}
+
+    cleaned = [clean_doc(doc) for doc in docs]
+
+    result = {"results": cleaned}
+    response_cache.put(context, vector, result)
+    return result
+
+
+@app.get("/rag/stats")
+def rag_stats():
+    return {
+        "embedding_cache": embedding_cache.stats(),
+        "response_cache": response_cache.stats(),
+        "explain": explain_stats(),
+    }
+
+
+@app.post("/rag/cache/invalidate")
+async def rag_cache_invalidate():
+    # The cache lives in each worker; the bus carries the invalidation to the
+    # others. This worker clears now in case the bus is down.
+    response_cache.invalidate()
+    broadcast_ok = await bus.publish("cache_invalidate", {})
+    return {"ok": True, "all_workers": broadcast_ok}
 
 
 # ---------------------------
 # UPDATED ANALYST-LEVEL EXPLAIN ENDPOINT
 # ---------------------------
 @app.post("/explain")
-def explain_rag(req: ExplainRequest):
+async def explain_rag(req: ExplainRequest, response: Response, stream: bool = False):
     """
     Full analyst-level explanation:
     - Fraud rules and KB from Azure Search (rag_knowledge_base.csv)
     - Transaction metadata
     - Historical fraud cases
-    - Passed as a single prompt into rag_engine.explain(prompt)
+    - Passed as a single prompt into rag_engine.aexplain(prompt)
+
+    ?stream=true returns Server-Sent Events instead (see explain_stream_events).
     """
+    if stream:
+        return StreamingResponse(
+            sse_events(explain_stream_events(req)),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
     mode = (req.mode or "analyst").strip().lower()
     if mode not in {"basic", "analyst"}:
         return {"error": "Invalid mode. Use 'basic' or 'analyst'."}
 
-    if mode == "basic":
-        result = explain_with_rag(req.query, k=5)
-        return {"explanation": result, "mode": "basic"}
+    start = time.perf_counter()
+    try:
+        # Embedding is cached, so the retrieval step below reuses it for free.
+        vector = await aembed_query(req.query)
+        context = response_context(f"explain:{mode}", req.transaction, req.case_id)
+        cached = response_cache.get(context, vector)
+        response.headers["X-Cache"] = "HIT" if cached is not None else "MISS"
+        if cached is not None:
+            return cached
+
+        if mode == "basic":
+            result = await aexplain_with_rag(req.query, k=5)
+            payload = {"explanation": result, "mode": "basic"}
+            response_cache.put(context, vector, payload)
+            return payload
+
+        # Rules (embed + search) and historical lookup run concurrently;
+        # the transaction block is plain string formatting.
+        docs, cases = await asyncio.gather(
+            retrieve_rules(req.query),
+            retrieve_historical(req.case_id, req.query, req.transaction),
+        )
+        tx_context = build_transaction_context(req.transaction)
 
-    rules_context = build_rules_context(req.query)
-    tx_context = build_transaction_context(req.transaction)
-    historical_context = build_historical_context(req.case_id, req.query)
+        prompt, prompt_stats = build_analyst_prompt(req.query, tx_context, docs, cases)
+        result = await aexplain(prompt)
+    except (RAGStageTimeout, RAGUnavailable) as e:
+        return {"error": str(e)}
 
-    prompt = f"""
-You are a senior fraud analyst for a real-time fraud detection system.
+    record_explain(prompt_stats["prompt_tokens"], start)
+    payload = {"explanation": result, "mode": "analyst", "prompt_tokens": prompt_stats["prompt_tokens"]}
+    response_cache.put(context, vector, payload)
+    return payload
 
-User Question:
-{req.query}
 
-{tx_context}
+async def explain_stream_events(req: ExplainRequest):
+    """
+    Streaming explain, shared by SSE and the websocket channel:
+    - {"type": "docs", ...}   retrieved documents, before any tokens
+    - {"type": "chunk", ...}  completion text deltas as they arrive
+    - {"type": "done", ...}   time-to-first-token and total latency
+    - {"type": "error", ...}
+    """
+    start = time.perf_counter()
+    mode = (req.mode or "analyst").strip().lower()
+    if mode not in {"basic", "analyst"}:
+        yield {"type": "error", "error": "Invalid mode. Use 'basic' or 'analyst'."}
+        return
 
-{rules_context}
+    parts: List[str] = []
+    ttft_ms = None
+    prompt_tokens = None
+    try:
+        vector = await aembed_query(req.query)
+        context = response_context(f"explain:{mode}", req.transaction, req.case_id)
+        cached = response_cache.get(context, vector)
+        if cached is not None:
+            yield {"type": "docs", "docs": [], "cache": "HIT"}
+            yield {"type": "chunk", "delta": cached["explanation"]}
+            elapsed_ms = round((time.perf_counter() - start) * 1000.0, 2)
+            yield {"type": "done", "mode": mode, "cache": "HIT", "ttft_ms": elapsed_ms, "total_ms": elapsed_ms}
+            return
+
+        if mode == "basic":
+            docs = await aretrieve_docs(vector, k=5)
+            prompt = build_prompt(req.query, docs)
+        else:
+            docs, cases = await asyncio.gather(
+                retrieve_rules(req.query),
+                retrieve_historical(req.case_id, req.query, req.transaction),
+            )
+            prompt, prompt_stats = build_analyst_prompt(
+                req.query, build_transaction_context(req.transaction), docs, cases,
+            )
+            prompt_tokens = prompt_stats["prompt_tokens"]
+
+        yield {"type": "docs", "docs": [clean_doc(d) for d in docs], "cache": "MISS"}
+
+        async for delta in aexplain_stream(prompt):
+            if ttft_ms is None:
+                ttft_ms = round((time.perf_counter() - start) * 1000.0, 2)
+            parts.append(delta)
+            yield {"type": "chunk", "delta": delta}
+    except (RAGStageTimeout, RAGUnavailable) as e:
+        yield {"type": "error", "error": str(e)}
+        return
+    except Exception as e:
+        # SDK/network failures mid-stream: the client still gets a terminal event.
+        print(f"Explain stream failed: {type(e).__name__}: {e}")
+        yield {"type": "error", "error": f"Explain failed: {type(e).__name__}"}
+        return
+
+    payload = {"explanation": "".join(parts), "mode": mode}
+    if prompt_tokens is not None:
+        record_explain(prompt_tokens, start)
+        payload["prompt_tokens"] = prompt_tokens
+    response_cache.put(context, vector, payload)
+    yield {
+        "type": "done",
+        "mode": mode,
+        "cache": "MISS",
+        "prompt_tokens": prompt_tokens,
+        "ttft_ms": ttft_ms,
+        "total_ms": round((time.perf_counter() - start) * 1000.0, 2),
+    }
 
-Historical Context:
-{historical_context}
 
-Task:
-1. Explain clearly why this transaction was likely flagged (or not) based on the rules, knowledge base, and transaction details.
-2. Reference specific rules, patterns, or historical cases when possible.
-3. If the decision is uncertain, say so and explain what additional data would help.
-4. Use concise, human-readable language suitable for an internal fraud operations dashboard.
-"""
+async def sse_events(events):
+    async for event in events:
+        yield f"event: {event['type']}\ndata: {dumps(event)}\n\n"
+
 
-    result = explain(prompt)  # rag_engine.explain(prompt) -> pure LLM call
-    return {"explanation": result, "mode": "analyst"}
+async def stream_explain_ws(conn, request_id: Optional[str], req: ExplainRequest):
+    # Same events as SSE, as explain_docs / explain_chunk / explain_done messages.
+    async for event in explain_stream_events(req):
+        event = dict(event, type=f"explain_{event['type']}", request_id=request_id)
+        conn.offer(dumps(event), event["type"])
 
 
 # ---------------------------
 # STREAMING + ANALYST ACTIONS
 # ---------------------------
-clients: List[WebSocket] = []
-last_60s_scores = deque()
-last_60s_latency = deque()
-recent_events = deque(maxlen=50)
-
-analyst_actions = deque(maxlen=500)
-action_by_event_id: Dict[str, Dict[str, Any]] = {}
+hub = Broadcaster(
+    max_queue=WS_SEND_QUEUE_MAX,
+    policy=WS_SLOW_CLIENT_POLICY,
+    send_timeout=WS_SEND_TIMEOUT_SEC,
+    replay_max=WS_REPLAY_BUFFER,
+    resume_grace_sec=WS_RESUME_GRACE_SEC,
+)
+kpi_engine = KPIEngine()
+event_store = EventStore(
+    max_events=EVENT_RETENTION_MAX,
+    max_age_sec=EVENT_RETENTION_SEC,
+    max_actions=500,
+)
+event_log = EventLog(
+    EVENT_LOG_DIR,
+    flush_interval_sec=EVENT_LOG_FLUSH_SEC,
+    flush_max_rows=EVENT_LOG_FLUSH_MAX_ROWS,
+    writer=False,  # until this worker is elected producer
+) if EVENT_LOG_ENABLED else None
+bus = make_bus(STATE_BUS, STATE_BUS_SOCKET, STATE_BUS_LOCK)
+
+Gauge("fraud_ws_clients", "Connected websocket clients.",
+      lambda: {(m,): hub.count(m) for m in ("tick", "frame")}, ["mode"])
+Gauge("fraud_events_retained", "Events held in the in-memory event store.", lambda: len(event_store))
+
+load_generator = LoadGenerator(
+    profile=LOAD_PROFILE,
+    target_eps=LOAD_TARGET_EPS,
+    ramp_start_eps=LOAD_RAMP_START_EPS,
+    ramp_sec=LOAD_RAMP_SEC,
+    tick_ms=LOAD_TICK_MS,
+    max_batch=LOAD_MAX_BATCH,
+    max_lag_sec=LOAD_MAX_LAG_SEC,
+) if REPLAY_MODE == "load" else None
+
+# Events waiting for the next frame (frame-mode clients only).
+pending_frame: deque = deque(maxlen=FRAME_MAX_EVENTS)
+pending_frame_spike = False
+pending_frame_dropped = 0
+FRAME_EVENTS_DROPPED = Counter(
+    "fraud_frame_events_dropped_total", "Events coalesced out of a full frame buffer before being sent.")
+
+# Bumped on every change the snapshot shows (events, actions); the
+# serialized snapshot per mode is reused until then: mode -> (version, built_at, seq, text).
+state_version = 0
+snapshot_cache: Dict[str, tuple] = {}
 
 
 def compute_kpis(now: float) -> Dict[str, Any]:
-    while last_60s_scores and (now - last_60s_scores[0][0]) > 60:
-        last_60s_scores.popleft()
-    while last_60s_latency and (now - last_60s_latency[0][0]) > 60:
-        last_60s_latency.popleft()
-
-    txn_count = len(last_60s_scores)
-    high = sum(1 for _, r in last_60s_scores if r == "HIGH")
-    med = sum(1 for _, r in last_60s_scores if r == "MEDIUM")
-
-    avg_latency = (
-        sum(v for _, v in last_60s_latency) / len(last_60s_latency)
-        if last_60s_latency else 0.0
-    )
+    """
+    Original 60s KPI keys plus latency percentiles and 1m/5m/15m/1h windows.
+    """
+    return kpi_engine.compute(now)
 
-    return {
-        "txn_per_min": txn_count,
-        "alerts_per_min": high + med,
-        "high_risk_pct": round((high / txn_count) * 100, 2) if txn_count else 0.0,
-        "avg_latency_ms": round(avg_latency, 2),
-    }
 
+async def broadcast(payload: Dict[str, Any], mode: Optional[str] = None):
+    # Serialized once, queued per client; never waits on a client's socket.
+    await hub.broadcast(payload, mode=mode)
 
-async def broadcast(payload: Dict[str, Any]):
-    dead = []
-    for ws in clients:
-        try:
-            await ws.send_json(payload)
-        except Exception:
-            dead.append(ws)
-    for ws in dead:
-        if ws in clients:
-            clients.remove(ws)
+
+def snapshot_message(mode: str) -> Tuple[str, int]:
+    """
+    Pre-serialized snapshot and the stream seq it is current to. Rebuilt only
+    when state changed, it is older than WS_SNAPSHOT_MAX_AGE_SEC (KPI windows
+    move with time), or the replay buffer no longer covers its seq.
+    """
+    now = time.time()
+    cached = snapshot_cache.get(mode)
+    if cached is not None:
+        version, built_at, seq, text = cached
+        if version == state_version and now - built_at < WS_SNAPSHOT_MAX_AGE_SEC:
+            return text, seq
+
+    seq = hub.seq[mode]
+    text = dumps({
+        "type": "snapshot",
+        "mode": mode,
+        "stream": hub.stream_id,
+        "seq": seq,
+        "kpis": compute_kpis(now),
+        "recent_events": event_store.recent(RECENT_EVENTS_SNAPSHOT),
+        "analyst_actions": list(event_store.actions),
+    })
+    snapshot_cache[mode] = (state_version, now, seq, text)
+    return text, seq
 
 
 @app.post("/analyst/action")
@@ -347,65 +947,439 @@ async def analyst_action(req: AnalystActionRequest):
         "notes": req.notes,
     }
 
-    analyst_actions.appendleft(record)
-    action_by_event_id[req.event_id] = record
-
-    for ev in recent_events:
-        if ev.get("event_id") == req.event_id:
-            ev["analyst_action"] = action
-            break
-
-    await broadcast({
-        "type": "action_update",
-        "record": record
-    })
+    # Every worker (this one included) applies it when the bus delivers it.
+    event_found = event_store.get(req.event_id) is not None
+    if not await bus.publish("action", {"record": record}):
+        return {"ok": False, "error": "State bus unavailable; action not recorded"}
 
-    return {"ok": True, "record": record}
+    return {"ok": True, "record": record, "event_found": event_found}
 
 
 @app.websocket("/ws")
-async def ws_endpoint(ws: WebSocket):
+async def ws_endpoint(ws: WebSocket, mode: str = "tick", since: Optional[int] = None, stream: Optional[str] = None):
+    """
+    ?mode=tick (default) sends one message per event; ?mode=frame sends one
+    "frame" every FRAME_INTERVAL_MS with the new events (at most
+    FRAME_MAX_EVENTS, newest kept; "events_dropped" counts the rest) and one
+    KPI snapshot.
+
+    Every broadcast message carries "seq". Reconnecting with
+    ?since=<last seq>&stream=<stream id> replays only the missed messages
+    after a "resume" message; if they are no longer buffered, a snapshot
+    is sent instead.
+    """
+    mode = "frame" if mode.strip().lower() == "frame" else "tick"
     await ws.accept()
-    clients.append(ws)
+    # Register and queue the backlog before the first await, so nothing
+    # broadcast in between is lost or duplicated; queued messages go out
+    # once the sender starts.
+    conn = hub.add(ws, mode=mode)
+    explain_tasks = set()  # in-flight explain streams, cancelled on disconnect
     try:
-        now = time.time()
-        await ws.send_json({
-            "type": "snapshot",
-            "kpis": compute_kpis(now),
-            "recent_events": list(recent_events),
-            "analyst_actions": list(analyst_actions),
-        })
+        if since is not None and hub.resume(conn, since, stream):
+            first = dumps({"type": "resume", "mode": mode, "stream": hub.stream_id, "since": since, "seq": hub.seq[mode]})
+        else:
+            first, seq = snapshot_message(mode)
+            if not hub.replay(conn, seq):
+                snapshot_cache.pop(mode, None)
+                first, seq = snapshot_message(mode)
+        await ws.send_text(first)
+        conn.start()
         while True:
-            await asyncio.sleep(1)
+            message = await ws.receive_text()
+            task = handle_ws_message(conn, message)
+            if task is not None:
+                explain_tasks.add(task)
+                task.add_done_callback(explain_tasks.discard)
     except WebSocketDisconnect:
-        if ws in clients:
-            clients.remove(ws)
+        pass
+    finally:
+        hub.remove(conn)
+        for task in list(explain_tasks):
+            task.cancel()
+
+
+def handle_ws_message(conn, message: str) -> Optional[asyncio.Task]:
+    """
+    Client -> server messages. Currently only:
+    {"type": "explain", "request_id": "...", "query": "...", "mode": ..., "transaction": ..., "case_id": ...}
+    """
+    try:
+        data = json.loads(message)
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or data.get("type") != "explain":
+        return None
+
+    request_id = data.get("request_id")
+    try:
+        req = ExplainRequest(**{k: v for k, v in data.items() if k not in {"type", "request_id"}})
+    except ValidationError as e:
+        conn.offer(dumps({"type": "explain_error", "request_id": request_id, "error": str(e)}), "explain_error")
+        return None
+
+    return asyncio.create_task(stream_explain_ws(conn, request_id, req))
+
+
+@app.get("/replay/status")
+async def replay_status():
+    status = {"mode": REPLAY_MODE}
+    if load_generator is not None:
+        status.update(load_generator.stats())
+    return status
+
+
+@app.get("/ws/stats")
+async def ws_stats():
+    return hub.stats()
+
+
+@app.get("/bus/stats")
+def bus_stats():
+    return bus.stats()
+
+
+@app.get("/events/stats")
+async def events_stats():
+    # async: the store is only touched from the event loop.
+    stats = event_store.stats()
+    stats["log"] = event_log.stats() if event_log is not None else None
+    return stats
+
+
+@app.get("/events")
+def events_history(
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    risk_band: Optional[str] = None,
+    decision: Optional[str] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+):
+    """
+    Event history from the persistent log, newest first.
+    - since / until: epoch seconds
+    - risk_band / decision: comma-separated, e.g. risk_band=HIGH,MEDIUM
+    - cursor: next_cursor from the previous page
+    """
+    if event_log is None:
+        return {"error": "Event log is disabled (EVENT_LOG_ENABLED=false)."}
+
+    after = None
+    if cursor:
+        ts, _, event_id = cursor.partition(":")
+        try:
+            after = (float(ts), event_id)
+        except ValueError:
+            return {"error": "Invalid cursor."}
+
+    def values(param: Optional[str]) -> Optional[List[str]]:
+        return [v.strip().upper() for v in param.split(",") if v.strip()] if param else None
+
+    rows, next_after = event_log.query(
+        since=since,
+        until=until,
+        risk_bands=values(risk_band),
+        decisions=values(decision),
+        limit=max(1, min(limit, 1000)),
+        cursor=after,
+    )
+    actions = event_log.actions_for([r["event_id"] for r in rows])
+    for r in rows:
+        r["analyst_action"] = actions.get(r["event_id"])
+
+    return {
+        "events": rows,
+        "next_cursor": f"{next_after[0]!r}:{next_after[1]}" if next_after else None,
+    }
 
 
 # ---------------------------
-# STARTUP: REPLAY LOOP
+# STARTUP, READINESS + REPLAY LOOP
 # ---------------------------
+def process_started_at() -> float:
+    """Wall-clock start of this process (interpreter start and imports included)."""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - (uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return time.time()
+
+
+PROCESS_STARTED_AT = process_started_at()
+startup_timings: Dict[str, float] = {"imports_and_init": round(time.time() - PROCESS_STARTED_AT, 3)}
+startup_error: Optional[str] = None
+model_ready = asyncio.Event()
+replay_data_loaded = False
+ready_at: Optional[float] = None
+
+Gauge("fraud_time_to_ready_seconds", "Process start to first ready (model warmed, replay data loaded).",
+      lambda: ready_at - PROCESS_STARTED_AT if ready_at else None)
+
+
+def readiness_checks() -> Dict[str, bool]:
+    return {
+        "model_warmed": model_ready.is_set(),
+        # Followers do not replay; they need the producer's event stream instead.
+        "replay_data_loaded": replay_data_loaded if bus.is_producer else bus.connected,
+    }
+
+
+def mark_ready():
+    global ready_at
+    if ready_at is None and all(readiness_checks().values()):
+        ready_at = time.time()
+        print(f"Ready in {ready_at - PROCESS_STARTED_AT:.2f}s since process start ({startup_timings})")
+
+
+def timed(stage: str, fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    startup_timings[stage] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def load_model():
+    global model, predictor, inference_engine
+    model = joblib.load(MODEL_PATH)
+    predictor, inference_engine = load_predictor(model, INFERENCE_ENGINE, COMPILED_MAX_ROWS)
+
+
+def warm_up_model():
+    """
+    Push the row counts real traffic uses through the scoring path so the
+    first requests don't pay for lazy initialisation (xgboost's predictor
+    setup, both compiled-evaluator paths, scoring pool workers).
+    """
+    sizes = sorted({1, COMPILED_MAX_ROWS + 1, MICROBATCH_MAX_SIZE, REPLAY_CHUNK_ROWS})
+    for _ in range(MODEL_WARMUP_ROUNDS):
+        scoring_pool.predict(encoder.encode_one({}))
+        for n in sizes:
+            scoring_pool.predict(encoder.encode_many([{}] * n))
+
+
+async def load_and_warm_model():
+    global startup_error
+    try:
+        await asyncio.to_thread(timed, "model_load", load_model)
+        await asyncio.to_thread(timed, "scoring_pool", scoring_pool.start)
+        await asyncio.to_thread(timed, "warmup", warm_up_model)
+    except Exception as e:
+        startup_error = f"Model load failed: {type(e).__name__}: {e}"
+        print(startup_error)
+        return
+    model_ready.set()
+    mark_ready()
+
+
 @app.on_event("startup")
 async def startup():
-    asyncio.create_task(start_replay_after_delay())
+    asyncio.create_task(load_and_warm_model())
+    if MICROBATCH_ENABLED:
+        batcher.start()
+    asyncio.create_task(frame_loop())
+    if event_log is not None:
+        asyncio.create_task(event_log_loop())
+    asyncio.create_task(asyncio.to_thread(load_case_embeddings))
+    await bus.start(on_bus_message, on_elected=start_producer, snapshot=sync_messages)
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await batcher.stop()
+    scoring_pool.shutdown()
+    await bus.stop()
+    if event_log is not None and event_log.writer:
+        await asyncio.to_thread(event_log.flush)
+    await aclose_clients()
+
+
+async def start_producer():
+    # Only the elected worker replays and writes the event log; the others
+    # receive its events over the bus.
+    if event_log is not None:
+        await asyncio.to_thread(event_log.refresh)
+        event_log.writer = True
+    asyncio.create_task(start_replay_when_ready())
+
+
+async def start_replay_when_ready():
+    await model_ready.wait()
+    asyncio.create_task(replay_loop())
 
 
-async def start_replay_after_delay():
-    await asyncio.sleep(5)
-    asyncio.create_task(replay_loop())
+async def publish_event(row: Dict[str, Any], scored: Dict[str, Any], spike: bool):
+    event = {
+        "event_id": str(uuid.uuid4()),
+        "analyst_action": None,
+        "ts": time.time(),
+        "risk_band": scored["risk_band"],
+        "decision": scored["decision"],
+        "fraud_probability": scored["fraud_probability"],
+        "latency_ms": scored["latency_ms"],
+        "proposed": row.get("proposed", None),
+        "source": row.get("source", None),
+        "device_os": row.get("device_os", None),
+        "payment_type": row.get("payment_type", None),
+    }
+    await bus.publish("event", {"event": event, "spike": spike})
+
+
+async def on_bus_message(channel: str, msg: Dict[str, Any]):
+    if channel == "event":
+        await apply_event(msg["event"], msg["spike"])
+    elif channel == "action":
+        await apply_action(msg["record"])
+    elif channel == "spike":
+        await broadcast(msg)
+    elif channel == "sync":
+        apply_sync(msg)
+    elif channel == "cache_invalidate":
+        response_cache.invalidate()
+
+
+# Sent by the producer's bus hub to each follower as it connects, so a late
+# or reconnecting worker starts from the producer's events, actions and KPI
+# buckets instead of waiting for new traffic. Chunked to stay well under the
+# bus line limit.
+SYNC_CHUNK = 500
+
+
+def sync_messages() -> List[Tuple[str, Dict[str, Any]]]:
+    events = event_store.recent(len(event_store))[::-1]  # oldest first
+    slots = kpi_engine.export_slots()
+    messages = [("sync", {"stage": "begin", "kpi_now_sec": kpi_engine.now_sec, "actions": list(event_store.actions)})]
+    messages += [("sync", {"stage": "kpis", "slots": slots[i:i + SYNC_CHUNK]}) for i in range(0, len(slots), SYNC_CHUNK)]
+    messages += [("sync", {"stage": "events", "events": events[i:i + SYNC_CHUNK]}) for i in range(0, len(events), SYNC_CHUNK)]
+    messages.append(("sync", {"stage": "end"}))
+    return messages
+
+
+def apply_sync(msg: Dict[str, Any]):
+    global state_version
+    stage = msg["stage"]
+    if stage == "begin":
+        event_store.clear()
+        event_store.actions.extend(msg["actions"])  # newest first, as stored
+        kpi_engine.restore(msg["kpi_now_sec"])
+    elif stage == "kpis":
+        kpi_engine.restore_slots(msg["slots"])
+    elif stage == "events":
+        for event in msg["events"]:
+            event_store.add(event)
+    elif stage == "end":
+        state_version += 1
+
+
+async def apply_event(event: Dict[str, Any], spike: bool):
+    global pending_frame_spike, pending_frame_dropped, state_version
+    ts = event["ts"]
+    EVENT_DELIVERY_SECONDS.observe(max(time.time() - ts, 0.0))
+
+    kpi_engine.record(ts, event["risk_band"], event["latency_ms"])
+    event_store.add(event)
+    state_version += 1
+    if event_log is not None and event_log.writer:
+        event_log.append_event(event)
+
+    # Frame clients get this event in the next frame; the per-event tick
+    # (and its KPI block) is only built while tick clients are connected
+    # (or recently left and may resume).
+    if hub.wants("frame"):
+        if len(pending_frame) == pending_frame.maxlen:
+            pending_frame_dropped += 1
+            FRAME_EVENTS_DROPPED.inc()
+        pending_frame.append(event)
+        pending_frame_spike = pending_frame_spike or spike
+
+    if hub.wants("tick"):
+        await broadcast({
+            "type": "tick",
+            "kpis": compute_kpis(ts),
+            "event": event,
+            "spike": spike
+        }, mode="tick")
+
+
+async def apply_action(record: Dict[str, Any]):
+    global state_version
+    event_store.apply_action(record)
+    state_version += 1
+    if event_log is not None and event_log.writer:
+        event_log.append_action(record)
+
+    await broadcast({
+        "type": "action_update",
+        "record": record
+    })
+
+
+async def event_log_loop():
+    # Parquet encoding and file I/O run in a worker thread, never on the loop.
+    while True:
+        await asyncio.sleep(1.0)
+        if event_log.due(time.time()):
+            try:
+                await asyncio.to_thread(event_log.flush)
+            except Exception as e:
+                print(f"Event log flush failed: {e}")
+
+
+async def frame_loop():
+    global pending_frame_spike, pending_frame_dropped
+    while True:
+        await asyncio.sleep(FRAME_INTERVAL_MS / 1000.0)
+        if not pending_frame:
+            continue
+
+        events = list(reversed(pending_frame))  # newest first, like the snapshot
+        pending_frame.clear()
+        spike, pending_frame_spike = pending_frame_spike, False
+        dropped, pending_frame_dropped = pending_frame_dropped, 0
+
+        now = time.time()
+        await broadcast({
+            "type": "frame",
+            "ts": now,
+            "kpis": compute_kpis(now),
+            "events": events,
+            "events_dropped": dropped,
+            "spike": spike,
+        }, mode="frame")
 
 
 async def replay_loop():
-    df = pd.read_csv(DATA_PATH)
+    global replay_data_loaded, startup_error
+    # Encoded matrix + display columns, memory-mapped (built once per CSV).
+    try:
+        dataset = await run_in_threadpool(timed, "replay_data", load_or_build, DATA_PATH, REPLAY_CACHE_DIR, encoder)
+    except Exception as e:
+        # Nobody awaits this task: surface the failure through /ready.
+        startup_error = f"Replay data load failed: {type(e).__name__}: {e}"
+        print(startup_error)
+        return
+    n_rows = len(dataset)
+    replay_data_loaded = True
+    mark_ready()
+
+    if load_generator is not None:
+        async def score_rows(idx):
+            return await run_in_threadpool(score_matrix, dataset.rows(idx))
 
-    fraud_rows = []
-    if "fraud_bool" in df.columns:
-        fraud_rows = df[df["fraud_bool"] == 1].to_dict(orient="records")
+        async def publish(j, scored):
+            await publish_event(dataset.display(j), scored, spike=False)
 
-    all_rows = df.to_dict(orient="records")
+        await load_generator.run(n_rows, score_rows, publish)
+        return
+
+    burst_pool = dataset.fraud_idx if len(dataset.fraud_idx) else np.arange(n_rows)
 
     i = 0
     last_spike = 0.0
+    queued: deque = deque()  # (row index, scored) scored ahead in chunks
 
     while True:
         now = time.time()
@@ -414,56 +1388,22 @@ async def replay_loop():
         if do_spike:
             last_spike = now
 
-            await broadcast({
+            await bus.publish("spike", {
                 "type": "spike",
                 "status": "start",
                 "burst_count": SPIKE_BURST_COUNT,
                 "ts": now
             })
 
-            for j in range(SPIKE_BURST_COUNT):
-                if fraud_rows:
-                    row = fraud_rows[(j + int(now)) % len(fraud_rows)]
-                else:
-                    row = all_rows[(j + int(now)) % len(all_rows)]
-
-                row = dict(row)
-                row.pop("fraud_bool", None)
-
-                scored = score_one(row)
-                ts = time.time()
-
-                last_60s_scores.append((ts, scored["risk_band"]))
-                last_60s_latency.append((ts, scored["latency_ms"]))
-
-                event_id = str(uuid.uuid4())
-                analyst_rec = action_by_event_id.get(event_id)
-
-                event = {
-                    "event_id": event_id,
-                    "analyst_action": analyst_rec["action"] if analyst_rec else None,
-                    "ts": ts,
-                    "risk_band": scored["risk_band"],
-                    "decision": scored["decision"],
-                    "fraud_probability": scored["fraud_probability"],
-                    "latency_ms": scored["latency_ms"],
-                    "proposed": row.get("proposed", None),
-                    "source": row.get("source", None),
-                    "device_os": row.get("device_os", None),
-                    "payment_type": row.get("payment_type", None),
-                }
-                recent_events.appendleft(event)
-
-                await broadcast({
-                    "type": "tick",
-                    "kpis": compute_kpis(ts),
-                    "event": event,
-                    "spike": True
-                })
+            idx = burst_pool[(np.arange(SPIKE_BURST_COUNT) + int(now)) % len(burst_pool)]
+            # Whole burst scored with a single model call.
+            burst_scores = await run_in_threadpool(score_matrix, dataset.rows(idx))
 
+            for j, scored in zip(idx, burst_scores):
+                await publish_event(dataset.display(int(j)), scored, spike=True)
                 await asyncio.sleep(SPIKE_BURST_SLEEP)
 
-            await broadcast({
+            await bus.publish("spike", {
                 "type": "spike",
                 "status": "end",
                 "ts": time.time()
@@ -472,39 +1412,13 @@ async def replay_loop():
             await asyncio.sleep(1.0)
             continue
 
-        row = df.iloc[i].to_dict()
-        row.pop("fraud_bool", None)
-
-        scored = score_one(row)
-        ts = time.time()
-
-        last_60s_scores.append((ts, scored["risk_band"]))
-        last_60s_latency.append((ts, scored["latency_ms"]))
-
-        event_id = str(uuid.uuid4())
-        analyst_rec = action_by_event_id.get(event_id)
-
-        event = {
-            "event_id": event_id,
-            "analyst_action": analyst_rec["action"] if analyst_rec else None,
-            "ts": ts,
-            "risk_band": scored["risk_band"],
-            "decision": scored["decision"],
-            "fraud_probability": scored["fraud_probability"],
-            "latency_ms": scored["latency_ms"],
-            "proposed": row.get("proposed", None),
-            "source": row.get("source", None),
-            "device_os": row.get("device_os", None),
-            "payment_type": row.get("payment_type", None),
-        }
-        recent_events.appendleft(event)
+        if not queued:
+            idx = (i + np.arange(REPLAY_CHUNK_ROWS)) % n_rows
+            scores = await run_in_threadpool(score_matrix, dataset.rows(idx))
+            queued.extend(zip(idx, scores))
+            i = (i + REPLAY_CHUNK_ROWS) % n_rows
 
-        await broadcast({
-            "type": "tick",
-            "kpis": compute_kpis(ts),
-            "event": event,
-            "spike": False
-        })
+        j, scored = queued.popleft()
+        await publish_event(dataset.display(int(j)), scored, spike=False)
 
-        i = (i + 1) % len(df)
         await asyncio.sleep(0.5)
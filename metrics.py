@@ -0,0 +1,134 @@
+import threading
+from bisect import bisect_left
+from typing import Dict, Any, Callable, List, Optional, Sequence, Tuple
+
+# ---------------------------------------------
+# Prometheus Metrics
+# ---------------------------------------------
+# Minimal histograms, counters and callback gauges rendered in the
+# Prometheus text exposition format (GET /metrics). Modules define their
+# metrics at import time; every metric registers itself in REGISTRY.
+#
+# observe()/inc() are a bisect plus two additions under a per-metric lock
+# that is only ever held for those additions (uncontended in practice:
+# most observations come from the event loop thread), so they are cheap
+# enough to leave on at full load. Cumulative bucket counts are only
+# computed when /metrics is scraped.
+
+# Seconds; covers sub-millisecond model calls up to slow LLM completions.
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+REGISTRY: List[Any] = []
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _num(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v))
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last = +Inf), sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value: float, *labels: str):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(k, list(v[0]), v[1]) for k, v in self._series.items()]
+        for labels, counts, total in sorted(snapshot):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = _labels(self.label_names, labels, f'le="{_num(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            base = _labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{base} {_num(total)}")
+            lines.append(f"{self.name}_count{base} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, v in values:
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {_num(v)}")
+        return lines
+
+
+class Gauge:
+    """
+    Read at scrape time from fn(): a number, or {label values tuple: number}
+    when the gauge has labels.
+    """
+
+    def __init__(self, name: str, help: str, fn: Callable[[], Any], labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.fn = fn
+        REGISTRY.append(self)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        try:
+            value = self.fn()
+        except Exception:
+            return lines
+        if value is None:
+            return lines
+        if not isinstance(value, dict):
+            value = {(): value}
+        for labels, v in sorted(value.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {_num(v)}")
+        return lines
+
+
+def render(registry: Optional[List[Any]] = None) -> str:
+    lines: List[str] = []
+    for metric in REGISTRY if registry is None else registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,156 @@
+import asyncio
+import time
+from typing import Dict, Any, List, Callable, Optional
+
+# ---------------------------------------------
+# Adaptive Micro-Batcher
+# ---------------------------------------------
+# Concurrent /predict callers submit single transactions; a background task
+# collects them for up to max_wait_ms (or until max_batch_size is reached),
+# scores the whole batch with one model call and resolves each caller's future.
+# If the batch call raises (e.g. one request's features cannot be encoded),
+# its rows are re-scored one at a time so only the offending callers fail.
+
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512]
+
+
+class MicroBatcher:
+    def __init__(
+        self,
+        score_fn: Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]],
+        max_wait_ms: float = 2.0,
+        max_batch_size: int = 64,
+    ):
+        self.score_fn = score_fn
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._full: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: List[tuple] = []
+
+        # stats
+        self.batches = 0
+        self.items = 0
+        self.errors = 0
+        self.batch_failures = 0
+        self.batch_size_hist = {b: 0 for b in BATCH_SIZE_BUCKETS}
+        self.batch_size_hist["+Inf"] = 0
+        self.wait_ms_sum = 0.0
+        self.wait_ms_max = 0.0
+
+    def start(self):
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._full = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        # Callers still waiting (queued or in the cancelled batch) get an error, not a hang.
+        pending = list(self._inflight)
+        while self._queue is not None and not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        self._inflight = []
+        for _, fut, _ in pending:
+            if not fut.done():
+                fut.set_exception(RuntimeError("Micro-batcher stopped"))
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def submit(self, features: Dict[str, Any]) -> Dict[str, Any]:
+        fut = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((features, fut, time.perf_counter()))
+        if self._queue.qsize() >= self.max_batch_size:
+            self._full.set()
+        return await fut
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            self._inflight = batch  # same list, so rows added below are covered too
+
+            if self.max_wait > 0 and self._queue.qsize() + 1 < self.max_batch_size:
+                try:
+                    await asyncio.wait_for(self._full.wait(), timeout=self.max_wait)
+                except asyncio.TimeoutError:
+                    pass
+            self._full.clear()
+
+            while len(batch) < self.max_batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            dispatched = time.perf_counter()
+            self._record(batch, dispatched)
+
+            rows = [features for features, _, _ in batch]
+            try:
+                # Scoring is CPU-bound: keep it off the event loop.
+                results = await loop.run_in_executor(None, self.score_fn, rows)
+            except Exception:
+                self.batch_failures += 1
+                results = await loop.run_in_executor(None, self._score_each, rows)
+
+            for (_, fut, _), result in zip(batch, results):
+                if fut.done():
+                    continue
+                if isinstance(result, Exception):
+                    self.errors += 1
+                    fut.set_exception(result)
+                else:
+                    fut.set_result(result)
+            self._inflight = []
+
+    def _score_each(self, rows: List[Dict[str, Any]]) -> List[Any]:
+        """Per-row fallback after a failed batch: a result or the row's exception."""
+        out: List[Any] = []
+        for row in rows:
+            try:
+                out.append(self.score_fn([row])[0])
+            except Exception as e:
+                out.append(e)
+        return out
+
+    def _record(self, batch, dispatched: float):
+        size = len(batch)
+        self.batches += 1
+        self.items += size
+
+        bucket = next((b for b in BATCH_SIZE_BUCKETS if size <= b), "+Inf")
+        self.batch_size_hist[bucket] += 1
+
+        for _, _, enqueued in batch:
+            wait_ms = (dispatched - enqueued) * 1000.0
+            self.wait_ms_sum += wait_ms
+            if wait_ms > self.wait_ms_max:
+                self.wait_ms_max = wait_ms
+
+    def _cumulative_hist(self) -> Dict[str, int]:
+        """le_<n> = batches of at most n rows (cumulative, like Prometheus buckets)."""
+        out, total = {}, 0
+        for b, n in self.batch_size_hist.items():
+            total += n
+            out[f"le_{b}"] = total
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "max_batch_size": self.max_batch_size,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.batches,
+            "items": self.items,
+            "errors": self.errors,
+            "batch_failures": self.batch_failures,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "batch_size_histogram": self._cumulative_hist(),
+            "avg_wait_ms": round(self.wait_ms_sum / self.items, 3) if self.items else 0.0,
+            "max_wait_ms_observed": round(self.wait_ms_max, 3),
+        }
@@ -0,0 +1,118 @@
+import re
+from typing import Dict, Any, List, Callable, Tuple
+
+from tokens import count_tokens, truncate_tokens
+
+# ---------------------------------------------
+# Token-Budgeted Prompt Assembly
+# ---------------------------------------------
+# The fixed parts of a prompt (instructions, question, transaction) are
+# always kept; retrieved entries (KB docs, historical cases) fill whatever
+# budget is left. Within each section entries are ranked by relevance score,
+# near-duplicates (word-set Jaccard >= dedupe_threshold) are dropped, and
+# long entries are cut to item_max_tokens. Sections take turns by rank, so
+# the best entry of every section goes in before the second-best of any.
+# prompt_tokens in the stats is the text count, without the chat overhead.
+
+MIN_ITEM_TOKENS = 32
+# Tokens the chat format adds around a single user message (role and
+# message delimiters, reply priming); reserved from the budget.
+CHAT_OVERHEAD_TOKENS = 8
+_WORD = re.compile(r"\w+")
+
+
+class Section:
+    def __init__(self, header: str, empty: str, items: List[Tuple[float, str]]):
+        self.header = header
+        self.empty = empty
+        self.items = items  # (relevance score, rendered entry)
+
+    def render(self, entries: List[str]) -> str:
+        if not entries:
+            return self.empty
+        body = "\n".join(entries)
+        return f"{self.header}\n{body}" if self.header else body
+
+
+def _words(text: str) -> frozenset:
+    return frozenset(w.lower() for w in _WORD.findall(text))
+
+
+def _similar(a: frozenset, b: frozenset, threshold: float) -> bool:
+    if not a or not b:
+        return a == b
+    return len(a & b) / len(a | b) >= threshold
+
+
+class PromptBuilder:
+    def __init__(self, budget_tokens: int = 2000, item_max_tokens: int = 250, dedupe_threshold: float = 0.85):
+        self.budget_tokens = budget_tokens
+        self.item_max_tokens = item_max_tokens
+        self.dedupe_threshold = dedupe_threshold
+
+    def _rank(self, section: Section) -> Tuple[List[str], int, int]:
+        """Ranked, deduped, per-item-truncated entries -> (entries, duplicates, truncated)."""
+        kept, seen = [], []
+        duplicates = truncated = 0
+        for _, text in sorted(section.items, key=lambda item: item[0], reverse=True):
+            words = _words(text)
+            if any(_similar(words, other, self.dedupe_threshold) for other in seen):
+                duplicates += 1
+                continue
+            seen.append(words)
+            short = truncate_tokens(text, self.item_max_tokens)
+            truncated += short != text
+            kept.append(short)
+        return kept, duplicates, truncated
+
+    def build(self, render: Callable[..., str], sections: Dict[str, Section]) -> Tuple[str, Dict[str, Any]]:
+        """
+        render(**{name: section_text}) -> full prompt. Returns the prompt and
+        per-request stats (prompt_tokens plus what each section kept).
+        """
+        base_tokens = count_tokens(render(**{name: s.empty for name, s in sections.items()}))
+        remaining = self.budget_tokens - CHAT_OVERHEAD_TOKENS - base_tokens
+
+        ranked = {name: self._rank(s) for name, s in sections.items()}
+        chosen: Dict[str, List[str]] = {name: [] for name in sections}
+        stats = {
+            name: {"candidates": len(s.items), "used": 0, "duplicates": dup, "truncated": trunc}
+            for name, s in sections.items()
+            for _, dup, trunc in [ranked[name]]
+        }
+
+        # Headers are charged when a section gets its first entry.
+        open_sections = [name for name in sections if ranked[name][0]]
+        rank = 0
+        while open_sections:
+            for name in list(open_sections):
+                entries = ranked[name][0]
+                if rank >= len(entries):
+                    open_sections.remove(name)
+                    continue
+                text = entries[rank]
+                cost = count_tokens(text) + 1
+                if not chosen[name]:
+                    cost += count_tokens(sections[name].header) - count_tokens(sections[name].empty)
+                if cost > remaining:
+                    # Squeeze a shortened entry in if there is room for one, then stop this section.
+                    room = remaining - (cost - count_tokens(text))
+                    if room >= MIN_ITEM_TOKENS:
+                        text = truncate_tokens(text, room)
+                        chosen[name].append(text)
+                        stats[name]["truncated"] += 1
+                        remaining -= cost - count_tokens(entries[rank]) + count_tokens(text)
+                    open_sections.remove(name)
+                    continue
+                chosen[name].append(text)
+                remaining -= cost
+            rank += 1
+
+        prompt = render(**{name: s.render(chosen[name]) for name, s in sections.items()})
+        for name in sections:
+            stats[name]["used"] = len(chosen[name])
+        return prompt, {
+            "prompt_tokens": count_tokens(prompt),
+            "budget_tokens": self.budget_tokens,
+            "sections": stats,
+        }
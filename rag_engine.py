@@ -1,10 +1,15 @@
 import os
+import time
+import asyncio
+import threading
+import numpy as np
 from dotenv import load_dotenv
 
-from openai import AzureOpenAI
-from azure.search.documents import SearchClient
-from azure.search.documents.models import VectorizedQuery
-from azure.core.credentials import AzureKeyCredential as SearchKeyCredential
+from embedding_cache import EmbeddingCache
+from vector_index import LocalVectorIndex, DOC_FIELDS
+from response_cache import KB_VERSION_PATH
+from metrics import Histogram
+from tracing import span
 
 load_dotenv()
 
@@ -20,59 +25,221 @@ search_endpoint = os.getenv("AZURE_SEARCH_ENDPOINT")
 search_admin_key = os.getenv("AZURE_SEARCH_ADMIN_KEY")
 index_name = os.getenv("AZURE_SEARCH_INDEX_NAME")
 
-missing = [
-    name for name, value in {
-        "AZURE_OPENAI_ENDPOINT": embeddings_endpoint,
-        "AZURE_OPENAI_CHAT_ENDPOINT": chat_endpoint,
-        "OPENAI_API_KEY": embeddings_key,
-        "AZURE_OPENAI_CHAT_KEY": chat_key,
-        "AZURE_OPENAI_EMBEDDINGS_DEPLOYMENT": embeddings_deployment,
-        "AZURE_OPENAI_CHAT_DEPLOYMENT": chat_deployment,
-        "AZURE_SEARCH_ENDPOINT": search_endpoint,
-        "AZURE_SEARCH_ADMIN_KEY": search_admin_key,
-        "AZURE_SEARCH_INDEX_NAME": index_name,
-    }.items()
-    if not value
-]
-if missing:
-    raise RuntimeError(f"Missing required env vars: {', '.join(missing)}")
-
-embed_client = AzureOpenAI(
-    api_version=api_version,
-    azure_endpoint=embeddings_endpoint,
-    api_key=embeddings_key,
-)
+# Retrieval backend: "azure" (Azure Cognitive Search, default) or "local"
+# (in-process vector index built by embed_and_upload.py, see vector_index.py).
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "azure").strip().lower()
+LOCAL_INDEX_PATH = os.getenv("LOCAL_INDEX_PATH", "data/vector_index")
 
-chat_client = AzureOpenAI(
-    api_version=api_version,
-    azure_endpoint=chat_endpoint,
-    api_key=chat_key,
-)
+# ---------------------------------------------
+# Lazy clients
+# ---------------------------------------------
+# Clients (and the OpenAI / Azure SDK imports behind them) are built on
+# first use, so the scoring API starts without any RAG configuration and
+# without paying for the SDK imports. A RAG call with missing settings
+# raises RAGUnavailable, naming the env vars it needs.
+
+class RAGUnavailable(RuntimeError):
+    pass
+
+
+EMBED_ENV = {
+    "AZURE_OPENAI_ENDPOINT": embeddings_endpoint,
+    "OPENAI_API_KEY": embeddings_key,
+    "AZURE_OPENAI_EMBEDDINGS_DEPLOYMENT": embeddings_deployment,
+}
+CHAT_ENV = {
+    "AZURE_OPENAI_CHAT_ENDPOINT": chat_endpoint,
+    "AZURE_OPENAI_CHAT_KEY": chat_key,
+    "AZURE_OPENAI_CHAT_DEPLOYMENT": chat_deployment,
+}
+SEARCH_ENV = {
+    "AZURE_SEARCH_ENDPOINT": search_endpoint,
+    "AZURE_SEARCH_ADMIN_KEY": search_admin_key,
+    "AZURE_SEARCH_INDEX_NAME": index_name,
+}
+
+
+def _require(env):
+    missing = [name for name, value in env.items() if not value]
+    if missing:
+        raise RAGUnavailable(f"Missing required env vars: {', '.join(missing)}")
+
+
+def _openai(async_client, env, endpoint, key):
+    _require(env)
+    from openai import AzureOpenAI, AsyncAzureOpenAI
+    cls = AsyncAzureOpenAI if async_client else AzureOpenAI
+    return cls(api_version=api_version, azure_endpoint=endpoint, api_key=key)
+
+
+def _search(async_client):
+    _require(SEARCH_ENV)
+    from azure.core.credentials import AzureKeyCredential as SearchKeyCredential
+    if async_client:
+        from azure.search.documents.aio import SearchClient
+    else:
+        from azure.search.documents import SearchClient
+    return SearchClient(
+        endpoint=search_endpoint,
+        index_name=index_name,
+        credential=SearchKeyCredential(search_admin_key),
+    )
+
+
+def _local_index():
+    try:
+        index = LocalVectorIndex(LOCAL_INDEX_PATH)
+    except FileNotFoundError:
+        raise RAGUnavailable(f"No local vector index at {LOCAL_INDEX_PATH}; run embed_and_upload.py")
+    built_with = index.meta.get("deployment")
+    if built_with and embeddings_deployment and built_with != embeddings_deployment:
+        raise RAGUnavailable(
+            f"Local vector index at {LOCAL_INDEX_PATH} was built with {built_with!r}, "
+            f"queries are embedded with {embeddings_deployment!r}; re-run embed_and_upload.py"
+        )
+    print(f"Local vector index: {len(index)} docs from {LOCAL_INDEX_PATH}")
+    return index
+
+
+# Async clients keep pooled keep-alive connections (httpx / aiohttp), so the
+# async endpoints never park a threadpool worker on an LLM round trip.
+_BUILDERS = {
+    "embed": lambda: _openai(False, EMBED_ENV, embeddings_endpoint, embeddings_key),
+    "chat": lambda: _openai(False, CHAT_ENV, chat_endpoint, chat_key),
+    "search": lambda: _search(False),
+    "async_embed": lambda: _openai(True, EMBED_ENV, embeddings_endpoint, embeddings_key),
+    "async_chat": lambda: _openai(True, CHAT_ENV, chat_endpoint, chat_key),
+    "async_search": lambda: _search(True),
+    "local_index": _local_index,
+}
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _client(name):
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = _BUILDERS[name]()
+    return client
+
+
+# embed_and_upload.py replaces the index directory and then rewrites the
+# kb_version marker; either change (new inode or mtime) reloads the index,
+# so retrieval never serves documents from before a re-ingest.
+_local_index_sig = None
+
+
+def _file_sig(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns
+
+
+def _current_local_index(query_vector):
+    global _local_index_sig
+    sig = (_file_sig(os.path.join(LOCAL_INDEX_PATH, "meta.json")), _file_sig(KB_VERSION_PATH))
+    if sig != _local_index_sig:
+        with _clients_lock:
+            _clients.pop("local_index", None)
+            _local_index_sig = sig
+    index = _client("local_index")
+
+    dims = index.meta.get("dims")
+    if dims is not None and len(query_vector) != dims:
+        raise RAGUnavailable(
+            f"Query vector has {len(query_vector)} dims, local vector index at "
+            f"{LOCAL_INDEX_PATH} has {dims}; re-run embed_and_upload.py"
+        )
+    return index
+
+
+def _use_local_index():
+    if RETRIEVAL_BACKEND not in {"azure", "local"}:
+        raise RAGUnavailable(f"Unknown RETRIEVAL_BACKEND: {RETRIEVAL_BACKEND}")
+    return RETRIEVAL_BACKEND == "local"
+
+
+def _vector_query(query_vector, k):
+    from azure.search.documents.models import VectorizedQuery
+    return VectorizedQuery(
+        vector=np.asarray(query_vector, dtype=np.float32).tolist(),
+        fields="contentVector",
+        k_nearest_neighbors=k,
+    )
 
-search_client = SearchClient(
-    endpoint=search_endpoint,
-    index_name=index_name,
-    credential=SearchKeyCredential(search_admin_key),
+
+def rag_status():
+    """Which RAG stages are configured and which clients exist so far (no network calls)."""
+    retrieval = SEARCH_ENV if RETRIEVAL_BACKEND == "azure" else {
+        "LOCAL_INDEX_PATH": LOCAL_INDEX_PATH if os.path.exists(LOCAL_INDEX_PATH) else None,
+    }
+    return {
+        "retrieval_backend": RETRIEVAL_BACKEND,
+        "configured": {
+            stage: not [n for n, v in env.items() if not v]
+            for stage, env in (("embed", EMBED_ENV), ("search", retrieval), ("chat", CHAT_ENV))
+        },
+        "clients": sorted(_clients),
+    }
+
+# Per-stage timeouts and in-flight limits for the async pipeline.
+EMBED_TIMEOUT_SEC = float(os.getenv("RAG_EMBED_TIMEOUT_SEC", "10"))
+SEARCH_TIMEOUT_SEC = float(os.getenv("RAG_SEARCH_TIMEOUT_SEC", "10"))
+CHAT_TIMEOUT_SEC = float(os.getenv("RAG_CHAT_TIMEOUT_SEC", "60"))
+
+embed_slots = asyncio.Semaphore(int(os.getenv("RAG_MAX_CONCURRENT_EMBED", "16")))
+search_slots = asyncio.Semaphore(int(os.getenv("RAG_MAX_CONCURRENT_SEARCH", "16")))
+chat_slots = asyncio.Semaphore(int(os.getenv("RAG_MAX_CONCURRENT_CHAT", "8")))
+
+
+# outcome: ok | timeout | cancelled | error
+RAG_STAGE_SECONDS = Histogram("fraud_rag_stage_seconds", "RAG stage latency (embed, search, chat).", ["stage", "outcome"])
+
+
+class RAGStageTimeout(Exception):
+    def __init__(self, stage: str, timeout: float):
+        super().__init__(f"RAG stage '{stage}' timed out after {timeout:g}s")
+        self.stage = stage
+
+embedding_cache = EmbeddingCache(
+    max_items=int(os.getenv("EMBED_CACHE_MAX_ITEMS", "1024")),
+    ttl_sec=float(os.getenv("EMBED_CACHE_TTL_SEC", "86400")),
+    disk_path=os.getenv("EMBED_CACHE_DISK_PATH"),
 )
 
 def embed_query(text):
-    result = embed_client.embeddings.create(
+    cached = embedding_cache.get(text, embeddings_deployment)
+    if cached is not None:
+        return cached
+
+    result = _client("embed").embeddings.create(
         model=embeddings_deployment,
         input=[text],
     )
-    return result.data[0].embedding
+    return embedding_cache.put(text, embeddings_deployment, result.data[0].embedding)
+
+def embed_texts(texts):
+    """Batch embeddings for offline/background work (not cached)."""
+    result = _client("embed").embeddings.create(
+        model=embeddings_deployment,
+        input=list(texts),
+    )
+    return [item.embedding for item in sorted(result.data, key=lambda d: d.index)]
 
-def retrieve_docs(query_vector, k=3):
-    results = search_client.search(
+def retrieve_docs(query_vector, k=3, filter=None, select=DOC_FIELDS):
+    if _use_local_index():
+        return _current_local_index(query_vector).search(query_vector, k=k, filter=filter, select=select)
+
+    results = _client("search").search(
         search_text="",
-        vector_queries=[
-            VectorizedQuery(
-                vector=query_vector,
-                fields="contentVector",
-                k_nearest_neighbors=k,
-            )
-        ],
-        select=["id", "title", "description", "tags", "type", "severity", "created_at"],
+        vector_queries=[_vector_query(query_vector, k)],
+        filter=filter,
+        select=select,
     )
     return [r for r in results]
 
@@ -98,7 +265,7 @@ def build_prompt(user_query, docs):
     return "\n".join(lines)
 
 def explain(prompt: str):
-    response = chat_client.chat.completions.create(
+    response = _client("chat").chat.completions.create(
         model=chat_deployment,
         messages=[{"role": "user", "content": prompt}],
     )
@@ -112,6 +279,142 @@ def explain_with_rag(user_query: str, k: int = 3):
     prompt = build_prompt(user_query, docs)
     return explain(prompt)
 
+# ---------------------------------------------
+# Async variants
+# ---------------------------------------------
+async def _stage(name, slots, timeout, coro):
+    # The timeout (and the latency metric) covers waiting for a slot too, so
+    # a saturated stage fails fast instead of queueing without bound.
+    async def run():
+        async with slots:
+            return await coro
+
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        result = await asyncio.wait_for(run(), timeout=timeout)
+        outcome = "ok"
+        return result
+    except asyncio.TimeoutError:
+        outcome = "timeout"
+        raise RAGStageTimeout(name, timeout)
+    except asyncio.CancelledError:
+        outcome = "cancelled"
+        raise
+    finally:
+        coro.close()  # never started if the slot wait timed out
+        RAG_STAGE_SECONDS.observe(time.perf_counter() - start, name, outcome)
+
+async def aembed_query(text):
+    cached = await embedding_cache.aget(text, embeddings_deployment)
+    if cached is not None:
+        return cached
+
+    with span("embed_query"):
+        result = await _stage("embed", embed_slots, EMBED_TIMEOUT_SEC, _client("async_embed").embeddings.create(
+            model=embeddings_deployment,
+            input=[text],
+        ))
+    return await embedding_cache.aput(text, embeddings_deployment, result.data[0].embedding)
+
+async def aretrieve_docs(query_vector, k=3, filter=None, select=DOC_FIELDS):
+    if _use_local_index():
+        # A matrix-vector product over the KB; cheaper inline than a thread hop.
+        index = _current_local_index(query_vector)
+        with span("retrieve_docs"):
+            start = time.perf_counter()
+            docs = index.search(query_vector, k=k, filter=filter, select=select)
+            RAG_STAGE_SECONDS.observe(time.perf_counter() - start, "search", "ok")
+        return docs
+
+    client = _client("async_search")
+
+    async def run():
+        results = await client.search(
+            search_text="",
+            vector_queries=[_vector_query(query_vector, k)],
+            filter=filter,
+            select=select,
+        )
+        return [r async for r in results]
+
+    with span("retrieve_docs"):
+        return await _stage("search", search_slots, SEARCH_TIMEOUT_SEC, run())
+
+async def aexplain(prompt: str):
+    with span("explain"):
+        response = await _stage("chat", chat_slots, CHAT_TIMEOUT_SEC, _client("async_chat").chat.completions.create(
+            model=chat_deployment,
+            messages=[{"role": "user", "content": prompt}],
+        ))
+    return response.choices[0].message.content
+
+async def aexplain_stream(prompt: str):
+    """
+    Yield completion text deltas as they arrive. The chat timeout bounds the
+    whole stream, waiting for a chat slot included, not just the first token.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + CHAT_TIMEOUT_SEC
+
+    start = time.perf_counter()
+    outcome = "error"
+    acquired = False
+    stream = None
+    try:
+        await asyncio.wait_for(chat_slots.acquire(), timeout=CHAT_TIMEOUT_SEC)
+        acquired = True
+        # Until the stream opens; deltas arrive after the response headers.
+        with span("explain"):
+            stream = await asyncio.wait_for(
+                _client("async_chat").chat.completions.create(
+                    model=chat_deployment,
+                    messages=[{"role": "user", "content": prompt}],
+                    stream=True,
+                ),
+                timeout=deadline - loop.time(),
+            )
+        chunks = stream.__aiter__()
+        while True:
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), timeout=deadline - loop.time())
+            except StopAsyncIteration:
+                break
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+        outcome = "ok"
+    except asyncio.TimeoutError:
+        outcome = "timeout"
+        raise RAGStageTimeout("chat", CHAT_TIMEOUT_SEC)
+    except (asyncio.CancelledError, GeneratorExit):
+        outcome = "cancelled"
+        raise
+    finally:
+        # Whole stream, slot wait to last chunk.
+        RAG_STAGE_SECONDS.observe(time.perf_counter() - start, "chat", outcome)
+        # Release the HTTP response (and its pooled connection) even when
+        # the consumer stops early, times out or is cancelled.
+        if stream is not None:
+            try:
+                await stream.close()
+            except Exception:
+                pass
+        if acquired:
+            chat_slots.release()
+
+async def aclose_clients():
+    # Only the clients that were actually built.
+    for name in ("async_embed", "async_chat", "async_search"):
+        client = _clients.pop(name, None)
+        if client is not None:
+            await client.close()
+
+async def aexplain_with_rag(user_query: str, k: int = 3):
+    vector = await aembed_query(user_query)
+    docs = await aretrieve_docs(vector, k=k)
+    prompt = build_prompt(user_query, docs)
+    return await aexplain(prompt)
+
 if __name__ == "__main__":
     answer = explain("How do I detect fraud in real-time?")
     print(answer)
@@ -0,0 +1,160 @@
+import hashlib
+import json
+import os
+import shutil
+from typing import Dict, Any, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+from feature_encoder import FeatureEncoder
+
+# ---------------------------------------------
+# Pre-Encoded Replay Dataset Cache
+# ---------------------------------------------
+# One-time preprocessing of the replay CSV into:
+#   X.npy           float32 (n_rows, n_features) encoded feature matrix
+#   fraud.npy       int8 fraud_bool labels (-1 if the CSV has none)
+#   display_<c>.npy int32 codes for the event display columns
+#   meta.json       vocabularies for the display codes + cache key inputs
+# keyed by a hash of the CSV bytes and the model's feature layout, and
+# memory-mapped at startup so replay never holds the CSV as Python objects.
+
+DISPLAY_COLS = ["proposed", "source", "device_os", "payment_type"]
+CACHE_VERSION = 2
+CHUNK_ROWS = 50_000
+
+
+def cache_key(csv_path: str, feature_columns: Sequence[str], cat_cols: Sequence[str]) -> str:
+    h = hashlib.sha256()
+    h.update(f"v{CACHE_VERSION}".encode())
+    h.update(json.dumps([list(feature_columns), list(cat_cols), DISPLAY_COLS]).encode())
+    with open(csv_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class ReplayDataset:
+    def __init__(self, path: str):
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+
+        self.X = np.load(os.path.join(path, "X.npy"), mmap_mode="r")
+        self.fraud = np.load(os.path.join(path, "fraud.npy"), mmap_mode="r")
+        self.codes = {
+            c: np.load(os.path.join(path, f"display_{c}.npy"), mmap_mode="r")
+            for c in DISPLAY_COLS
+        }
+        self.vocab: Dict[str, List[Any]] = self.meta["vocab"]
+        self.fraud_idx = np.flatnonzero(np.asarray(self.fraud) == 1)
+
+    def __len__(self) -> int:
+        return self.X.shape[0]
+
+    def rows(self, idx: np.ndarray) -> np.ndarray:
+        """Encoded feature rows for the given indices (copied out of the mmap)."""
+        return np.take(self.X, idx, axis=0)
+
+    def display(self, i: int) -> Dict[str, Any]:
+        out = {}
+        for c in DISPLAY_COLS:
+            code = int(self.codes[c][i])
+            out[c] = self.vocab[c][code] if code >= 0 else None
+        return out
+
+
+def build(csv_path: str, out_path: str, encoder: FeatureEncoder):
+    # Physical lines bound the record count from above (blank lines and quoted
+    # newlines make it an overcount); X is cut to the parsed rows below.
+    with open(csv_path, "rb") as f:
+        n_rows = max(sum(1 for _ in f) - 1, 0)
+
+    tmp = out_path + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    X = np.lib.format.open_memmap(
+        os.path.join(tmp, "X.npy"), mode="w+", dtype=np.float32,
+        shape=(n_rows, encoder.n_features),
+    )
+    fraud = np.full(n_rows, -1, dtype=np.int8)
+    codes = {c: np.full(n_rows, -1, dtype=np.int32) for c in DISPLAY_COLS}
+    vocab: Dict[str, Dict[Any, int]] = {c: {} for c in DISPLAY_COLS}
+
+    start = 0
+    for chunk in pd.read_csv(csv_path, chunksize=CHUNK_ROWS):
+        stop = start + len(chunk)
+        columns = {c: chunk[c].tolist() for c in chunk.columns if c != "fraud_bool"}
+        X[start:stop] = encoder.encode_columns(columns)
+
+        if "fraud_bool" in chunk.columns:
+            fraud[start:stop] = chunk["fraud_bool"].fillna(-1).astype(np.int8).to_numpy()
+
+        for c in DISPLAY_COLS:
+            if c not in chunk.columns:
+                continue
+            lookup = vocab[c]
+            values = chunk[c].astype(object).where(chunk[c].notna(), None).tolist()
+            codes[c][start:stop] = [
+                -1 if v is None else lookup.setdefault(v, len(lookup)) for v in values
+            ]
+        start = stop
+
+    X.flush()
+    del X
+    if start < n_rows:
+        _truncate_rows(os.path.join(tmp, "X.npy"), start)
+    np.save(os.path.join(tmp, "fraud.npy"), fraud[:start])
+    for c in DISPLAY_COLS:
+        np.save(os.path.join(tmp, f"display_{c}.npy"), codes[c][:start])
+
+    meta = {
+        "version": CACHE_VERSION,
+        "csv_path": csv_path,
+        "n_rows": start,
+        "feature_columns": encoder.feature_columns,
+        "vocab": {c: [_jsonable(v) for v in vocab[c]] for c in DISPLAY_COLS},
+    }
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+    shutil.rmtree(out_path, ignore_errors=True)
+    os.replace(tmp, out_path)
+
+
+def _truncate_rows(npy_path: str, n_rows: int):
+    """Rewrite an .npy matrix keeping only its first n_rows rows."""
+    src = np.load(npy_path, mmap_mode="r")
+    out_tmp = npy_path + ".part"
+    dst = np.lib.format.open_memmap(out_tmp, mode="w+", dtype=src.dtype, shape=(n_rows,) + src.shape[1:])
+    for i in range(0, n_rows, CHUNK_ROWS):
+        stop = min(i + CHUNK_ROWS, n_rows)
+        dst[i:stop] = src[i:stop]
+    dst.flush()
+    del dst, src
+    os.replace(out_tmp, npy_path)
+
+
+def load_or_build(csv_path: str, cache_dir: str, encoder: FeatureEncoder) -> ReplayDataset:
+    key = cache_key(csv_path, encoder.feature_columns, encoder.cat_cols)
+    path = os.path.join(cache_dir, f"replay-{key[:16]}")
+    if not os.path.exists(os.path.join(path, "meta.json")):
+        print(f"Building replay cache for {csv_path} -> {path}")
+        os.makedirs(cache_dir, exist_ok=True)
+        build(csv_path, path, encoder)
+    return ReplayDataset(path)
+
+
+def _jsonable(v: Any) -> Any:
+    return v.item() if isinstance(v, np.generic) else v
+
+
+if __name__ == "__main__":
+    # One-time preprocessing: python replay_cache.py
+    import joblib
+
+    CAT_COLS = ["payment_type", "employment_status", "housing_status", "source", "device_os"]
+    encoder = FeatureEncoder(joblib.load("model/feature_columns.joblib"), CAT_COLS)
+    ds = load_or_build("data/transactions.csv", os.getenv("REPLAY_CACHE_DIR", "data/cache"), encoder)
+    print(f"Replay cache ready: {len(ds)} rows, {len(ds.fraud_idx)} fraud rows")
@@ -0,0 +1,166 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+# ---------------------------------------------
+# Semantic Response Cache
+# ---------------------------------------------
+# Caches /explain and /search responses keyed on the query embedding plus
+# the request context (endpoint, mode, transaction, case_id). A lookup hits
+# when a cached entry with the same context has cosine similarity above the
+# threshold and was produced against the current knowledge base version.
+#
+# The knowledge base version is a marker file rewritten by embed_and_upload.py
+# after every index load; a changed marker clears the cache.
+#
+# Each worker process holds its own cache, so hit rates are per worker and a
+# response cached in one worker is not visible to the others. Every worker
+# reads the same marker file, so a KB reload invalidates all of them; manual
+# invalidation (POST /rag/cache/invalidate) is fanned out over the state bus.
+
+KB_VERSION_PATH = os.getenv("KB_VERSION_PATH", "data/kb_version")
+
+
+def read_kb_version(path: str = KB_VERSION_PATH) -> str:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return ""
+
+
+def write_kb_version(path: str = KB_VERSION_PATH) -> str:
+    version = f"{int(time.time())}-{uuid.uuid4().hex[:8]}"
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp, path)
+    return version
+
+
+class SemanticResponseCache:
+    def __init__(
+        self,
+        max_items: int = 512,
+        ttl_sec: float = 900.0,
+        threshold: float = 0.95,
+        kb_version_path: str = KB_VERSION_PATH,
+    ):
+        self.max_items = max_items
+        self.ttl_sec = ttl_sec
+        self.threshold = threshold
+        self.kb_version_path = kb_version_path
+
+        # entry id -> (context, unit vector, response, created)
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._by_context: Dict[str, list] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+        self._kb_mtime: Optional[float] = None
+        self.kb_version = ""
+
+        # stats
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _check_kb_version(self):
+        try:
+            mtime = os.stat(self.kb_version_path).st_mtime
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._kb_mtime:
+            return
+        self._kb_mtime = mtime
+        version = read_kb_version(self.kb_version_path)
+        if version != self.kb_version:
+            self.kb_version = version
+            self._clear()
+
+    def _clear(self):
+        if self._entries:
+            self.invalidations += 1
+        self._entries.clear()
+        self._by_context.clear()
+
+    def invalidate(self):
+        with self._lock:
+            self._clear()
+
+    def _remove(self, entry_id: int):
+        context = self._entries.pop(entry_id)[0]
+        ids = self._by_context.get(context)
+        if ids is not None:
+            ids.remove(entry_id)
+            if not ids:
+                del self._by_context[context]
+
+    def get(self, context: str, vector) -> Optional[Dict[str, Any]]:
+        q = _unit(vector)
+        now = time.time()
+
+        with self._lock:
+            self._check_kb_version()
+
+            ids = list(self._by_context.get(context, ()))
+            for entry_id in ids:
+                if now - self._entries[entry_id][3] > self.ttl_sec:
+                    self._remove(entry_id)
+            ids = self._by_context.get(context)
+            if not ids:
+                self.misses += 1
+                return None
+
+            matrix = np.stack([self._entries[i][1] for i in ids])
+            sims = matrix @ q
+            best = int(np.argmax(sims))
+            if sims[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            entry_id = ids[best]
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            return self._entries[entry_id][2]
+
+    def put(self, context: str, vector, response: Dict[str, Any]):
+        with self._lock:
+            self._check_kb_version()
+
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (context, _unit(vector), response, time.time())
+            self._by_context.setdefault(context, []).append(entry_id)
+
+            while len(self._entries) > self.max_items:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "items": len(self._entries),
+            "max_items": self.max_items,
+            "ttl_sec": self.ttl_sec,
+            "threshold": self.threshold,
+            "kb_version": self.kb_version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def _unit(vector) -> np.ndarray:
+    v = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(v))
+    return v / norm if norm else v
@@ -0,0 +1,197 @@
+import multiprocessing as mp
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Dict, Any, Callable, Optional
+
+import joblib
+import numpy as np
+
+from tree_evaluator import load_predictor
+
+# ---------------------------------------------
+# Multi-Process Scoring Pool
+# ---------------------------------------------
+# Each worker process loads the model once and scores encoded matrices.
+# Small matrices travel by pickle; larger batches are written once into a
+# shared-memory input block, split into row ranges across the workers, and
+# each worker writes its probabilities into a shared output block.
+# Any pool failure degrades to the in-process fallback scorer.
+
+_worker_predictor = None
+
+
+def _init_worker(model_path: str, engine: str, compiled_max_rows: int):
+    global _worker_predictor
+    model = joblib.load(model_path)
+    # One process per core already; don't let XGBoost fan out threads too.
+    model.set_params(n_jobs=1)
+    _worker_predictor, _ = load_predictor(model, engine, compiled_max_rows)
+
+
+def _ping() -> bool:
+    return _worker_predictor is not None
+
+
+def _predict_rows(X: np.ndarray) -> np.ndarray:
+    return _worker_predictor.predict_proba(X)[:, 1].astype(np.float32)
+
+
+def _predict_shared(in_name: str, out_name: str, shape, start: int, stop: int) -> int:
+    shm_in = shared_memory.SharedMemory(name=in_name)
+    shm_out = shared_memory.SharedMemory(name=out_name)
+    try:
+        X = np.ndarray(shape, dtype=np.float32, buffer=shm_in.buf)
+        out = np.ndarray((shape[0],), dtype=np.float32, buffer=shm_out.buf)
+        out[start:stop] = _worker_predictor.predict_proba(X[start:stop])[:, 1]
+        del X, out
+    finally:
+        shm_in.close()
+        shm_out.close()
+    return stop - start
+
+
+class ScoringPool:
+    def __init__(
+        self,
+        workers: int,
+        model_path: str,
+        fallback: Callable[[np.ndarray], np.ndarray],
+        engine: str = "xgboost",
+        compiled_max_rows: int = 8,
+        shared_min_rows: int = 64,
+    ):
+        self.workers = workers
+        self.model_path = model_path
+        self.fallback = fallback
+        self.engine = engine
+        self.compiled_max_rows = compiled_max_rows
+        self.shared_min_rows = shared_min_rows
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.degraded_reason: Optional[str] = None
+
+        # stats
+        self.pool_calls = 0
+        self.pool_rows = 0
+        self.fallback_calls = 0
+
+    @property
+    def active(self) -> bool:
+        return self._executor is not None
+
+    def start(self):
+        if self.workers <= 0 or self._executor is not None:
+            return
+        try:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=mp.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.model_path, self.engine, self.compiled_max_rows),
+            )
+            # Spawn and warm every worker up front rather than on first request.
+            futures = [self._executor.submit(_ping) for _ in range(self.workers)]
+            for f in futures:
+                f.result(timeout=120)
+        except Exception as e:
+            self._degrade(f"pool start failed: {e}")
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _degrade(self, reason: str):
+        print(f"Scoring pool disabled, scoring in-process ({reason})")
+        self.degraded_reason = reason
+        self.shutdown()
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """
+        Probability of the positive class for each row of X. Blocking and
+        thread-safe; async callers should go through run_in_threadpool.
+        """
+        executor = self._executor
+        if executor is None or len(X) == 0:
+            self.fallback_calls += 1
+            return self.fallback(X)
+
+        try:
+            if len(X) < self.shared_min_rows:
+                probs = executor.submit(_predict_rows, X).result()
+            else:
+                probs = self._predict_shared(executor, X)
+        except (BrokenProcessPool, RuntimeError, OSError) as e:
+            self._degrade(f"{type(e).__name__}: {e}")
+            self.fallback_calls += 1
+            return self.fallback(X)
+
+        self.pool_calls += 1
+        self.pool_rows += len(X)
+        return probs
+
+    def _predict_shared(self, executor: ProcessPoolExecutor, X: np.ndarray) -> np.ndarray:
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_rows = X.shape[0]
+
+        shm_in = shared_memory.SharedMemory(create=True, size=X.nbytes)
+        shm_out = shared_memory.SharedMemory(create=True, size=n_rows * 4)
+        try:
+            np.ndarray(X.shape, dtype=np.float32, buffer=shm_in.buf)[:] = X
+
+            step = -(-n_rows // self.workers)
+            futures = [
+                executor.submit(
+                    _predict_shared, shm_in.name, shm_out.name, X.shape,
+                    start, min(start + step, n_rows),
+                )
+                for start in range(0, n_rows, step)
+            ]
+            for f in futures:
+                f.result()
+
+            return np.ndarray((n_rows,), dtype=np.float32, buffer=shm_out.buf).copy()
+        finally:
+            shm_in.close()
+            shm_in.unlink()
+            shm_out.close()
+            shm_out.unlink()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "active": self.active,
+            "degraded_reason": self.degraded_reason,
+            "pool_calls": self.pool_calls,
+            "pool_rows": self.pool_rows,
+            "fallback_calls": self.fallback_calls,
+        }
+
+
+if __name__ == "__main__":
+    # Throughput vs. worker count on random rows: python scoring_pool.py
+    import os
+
+    MODEL_PATH = "model/xgb_fraud_model.joblib"
+    model = joblib.load(MODEL_PATH)
+    n_features = model.get_booster().num_features()
+    X = np.random.default_rng(0).normal(size=(20000, n_features)).astype(np.float32)
+
+    def in_process(X):
+        return model.predict_proba(X)[:, 1]
+
+    counts = sorted({1, 2, 4, os.cpu_count() or 1})
+    for workers in counts:
+        pool = ScoringPool(workers, MODEL_PATH, fallback=in_process)
+        pool.start()
+        start = time.perf_counter()
+        for chunk in np.array_split(X, 40):
+            pool.predict(chunk)
+        elapsed = time.perf_counter() - start
+        print(f"workers={workers}: {len(X) / elapsed:,.0f} rows/sec")
+        pool.shutdown()
@@ -0,0 +1,281 @@
+import asyncio
+import fcntl
+import json
+import os
+import time
+from typing import Dict, Any, Awaitable, Callable, List, Optional, Set, Tuple
+
+# ---------------------------------------------
+# Broadcast / State Bus
+# ---------------------------------------------
+# Everything that changes shared dashboard state (scored events, analyst
+# actions) is published on the bus and applied by a handler in every
+# worker process, so each worker's event store, KPI windows and websocket
+# clients see the same stream no matter which worker produced or received it.
+#
+# Backends:
+#   local - single process; publish() calls the handler directly.
+#   unix  - several workers on one host (uvicorn --workers N). Workers race
+#           for an exclusive flock on lock_path; the winner is the producer:
+#           it runs the replay loop and hosts a Unix-socket hub that relays
+#           every published message, in one order, to all workers (itself
+#           included). The others connect as followers; if the producer
+#           dies its lock is released and a follower takes over.
+#
+# A follower that connects (or reconnects) first receives the producer's
+# snapshot() messages, taken and queued in the same step that adds it to the
+# fan-out, so it starts from the producer's state with no gap or overlap
+# before the live messages; nobody waits for new traffic to converge.
+#
+# Wire format: one JSON object per line, {"ch": channel, "msg": {...}}.
+
+Handler = Callable[[str, Dict[str, Any]], Awaitable[None]]
+Elected = Callable[[], Awaitable[None]]
+Snapshot = Callable[[], List[Tuple[str, Dict[str, Any]]]]
+
+BUSES = ("local", "unix")
+LINE_LIMIT = 1 << 20
+
+
+class LocalBus:
+    name = "local"
+
+    def __init__(self):
+        self.is_producer = False
+        self._handler: Optional[Handler] = None
+        self.published = 0
+
+    async def start(self, handler: Handler, on_elected: Elected, snapshot: Optional[Snapshot] = None):
+        self._handler = handler
+        self.is_producer = True
+        await on_elected()
+
+    @property
+    def connected(self) -> bool:
+        return True
+
+    async def stop(self):
+        pass
+
+    async def publish(self, channel: str, msg: Dict[str, Any]) -> bool:
+        self.published += 1
+        await self._handler(channel, msg)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, "producer": self.is_producer, "published": self.published}
+
+
+class UnixSocketBus:
+    name = "unix"
+
+    def __init__(
+        self,
+        socket_path: str,
+        lock_path: str,
+        retry_sec: float = 0.5,
+        max_peer_buffer: int = 8 << 20,
+    ):
+        self.socket_path = socket_path
+        self.lock_path = lock_path
+        self.retry_sec = retry_sec
+        self.max_peer_buffer = max_peer_buffer
+
+        self.is_producer = False
+        self._handler: Optional[Handler] = None
+        self._on_elected: Optional[Elected] = None
+        self._snapshot: Optional[Snapshot] = None
+        self._lock_fd: Optional[int] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._peers: Set[asyncio.StreamWriter] = set()
+        self._upstream: Optional[asyncio.StreamWriter] = None
+        self._task: Optional[asyncio.Task] = None
+        self._ready = asyncio.Event()
+        self._stopping = False
+
+        # stats
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.peers_dropped = 0
+        self.peers_synced = 0
+        self.reconnects = 0
+        self.elected_at: Optional[float] = None
+
+    @property
+    def connected(self) -> bool:
+        return self.is_producer or self._upstream is not None
+
+    async def start(self, handler: Handler, on_elected: Elected, snapshot: Optional[Snapshot] = None, wait_sec: float = 5.0):
+        """
+        Returns once this worker is the producer or connected to it (or
+        wait_sec passed). snapshot() is called on the producer for every
+        follower that connects; its messages go to that follower only.
+        """
+        self._handler = handler
+        self._on_elected = on_elected
+        self._snapshot = snapshot
+        self._task = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(self._ready.wait(), wait_sec)
+        except asyncio.TimeoutError:
+            print(f"State bus: no producer reachable at {self.socket_path} yet; retrying in the background")
+
+    async def stop(self):
+        self._stopping = True
+        if self._task is not None:
+            self._task.cancel()
+        if self._server is not None:
+            self._server.close()
+        for w in list(self._peers) + ([self._upstream] if self._upstream else []):
+            w.close()
+        await asyncio.sleep(0)  # let connection handlers see EOF and exit
+        if self._lock_fd is not None:
+            try:
+                os.remove(self.socket_path)
+            except FileNotFoundError:
+                pass
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    # -------- election --------
+    def _try_lock(self) -> bool:
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._lock_fd = fd
+        return True
+
+    async def _run(self):
+        while not self._stopping:
+            if self._try_lock():
+                await self._lead()
+                return
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.socket_path, limit=LINE_LIMIT)
+            except OSError:
+                # Lock holder has not opened the socket yet, or just died.
+                await asyncio.sleep(self.retry_sec)
+                continue
+
+            self._upstream = writer
+            self._ready.set()
+            try:
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    await self._deliver(line)
+            except (OSError, ValueError) as e:
+                print(f"State bus: producer connection lost ({e})")
+            finally:
+                self._upstream = None
+                writer.close()
+            self.reconnects += 1
+            await asyncio.sleep(self.retry_sec)
+
+    async def _lead(self):
+        # The socket file is stale: whoever created it no longer holds the lock.
+        try:
+            os.remove(self.socket_path)
+        except FileNotFoundError:
+            pass
+        self._server = await asyncio.start_unix_server(self._serve, path=self.socket_path, limit=LINE_LIMIT)
+        self.is_producer = True
+        self.elected_at = time.time()
+        print(f"State bus: worker {os.getpid()} elected producer")
+        self._ready.set()
+        await self._on_elected()
+
+    # -------- hub (producer) --------
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # No await between the snapshot and joining the fan-out.
+        if self._snapshot is not None:
+            try:
+                for channel, msg in self._snapshot():
+                    writer.write(_line(channel, msg))
+                self.peers_synced += 1
+            except Exception as e:
+                print(f"State bus: snapshot for a new follower failed: {e}")
+        self._peers.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                await self._fanout(line)
+        except (OSError, ValueError):
+            pass
+        finally:
+            self._peers.discard(writer)
+            writer.close()
+
+    async def _fanout(self, line: bytes):
+        for w in list(self._peers):
+            # A follower that stopped reading is cut off rather than buffered
+            # without bound; it reconnects and carries on from live messages.
+            if w.transport.get_write_buffer_size() > self.max_peer_buffer:
+                self._peers.discard(w)
+                w.close()
+                self.peers_dropped += 1
+                continue
+            w.write(line)
+        await self._deliver(line)
+
+    async def _deliver(self, line: bytes):
+        envelope = json.loads(line)
+        self.delivered += 1
+        try:
+            await self._handler(envelope["ch"], envelope["msg"])
+        except Exception as e:
+            print(f"State bus handler failed on {envelope.get('ch')}: {e}")
+
+    # -------- publish (any worker) --------
+    async def publish(self, channel: str, msg: Dict[str, Any]) -> bool:
+        """
+        False if no producer is reachable; followers apply their own
+        messages when the hub echoes them back.
+        """
+        line = _line(channel, msg)
+        if self.is_producer:
+            await self._fanout(line)
+        elif self._upstream is not None:
+            self._upstream.write(line)
+        else:
+            self.dropped += 1
+            return False
+        self.published += 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "pid": os.getpid(),
+            "producer": self.is_producer,
+            "connected": self.connected,
+            "followers": len(self._peers) if self.is_producer else None,
+            "elected_at": self.elected_at,
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "followers_dropped": self.peers_dropped,
+            "followers_synced": self.peers_synced,
+            "reconnects": self.reconnects,
+        }
+
+
+def _line(channel: str, msg: Dict[str, Any]) -> bytes:
+    return (json.dumps({"ch": channel, "msg": msg}, separators=(",", ":")) + "\n").encode()
+
+
+def make_bus(backend: str, socket_path: str, lock_path: str):
+    if backend == "unix":
+        return UnixSocketBus(socket_path, lock_path)
+    if backend != "local":
+        raise ValueError(f"Unknown STATE_BUS {backend!r}; expected one of {BUSES}")
+    return LocalBus()
@@ -0,0 +1,21 @@
+import asyncio
+
+from embedding_cache import EmbeddingCache
+
+
+def test_async_disk_tier_round_trip(tmp_path):
+    path = str(tmp_path / "embeddings.db")
+
+    async def run():
+        cache = EmbeddingCache(disk_path=path)
+        await cache.aput("Card  testing", "m", [1.0, 2.0])
+        await asyncio.gather(*cache._writes)
+
+        fresh = EmbeddingCache(disk_path=path)
+        hit = await fresh.aget("card testing", "m")
+        miss = await fresh.aget("card testing", "other-model")
+        return hit, miss, fresh.stats()
+
+    hit, miss, stats = asyncio.run(run())
+    assert hit.tolist() == [1.0, 2.0] and miss is None
+    assert stats["disk_hits"] == 1 and stats["misses"] == 1
@@ -0,0 +1,59 @@
+import random
+
+from event_log import EventLog
+
+
+def make_event(i, ts):
+    return {
+        "event_id": f"{i:05d}",
+        "ts": ts,
+        "risk_band": random.choice(["LOW", "MEDIUM", "HIGH"]),
+        "decision": "ALLOW",
+        "fraud_probability": 0.1,
+        "latency_ms": 1.0,
+    }
+
+
+def page_all(log, **kwargs):
+    rows, cursor = log.query(**kwargs)
+    out = list(rows)
+    while cursor is not None:
+        rows, cursor = log.query(cursor=cursor, **kwargs)
+        out.extend(rows)
+    return out
+
+
+def test_page_boundary_on_segment_boundary(tmp_path):
+    log = EventLog(str(tmp_path))
+    for i in range(10):
+        log.append_event(make_event(i, 1000.0 + i))
+        if i == 4:
+            log.flush()
+    log.flush()
+
+    rows, cursor = log.query(limit=5)
+    assert [r["event_id"] for r in rows] == ["00009", "00008", "00007", "00006", "00005"]
+    assert cursor is not None
+    assert [r["event_id"] for r in page_all(log, limit=5)] == [f"{i:05d}" for i in range(9, -1, -1)]
+
+
+def test_paging_matches_brute_force(tmp_path):
+    for seed in range(20):
+        random.seed(seed)
+        log = EventLog(str(tmp_path / str(seed)), compact_min_segments=3, compact_target_rows=40)
+        events = []
+        ts = 1000.0
+        for i in range(random.randint(20, 120)):
+            ts += random.choice([0.0, 0.001, 0.5])  # ties exercise the event_id tiebreak
+            events.append(make_event(i, ts))
+            log.append_event(events[-1])
+            if random.random() < 0.15:
+                log.flush()  # flushes also compact runs of small segments
+
+        expected = sorted(events, key=lambda e: (e["ts"], e["event_id"]), reverse=True)
+        limit = random.randint(1, 15)
+        got = page_all(log, limit=limit)
+        assert [r["event_id"] for r in got] == [e["event_id"] for e in expected], seed
+
+        high = [e["event_id"] for e in expected if e["risk_band"] == "HIGH"]
+        assert [r["event_id"] for r in page_all(log, limit=limit, risk_bands=["HIGH"])] == high, seed
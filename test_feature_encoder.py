@@ -0,0 +1,58 @@
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from feature_encoder import FeatureEncoder
+
+MODEL_PATH = "model/xgb_fraud_model.joblib"
+COLS_PATH = "model/feature_columns.joblib"
+DATA_PATH = "data/transactions.csv"
+CAT_COLS = ["payment_type", "employment_status", "housing_status", "source", "device_os"]
+
+model = joblib.load(MODEL_PATH)
+feature_columns = joblib.load(COLS_PATH)
+encoder = FeatureEncoder(feature_columns, CAT_COLS)
+
+
+def load_replay_rows():
+    if not os.path.exists(DATA_PATH):
+        import pytest
+        pytest.skip(f"{DATA_PATH} not available")
+    df = pd.read_csv(DATA_PATH)
+    return df.drop(columns=["fraud_bool"], errors="ignore")
+
+
+def reference_matrix(df):
+    # The encoding the model was trained on: get_dummies over the whole frame.
+    for c in CAT_COLS:
+        if c not in df.columns:
+            df[c] = "unknown"
+    X = pd.get_dummies(df, columns=CAT_COLS, drop_first=True)
+    return X.reindex(columns=feature_columns, fill_value=0)
+
+
+def test_encoder_parity():
+    df = load_replay_rows()
+    expected = model.predict_proba(reference_matrix(df.copy()))[:, 1]
+
+    rows = df.to_dict(orient="records")
+    batch = model.predict_proba(encoder.encode_many(rows))[:, 1]
+    assert np.array_equal(batch, expected)
+
+    single = np.array(
+        [model.predict_proba(encoder.encode_one(r))[0][1] for r in rows[:500]],
+        dtype=expected.dtype,
+    )
+    assert np.array_equal(single, expected[:500])
+
+
+def test_unknown_category_is_reference_level():
+    row = {c: "never-seen" for c in CAT_COLS}
+    X = encoder.encode_one(row)
+    assert not X.any()
+
+
+if __name__ == "__main__":
+    test_encoder_parity()
@@ -0,0 +1,43 @@
+import threading
+
+import numpy as np
+
+from historical_cases import HistoricalCaseStore, historical_cases_store, load_vectors, save_vectors
+
+
+def fake_embed(texts):
+    return [np.full(8, len(t), dtype=np.float32) for t in texts]
+
+
+def test_embeddings_persist_and_reload(tmp_path):
+    path = str(tmp_path / "cases.npy")
+    assert HistoricalCaseStore(historical_cases_store).ensure_embeddings(fake_embed, "m", path) == 10
+    assert HistoricalCaseStore(historical_cases_store).ensure_embeddings(fake_embed, "m", path) == 0
+    assert HistoricalCaseStore(historical_cases_store).ensure_embeddings(fake_embed, "other", path) == 10
+
+
+def test_old_format_is_ignored(tmp_path):
+    path = str(tmp_path / "cases.npy")
+    np.save(path, np.ones((10, 8), dtype=np.float32))
+    assert load_vectors(path) == {}
+
+
+def test_concurrent_writers_leave_a_consistent_pair(tmp_path):
+    path = str(tmp_path / "cases.npy")
+
+    def write(n):
+        for _ in range(20):
+            keys = [f"{n}-{i}" for i in range(n)]
+            save_vectors(path, keys, np.full((n, 4), n, dtype=np.float32))
+
+    threads = [threading.Thread(target=write, args=(n,)) for n in (3, 5, 7)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    stored = load_vectors(path)
+    n = len(stored)
+    assert n in (3, 5, 7)
+    assert all(k.startswith(f"{n}-") and (v == n).all() for k, v in stored.items())
+    assert [p.name for p in tmp_path.iterdir()] == ["cases.npy"]
@@ -0,0 +1,62 @@
+import numpy as np
+
+from kpi_engine import KPIEngine, LatencySketch
+
+T0 = 1_700_000_000.0
+
+
+def brute_force(events, now, width):
+    """Exact window stats over raw (ts, band, latency) samples."""
+    tail = int(now) - width + 1
+    window = [(ts, band, lat) for ts, band, lat in events if tail <= int(ts) <= int(now)]
+    lat = np.array([e[2] for e in window])
+    high = sum(1 for e in window if e[1] == "HIGH")
+    medium = sum(1 for e in window if e[1] == "MEDIUM")
+    return len(window), high, medium, lat
+
+
+def test_windows_match_brute_force_as_buckets_evict():
+    rng = np.random.default_rng(0)
+    engine = KPIEngine()
+    events = []
+    ts = T0
+    for _ in range(5000):
+        ts += float(rng.exponential(1.5))  # ~2 hours, gaps included
+        band = rng.choice(["LOW", "MEDIUM", "HIGH"], p=[0.8, 0.15, 0.05])
+        latency = float(rng.lognormal(1.0, 0.8))
+        engine.record(ts, band, latency)
+        events.append((ts, band, latency))
+
+    for now in (ts, ts + 30, ts + 400, ts + 2000, ts + 3599, ts + 3600):
+        for name, width in engine.windows.items():
+            got = engine.window(name, now)
+            count, high, medium, lat = brute_force(events, now, width)
+            assert got["txn_count"] == count
+            assert got["alerts"] == high + medium
+            if count:
+                assert got["avg_latency_ms"] == round(float(lat.sum()) / count, 2)
+                assert got["high_risk_pct"] == round(high / count * 100, 2)
+            else:
+                assert got["avg_latency_ms"] == 0.0
+
+
+def test_long_gap_resets_every_window():
+    engine = KPIEngine()
+    engine.record(T0, "HIGH", 5.0)
+    engine.record(T0 + 10_000, "LOW", 1.0)
+    for name in engine.windows:
+        assert engine.window(name, T0 + 10_000)["txn_count"] == 1
+
+
+def test_percentiles_within_sketch_error_bound():
+    sketch = LatencySketch()
+    bound = (sketch.gamma - 1) / 2 + 1e-9
+    rng = np.random.default_rng(1)
+    for samples in (rng.lognormal(1.0, 1.0, 20000), rng.uniform(0.5, 250.0, 20000)):
+        engine = KPIEngine(windows={"1m": 60}, sketch=sketch)
+        for lat in samples:
+            engine.record(T0, "LOW", float(lat))
+        got = engine.window("1m", T0)
+        for q, key in ((0.50, "latency_p50_ms"), (0.95, "latency_p95_ms"), (0.99, "latency_p99_ms")):
+            exact = float(np.quantile(samples, q, method="lower"))
+            assert abs(got[key] - exact) / exact <= bound + 0.005, (key, got[key], exact)
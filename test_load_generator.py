@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from load_generator import LoadGenerator
+
+T0 = 1_700_000_000.0
+
+
+class FakeClock:
+    """Time only moves when the generator sleeps or scoring takes time."""
+
+    def __init__(self, stop_after):
+        self.now = T0
+        self.stop_at = T0 + stop_after
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, sec):
+        self.now += sec
+        if self.now > self.stop_at:
+            raise asyncio.CancelledError
+
+
+def drive(gen, clock, n_rows=100, score_sec=0.0):
+    published = []
+
+    async def score_rows(idx):
+        clock.now += score_sec
+        return [{"row": int(i)} for i in idx]
+
+    async def publish(j, scored):
+        published.append(j)
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(gen.run(n_rows, score_rows, publish))
+    return published
+
+
+def test_constant_rate_accounting():
+    clock = FakeClock(stop_after=10.0)
+    gen = LoadGenerator(target_eps=100.0, tick_ms=250.0, clock=clock, sleep=clock.sleep)
+    published = drive(gen, clock, n_rows=300)
+
+    assert gen.generated == gen.published == len(published) == 1000
+    assert gen.dropped == 0 and gen.backlog == 0
+    assert published[:3] == [0, 1, 2] and published[300] == 0  # cycles through the rows
+
+    clock.now = T0 + 10.0
+    stats = gen.stats()
+    assert stats["running_sec"] == 10.0
+    assert stats["achieved_eps"] == 100.0
+    assert stats["scoring_lag_ms"]["max"] == 0.0
+
+
+def test_ramp_rate_follows_elapsed_time():
+    clock = FakeClock(stop_after=20.0)
+    gen = LoadGenerator(profile="ramp", target_eps=100.0, ramp_start_eps=0.0, ramp_sec=10.0,
+                        tick_ms=250.0, clock=clock, sleep=clock.sleep)
+    drive(gen, clock)
+
+    # Ramp half (0 -> 100 over 10s) averages 50 eps, then 10s at 100 eps.
+    assert abs(gen.generated - 1500) <= 1
+    clock.now = T0 + 5.0
+    assert gen.stats()["target_eps"] == 50.0
+
+
+def test_slow_scoring_drops_stale_events_and_reports_lag():
+    clock = FakeClock(stop_after=30.0)
+    gen = LoadGenerator(target_eps=100.0, tick_ms=250.0, max_batch=20, max_lag_sec=2.0,
+                        clock=clock, sleep=clock.sleep)
+    drive(gen, clock, score_sec=0.5)
+
+    assert gen.dropped > 0
+    assert gen.generated == gen.published + gen.dropped + gen.backlog
+    assert gen.batches * 20 == gen.published
+    # Nothing older than max_lag_sec is scored, so lag is bounded by it plus one batch.
+    assert gen.max_lag_ms <= (2.0 + 0.5) * 1000
+    assert gen.stats()["achieved_eps"] < 100.0
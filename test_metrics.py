@@ -0,0 +1,21 @@
+from metrics import Histogram, Gauge, render
+
+
+def test_histogram_buckets_are_cumulative():
+    h = Histogram("test_latency_seconds", "test", ["stage"], buckets=(0.01, 0.1, 1.0))
+    for v in (0.005, 0.05, 0.05, 5.0):
+        h.observe(v, "embed")
+
+    lines = render([h]).splitlines()
+    assert 'test_latency_seconds_bucket{stage="embed",le="0.01"} 1' in lines
+    assert 'test_latency_seconds_bucket{stage="embed",le="0.1"} 3' in lines
+    assert 'test_latency_seconds_bucket{stage="embed",le="1.0"} 3' in lines
+    assert 'test_latency_seconds_bucket{stage="embed",le="+Inf"} 4' in lines
+    assert 'test_latency_seconds_count{stage="embed"} 4' in lines
+
+
+def test_gauge_reads_callback_at_scrape():
+    clients = {"tick": 2}
+    g = Gauge("test_clients", "test", lambda: {(m,): n for m, n in clients.items()}, ["mode"])
+    clients["tick"] = 3
+    assert 'test_clients{mode="tick"} 3.0' in render([g]).splitlines()
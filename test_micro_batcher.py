@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+from micro_batcher import MicroBatcher
+
+
+def score(rows):
+    return [{"double": 2 * float(r["x"])} for r in rows]
+
+
+def test_bad_row_fails_alone():
+    async def run():
+        batcher = MicroBatcher(score, max_wait_ms=20, max_batch_size=8)
+        batcher.start()
+        results = await asyncio.gather(
+            batcher.submit({"x": 1}),
+            batcher.submit({"x": "abc"}),
+            batcher.submit({"x": 3}),
+            return_exceptions=True,
+        )
+        stats = batcher.stats()
+        await batcher.stop()
+        return results, stats
+
+    (ok1, bad, ok3), stats = asyncio.run(run())
+    assert ok1 == {"double": 2.0} and ok3 == {"double": 6.0}
+    assert isinstance(bad, ValueError)
+    assert stats["batches"] == 1 and stats["batch_failures"] == 1 and stats["errors"] == 1
+
+
+def test_stop_fails_pending_callers():
+    async def run():
+        batcher = MicroBatcher(score, max_wait_ms=10_000, max_batch_size=8)
+        batcher.start()
+        pending = asyncio.ensure_future(batcher.submit({"x": 1}))
+        await asyncio.sleep(0.01)
+        await batcher.stop()
+        with pytest.raises(RuntimeError):
+            await asyncio.wait_for(pending, 1)
+
+    asyncio.run(run())
+
+
+def test_batch_size_histogram_is_cumulative():
+    batcher = MicroBatcher(score)
+    for size in (1, 3, 3, 40):
+        batcher._record([(None, None, 0.0)] * size, 0.0)
+    hist = batcher.stats()["batch_size_histogram"]
+    assert hist["le_1"] == 1 and hist["le_4"] == 3 and hist["le_64"] == 4 and hist["le_+Inf"] == 4
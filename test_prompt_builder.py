@@ -0,0 +1,59 @@
+from prompt_builder import CHAT_OVERHEAD_TOKENS, PromptBuilder, Section
+from tokens import count_tokens
+
+TEMPLATE = "Question: why?\n{rules}\n{cases}\nAnswer briefly."
+
+
+def render(**parts):
+    return TEMPLATE.format(**parts)
+
+
+def entry(tag, i, words=30):
+    # Distinct vocabulary per entry so nothing is deduped by accident.
+    return f"{tag}{i}: " + " ".join(f"{tag}{i}w{j}" for j in range(words))
+
+
+def sections(n_rules=20, n_cases=20):
+    return {
+        "rules": Section("Rules:", "No rules.", [(float(i), entry("rule", i)) for i in range(n_rules)]),
+        "cases": Section("Cases:", "No cases.", [(float(i), entry("case", i)) for i in range(n_cases)]),
+    }
+
+
+def test_prompt_fits_budget_with_chat_overhead():
+    for budget in (120, 300, 800):
+        prompt, stats = PromptBuilder(budget_tokens=budget).build(render, sections())
+        assert stats["prompt_tokens"] == count_tokens(prompt)
+        assert stats["prompt_tokens"] + CHAT_OVERHEAD_TOKENS <= budget
+        assert prompt.startswith("Question: why?") and prompt.endswith("Answer briefly.")
+
+
+def test_best_entries_first_and_sections_take_turns():
+    one = count_tokens(entry("rule", 19)) + 1
+    base = count_tokens(render(rules="No rules.", cases="No cases."))
+    # Room for roughly two entries per section, well short of all forty.
+    budget = base + CHAT_OVERHEAD_TOKENS + 4 * one + 2 * count_tokens("Rules:") + 5
+    prompt, stats = PromptBuilder(budget_tokens=budget, item_max_tokens=1000).build(render, sections())
+
+    assert stats["sections"]["rules"]["used"] >= 2 and stats["sections"]["cases"]["used"] >= 2
+    assert abs(stats["sections"]["rules"]["used"] - stats["sections"]["cases"]["used"]) <= 1
+    for tag in ("rule", "case"):
+        assert f"{tag}19: " in prompt and f"{tag}18: " in prompt
+        assert f"{tag}0: " not in prompt
+    assert prompt.index("rule19: ") < prompt.index("rule18: ")
+
+
+def test_duplicates_dropped_and_long_entries_truncated():
+    long_text = entry("long", 0, words=400)
+    rules = Section("Rules:", "No rules.", [
+        (0.9, entry("rule", 1, words=5)),
+        (0.8, entry("rule", 1, words=5)),  # duplicate of the best
+        (0.7, long_text),
+    ])
+    cases = Section("Cases:", "No cases.", [])
+    prompt, stats = PromptBuilder(budget_tokens=4000, item_max_tokens=50).build(render, {"rules": rules, "cases": cases})
+
+    assert stats["sections"]["rules"]["duplicates"] == 1
+    assert stats["sections"]["rules"]["truncated"] == 1
+    assert stats["sections"]["rules"]["used"] == 2
+    assert "No cases." in prompt and long_text not in prompt
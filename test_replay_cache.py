@@ -0,0 +1,61 @@
+import itertools
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+
+import replay_cache
+from feature_encoder import FeatureEncoder
+from replay_cache import load_or_build
+
+CAT_COLS = ["payment_type", "employment_status", "housing_status", "source", "device_os"]
+
+
+def encoder():
+    return FeatureEncoder(joblib.load("model/feature_columns.joblib"), CAT_COLS)
+
+
+def sample_csv(path, start, n):
+    with open("data/transactions.csv", encoding="utf-8") as src, open(path, "w", encoding="utf-8") as out:
+        out.write(next(src))
+        out.writelines(itertools.islice(src, start, start + n))
+
+
+def test_mmap_rows_match_encode_many(tmp_path, monkeypatch):
+    monkeypatch.setattr(replay_cache, "CHUNK_ROWS", 64)  # several chunks, one partial
+    csv = str(tmp_path / "t.csv")
+    sample_csv(csv, 0, 250)
+    enc = encoder()
+
+    ds = load_or_build(csv, str(tmp_path / "cache"), enc)
+    df = pd.read_csv(csv)
+    expected = enc.encode_many(df.drop(columns=["fraud_bool"], errors="ignore").to_dict("records"))
+
+    assert len(ds) == len(df) == 250
+    np.testing.assert_array_equal(ds.rows(np.arange(len(ds))), expected)
+    idx = np.array([249, 3, 64, 128])
+    np.testing.assert_array_equal(ds.rows(idx), expected[idx])
+    if "fraud_bool" in df.columns:
+        np.testing.assert_array_equal(np.asarray(ds.fraud), df["fraud_bool"].to_numpy())
+    assert ds.display(5)["source"] == df["source"][5]
+
+
+def test_changed_csv_rebuilds_cache(tmp_path):
+    csv = str(tmp_path / "t.csv")
+    cache_dir = str(tmp_path / "cache")
+    enc = encoder()
+
+    sample_csv(csv, 0, 50)
+    first = load_or_build(csv, cache_dir, enc)
+    first_rows = first.rows(np.arange(len(first)))
+    again = load_or_build(csv, cache_dir, enc)
+    assert len(os.listdir(cache_dir)) == 1  # unchanged CSV reuses the cache
+
+    sample_csv(csv, 50, 80)
+    rebuilt = load_or_build(csv, cache_dir, enc)
+    assert len(os.listdir(cache_dir)) == 2
+    assert len(rebuilt) == 80
+    expected = enc.encode_many(pd.read_csv(csv).drop(columns=["fraud_bool"], errors="ignore").to_dict("records"))
+    np.testing.assert_array_equal(rebuilt.rows(np.arange(80)), expected)
+    np.testing.assert_array_equal(again.rows(np.arange(50)), first_rows)
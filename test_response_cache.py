@@ -0,0 +1,44 @@
+import os
+
+import numpy as np
+
+from response_cache import SemanticResponseCache, write_kb_version
+
+
+def make_cache(tmp_path, **kwargs):
+    path = str(tmp_path / "kb_version")
+    write_kb_version(path)
+    return SemanticResponseCache(kb_version_path=path, **kwargs), path
+
+
+def test_similar_query_with_same_context_hits(tmp_path):
+    cache, _ = make_cache(tmp_path, threshold=0.95)
+    cache.put("explain|fast|txn-1", [1.0, 0.0, 0.0], {"answer": "a"})
+
+    assert cache.get("explain|fast|txn-1", [1.0, 0.02, 0.0]) == {"answer": "a"}
+    assert cache.stats()["hits"] == 1
+
+
+def test_other_context_or_dissimilar_query_misses(tmp_path):
+    cache, _ = make_cache(tmp_path, threshold=0.95)
+    cache.put("explain|fast|txn-1", [1.0, 0.0, 0.0], {"answer": "a"})
+
+    assert cache.get("explain|fast|txn-2", [1.0, 0.0, 0.0]) is None
+    assert cache.get("explain|fast|txn-1", [0.0, 1.0, 0.0]) is None
+    assert cache.stats()["misses"] == 2 and cache.stats()["hits"] == 0
+
+
+def test_kb_version_change_clears_cache(tmp_path):
+    cache, path = make_cache(tmp_path)
+    cache.put("search|q", np.ones(4), {"results": [1]})
+    assert cache.get("search|q", np.ones(4)) is not None
+    before = cache.stats()["kb_version"]
+
+    write_kb_version(path)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    assert cache.get("search|q", np.ones(4)) is None
+    stats = cache.stats()
+    assert stats["kb_version"] != before
+    assert stats["items"] == 0 and stats["invalidations"] == 1
@@ -0,0 +1,95 @@
+import numpy as np
+
+from vector_index import LocalVectorIndex, build
+
+
+def make_index(path, n=300, dims=64):
+    rng = np.random.default_rng(0)
+    docs = [
+        {
+            "id": str(i),
+            "title": f"doc {i}",
+            "type": "rule" if i % 2 else "incident",
+            "severity": i % 5 + 1,
+            "tags": ["velocity"] if i % 3 == 0 else ["device"],
+        }
+        for i in range(n)
+    ]
+    vectors = rng.normal(size=(n, dims)).astype(np.float32)
+    build(docs, vectors, str(path))
+    return LocalVectorIndex(str(path)), docs, vectors
+
+
+def test_top_k_matches_brute_force(tmp_path):
+    index, docs, vectors = make_index(tmp_path / "idx")
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    q = np.random.default_rng(1).normal(size=vectors.shape[1]).astype(np.float32)
+
+    expected = np.argsort(-(unit @ (q / np.linalg.norm(q))))[:5]
+    got = index.search(q, k=5)
+    assert [d["id"] for d in got] == [docs[i]["id"] for i in expected]
+    scores = [d["@search.score"] for d in got]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_filter_and_select(tmp_path):
+    index, docs, vectors = make_index(tmp_path / "idx")
+    got = index.search(
+        vectors[0], k=10,
+        filter="type eq 'rule' and severity ge 4 and tags/any(t: t eq 'velocity')",
+        select=["id", "severity"],
+    )
+    assert got
+    for d in got:
+        src = docs[int(d["id"])]
+        assert src["type"] == "rule" and src["severity"] >= 4 and "velocity" in src["tags"]
+        assert set(d) == {"id", "severity", "@search.score"}
+
+
+def test_rag_engine_reloads_rebuilt_index(tmp_path, monkeypatch):
+    import pytest
+    import rag_engine
+
+    monkeypatch.setattr(rag_engine, "LOCAL_INDEX_PATH", str(tmp_path / "idx"))
+    monkeypatch.setattr(rag_engine, "KB_VERSION_PATH", str(tmp_path / "kb_version"))
+    monkeypatch.setattr(rag_engine, "RETRIEVAL_BACKEND", "local")
+    monkeypatch.setattr(rag_engine, "embeddings_deployment", "")
+    rag_engine._clients.pop("local_index", None)
+
+    _, _, vectors = make_index(tmp_path / "idx", n=10)
+    assert len(rag_engine.retrieve_docs(vectors[0], k=20)) == 10
+
+    _, _, vectors = make_index(tmp_path / "idx", n=4)
+    assert len(rag_engine.retrieve_docs(vectors[0], k=20)) == 4
+
+    with pytest.raises(rag_engine.RAGUnavailable):
+        rag_engine.retrieve_docs(vectors[0][:32])
+    rag_engine._clients.pop("local_index", None)
+
+
+def test_rebuild_never_exposes_a_partial_index(tmp_path):
+    import threading
+
+    path = tmp_path / "idx"
+    make_index(path, n=5)
+    errors = []
+    done = threading.Event()
+
+    def read():
+        while not done.is_set():
+            try:
+                index = LocalVectorIndex(str(path))
+                assert len(index.docs) == index.vectors.shape[0] == index.meta["n_docs"]
+            except Exception as e:
+                errors.append(e)
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    for n in range(6, 40):
+        make_index(path, n=n)
+    done.set()
+    reader.join()
+
+    assert not errors
+    assert len(LocalVectorIndex(str(path))) == 39
+    assert len(list(tmp_path.glob("idx.v*"))) == 2  # current + previous
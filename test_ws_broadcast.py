@@ -0,0 +1,75 @@
+import asyncio
+
+from ws_broadcast import Broadcaster
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+        self.closed = False
+
+    async def send_text(self, text):
+        self.sent.append(text)
+
+    async def close(self):
+        self.closed = True
+
+
+def fill(policy, offers, max_queue=4):
+    """Queue offers (kind, text) on a client whose sender never runs."""
+    async def run():
+        hub = Broadcaster(max_queue=max_queue, policy=policy)
+        ws = FakeWebSocket()
+        conn = hub.add(ws)
+        for kind, text in offers:
+            conn.offer(text, kind)
+        await asyncio.sleep(0)
+        return conn, ws
+    return asyncio.run(run())
+
+
+def test_drop_oldest_only_drops_kpi_messages():
+    conn, ws = fill("drop_oldest", [
+        ("tick", "t1"), ("explain_chunk", "c1"), ("tick", "t2"), ("explain_chunk", "c2"),
+        ("explain_chunk", "c3"), ("tick", "t3"),
+    ])
+    assert [text for text, _ in conn.queue] == ["c1", "c2", "c3", "t3"]
+    assert conn.dropped == 2 and not conn.closed
+
+
+def test_coalesce_keeps_newest_kpi_message():
+    conn, ws = fill("coalesce", [
+        ("tick", "t1"), ("explain_chunk", "c1"), ("tick", "t2"), ("tick", "t3"), ("tick", "t4"),
+    ])
+    assert [text for text, _ in conn.queue] == ["c1", "t4"]
+    assert conn.dropped == 3 and not conn.closed
+
+
+def test_full_queue_of_non_kpi_messages_disconnects():
+    for policy in ("drop_oldest", "coalesce"):
+        conn, ws = fill(policy, [("explain_chunk", f"c{i}") for i in range(5)])
+        assert conn.closed and conn.slow and ws.closed
+        assert conn.dropped == 0
+
+
+def test_disconnect_policy():
+    conn, ws = fill("disconnect", [("tick", f"t{i}") for i in range(5)])
+    assert conn.closed and conn.slow and ws.closed
+    assert conn.dropped == 0
+
+
+def test_idle_mode_expires_its_replay_buffer():
+    async def run():
+        hub = Broadcaster(resume_grace_sec=0.0)
+        conn = hub.add(FakeWebSocket(), mode="tick")
+        await hub.broadcast({"type": "tick"}, mode="tick")
+        hub.remove(conn)
+        assert hub.history["tick"] and not hub.wants("tick")
+        assert hub.history["tick"]  # wants() is a pure check
+
+        seq = hub.seq["tick"]
+        assert not hub.expire_idle("tick")
+        assert not hub.history["tick"] and hub.seq["tick"] == seq + 1
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
@@ -0,0 +1,43 @@
+# ---------------------------------------------
+# Token Counting
+# ---------------------------------------------
+# Exact counts with tiktoken (cl100k_base, used by the Azure OpenAI chat and
+# embedding models; listed in requirements.txt). If it cannot be imported or
+# its encoding cannot be loaded, counts fall back to an estimate of 3 UTF-8
+# bytes per token. English text averages ~4 bytes per token, so budgets
+# built on the estimate usually err on the short side, but it is not a
+# bound: digits, code and non-Latin text can take more tokens than that.
+# Either way these are text counts; chat-format overhead is reserved by the
+# caller (see prompt_builder.py).
+
+try:
+    import tiktoken
+
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _encoding = None
+
+FALLBACK_BYTES_PER_TOKEN = 3
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return -(-len(text.encode("utf-8")) // FALLBACK_BYTES_PER_TOKEN)
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to at most max_tokens, on a word boundary where possible."""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    if _encoding is not None:
+        cut = _encoding.decode(_encoding.encode(text, disallowed_special=())[:max_tokens - 1])
+    else:
+        cut = text.encode("utf-8")[:(max_tokens - 1) * FALLBACK_BYTES_PER_TOKEN].decode("utf-8", errors="ignore")
+    if " " in cut:
+        cut = cut.rsplit(" ", 1)[0]
+    return cut.rstrip() + "…"
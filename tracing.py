@@ -0,0 +1,109 @@
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, List, Optional, Tuple
+
+# ---------------------------------------------
+# Per-Request Stage Tracing
+# ---------------------------------------------
+# TraceMiddleware opens a Trace for every HTTP request; code on the request
+# path wraps its stages in `with span("name"):`. The context variable follows
+# the request into awaited coroutines, gathered tasks and threadpool calls,
+# and outside a request span() is a single ContextVar lookup.
+#
+# The spans are sent back in a Server-Timing header (durations summed per
+# stage name, with a count when a stage ran more than once), and requests
+# slower than slow_ms are kept with their spans for /admin/traces.
+# Spans that finish after the response headers (streaming bodies) are
+# recorded in the kept trace but not in the header.
+
+_current: ContextVar[Optional["Trace"]] = ContextVar("trace", default=None)
+
+
+class Trace:
+    __slots__ = ("start", "spans")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans: List[Tuple[str, float, float]] = []  # (name, offset sec, duration sec)
+
+    def summary(self) -> List[Tuple[str, float, int]]:
+        """(name, total ms, count) in order of first start."""
+        totals: Dict[str, List[float]] = {}
+        for name, _, dur in sorted(self.spans, key=lambda s: s[1]):
+            entry = totals.setdefault(name, [0.0, 0])
+            entry[0] += dur * 1000.0
+            entry[1] += 1
+        return [(name, ms, int(n)) for name, (ms, n) in totals.items()]
+
+    def server_timing(self) -> str:
+        parts = []
+        for name, ms, n in self.summary():
+            parts.append(f'{name};dur={ms:.2f}' + (f';desc="x{n}"' if n > 1 else ""))
+        parts.append(f"total;dur={(time.perf_counter() - self.start) * 1000.0:.2f}")
+        return ", ".join(parts)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "spans": [
+                {"name": name, "start_ms": round(offset * 1000.0, 3), "ms": round(dur * 1000.0, 3)}
+                for name, offset, dur in sorted(self.spans, key=lambda s: s[1])
+            ],
+        }
+
+
+def current() -> Optional[Trace]:
+    return _current.get()
+
+
+@contextmanager
+def span(name: str):
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        trace.spans.append((name, start - trace.start, end - start))
+
+
+class TraceMiddleware:
+    """Plain ASGI middleware (no BaseHTTPMiddleware buffering)."""
+
+    def __init__(self, app, slow_ms: float = 500.0, keep: Optional[deque] = None):
+        self.app = app
+        self.slow_ms = slow_ms
+        self.slow = keep if keep is not None else deque(maxlen=100)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace()
+        token = _current.set(trace)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", trace.server_timing().encode("latin-1")))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            total_ms = (time.perf_counter() - trace.start) * 1000.0
+            if total_ms >= self.slow_ms:
+                self.slow.append({
+                    "ts": time.time(),
+                    "method": scope.get("method"),
+                    "path": scope.get("path"),
+                    "total_ms": round(total_ms, 2),
+                    **trace.to_dict(),
+                })
@@ -1,13 +1,13 @@
 import csv
 
-def load_csv(path):
-    rows = []
+def iter_csv(path):
+    """Yield KB rows one at a time, so large files never sit in memory."""
     with open(path, newline="", encoding="utf-8") as f:
         reader = csv.DictReader(f)
         for r in reader:
             tags_list = r["tags"].split(";") if r["tags"] else []
             content = f"{r['title']}. {r['description']}. Tags: {', '.join(tags_list)}."
-            rows.append({
+            yield {
                 "id": r["id"],
                 "type": r["type"],
                 "title": r["title"],
@@ -16,8 +16,10 @@ def load_csv(path):
                 "severity": int(r["severity"]),
                 "created_at": r["created_at"],
                 "content": content
-            })
-    return rows
+            }
+
+def load_csv(path):
+    return list(iter_csv(path))
 
 if __name__ == "__main__":
     data = load_csv("data/rag_knowledge_base.csv")
@@ -0,0 +1,208 @@
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from typing import Dict, Any, List, Optional, Sequence, Callable
+
+import numpy as np
+
+# ---------------------------------------------
+# Local In-Process Vector Index
+# ---------------------------------------------
+# Retrieval backend for knowledge bases small enough to hold in RAM. The
+# document embeddings are stored L2-normalized as one contiguous float32
+# matrix and memory-mapped at load, so top-k is a single matrix-vector
+# product plus argpartition. Results look like Azure Search results: the
+# selected fields plus "@search.score" (1 / (1 + cosine distance), the same
+# scale Azure uses for cosine vector fields).
+#
+# On disk, <path> is a symlink to a versioned directory <path>.v<ns>-<id>:
+#   vectors.npy  float32 (n_docs, dims), unit rows
+#   docs.json    document fields (everything except the vector)
+#   meta.json    embeddings deployment, dims, doc count
+# A rebuild writes a new version and swaps the symlink with os.replace, so
+# readers always find a complete index. The previous version is kept until
+# the next rebuild. Loading resolves the symlink once; a load that loses its
+# version to pruning (two rebuilds in quick succession) retries on the new one.
+#
+# Filters accept the subset of OData that the KB fields need:
+#   severity ge 3 and type eq 'rule'
+#   tags/any(t: t eq 'velocity')
+# clauses joined with "and"; anything else raises ValueError.
+
+VECTOR_FIELD = "contentVector"
+DOC_FIELDS = ["id", "title", "description", "tags", "type", "severity", "created_at"]
+
+
+def _unit_rows(vectors) -> np.ndarray:
+    m = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return m / norms
+
+
+def build(docs: Sequence[Dict[str, Any]], vectors, path: str, deployment: str = ""):
+    """
+    Write an index for docs[i] <-> vectors[i]. Replaces any existing index
+    at path atomically (see the layout note above).
+    """
+    matrix = _unit_rows(vectors)
+    if matrix.ndim != 2 or matrix.shape[0] != len(docs):
+        raise ValueError(f"Expected {len(docs)} vectors, got shape {matrix.shape}")
+
+    fields = [{k: v for k, v in d.items() if k not in (VECTOR_FIELD, "content")} for d in docs]
+
+    parent, base = os.path.split(os.path.abspath(path))
+    version = f"{base}.v{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+    target = os.path.join(parent, version)
+    os.makedirs(target)
+    np.save(os.path.join(target, "vectors.npy"), matrix)
+    with open(os.path.join(target, "docs.json"), "w", encoding="utf-8") as f:
+        json.dump(fields, f)
+    with open(os.path.join(target, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"deployment": deployment, "dims": int(matrix.shape[1]), "n_docs": len(fields)}, f)
+
+    previous = None
+    if os.path.islink(path):
+        previous = os.readlink(path)
+    elif os.path.isdir(path):
+        # One-time move from the plain-directory layout.
+        previous = f"{base}.v0-legacy"
+        os.replace(path, os.path.join(parent, previous))
+
+    link = os.path.join(parent, f".{base}.{uuid.uuid4().hex[:8]}.link")
+    os.symlink(version, link)
+    os.replace(link, path)
+
+    for name in os.listdir(parent):
+        if name.startswith(f"{base}.v") and name not in (version, previous):
+            shutil.rmtree(os.path.join(parent, name), ignore_errors=True)
+
+
+class LocalVectorIndex:
+    def __init__(self, path: str):
+        self.path = path
+        # One version for all three files, even if a rebuild swaps path
+        # meanwhile; if that version was pruned mid-load, take the new one.
+        while True:
+            root = os.path.realpath(path)
+            try:
+                self._load(root)
+                break
+            except FileNotFoundError:
+                if os.path.realpath(path) == root:
+                    raise
+
+        # filter string -> boolean mask over docs (the index is immutable)
+        self._masks: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def _load(self, root: str):
+        with open(os.path.join(root, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        with open(os.path.join(root, "docs.json"), encoding="utf-8") as f:
+            self.docs: List[Dict[str, Any]] = json.load(f)
+        self.vectors = np.load(os.path.join(root, "vectors.npy"), mmap_mode="r")
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def _mask(self, filter: str) -> np.ndarray:
+        mask = self._masks.get(filter)
+        if mask is None:
+            predicate = parse_filter(filter)
+            mask = np.fromiter((predicate(d) for d in self.docs), dtype=bool, count=len(self.docs))
+            with self._lock:
+                self._masks[filter] = mask
+        return mask
+
+    def search(
+        self,
+        query_vector,
+        k: int = 3,
+        filter: Optional[str] = None,
+        select: Optional[Sequence[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        if not self.docs or k <= 0:
+            return []
+
+        q = np.asarray(query_vector, dtype=np.float32)
+        norm = float(np.linalg.norm(q))
+        sims = self.vectors @ (q / norm if norm else q)
+
+        if filter:
+            candidates = np.flatnonzero(self._mask(filter))
+            sims = sims[candidates]
+        else:
+            candidates = None
+
+        k = min(k, len(sims))
+        if k == 0:
+            return []
+        top = np.argpartition(-sims, k - 1)[:k] if k < len(sims) else np.arange(len(sims))
+        top = top[np.argsort(-sims[top], kind="stable")]
+
+        results = []
+        for j in top:
+            doc = self.docs[int(candidates[j]) if candidates is not None else int(j)]
+            out = {f: doc.get(f) for f in select} if select else dict(doc)
+            out["@search.score"] = 1.0 / (2.0 - float(sims[j]))
+            results.append(out)
+        return results
+
+
+# ---------------------------------------------
+# OData filter subset
+# ---------------------------------------------
+_LITERAL = r"'(?:[^']|'')*'|-?\d+(?:\.\d+)?|true|false|null"
+_COMPARE = re.compile(rf"\s*(\w+)\s+(eq|ne|gt|ge|lt|le)\s+({_LITERAL})\s*", re.IGNORECASE)
+_ANY = re.compile(rf"\s*(\w+)/any\(\s*(\w+)\s*:\s*\2\s+eq\s+({_LITERAL})\s*\)\s*", re.IGNORECASE)
+_AND = re.compile(r"and\b", re.IGNORECASE)
+
+_OPS: Dict[str, Callable[[Any, Any], bool]] = {
+    "eq": lambda a, b: a == b,
+    "ne": lambda a, b: a != b,
+    "gt": lambda a, b: a is not None and a > b,
+    "ge": lambda a, b: a is not None and a >= b,
+    "lt": lambda a, b: a is not None and a < b,
+    "le": lambda a, b: a is not None and a <= b,
+}
+
+
+def _literal(token: str) -> Any:
+    if token.startswith("'"):
+        return token[1:-1].replace("''", "'")
+    lowered = token.lower()
+    if lowered in ("true", "false"):
+        return lowered == "true"
+    if lowered == "null":
+        return None
+    return float(token) if "." in token else int(token)
+
+
+def parse_filter(expr: str) -> Callable[[Dict[str, Any]], bool]:
+    clauses = []
+    pos = 0
+    while True:
+        m = _ANY.match(expr, pos)
+        if m:
+            field, value = m.group(1), _literal(m.group(3))
+            clauses.append(lambda d, f=field, v=value: v in (d.get(f) or ()))
+        else:
+            m = _COMPARE.match(expr, pos)
+            if not m:
+                raise ValueError(f"Unsupported filter expression: {expr!r}")
+            field, op, value = m.group(1), _OPS[m.group(2).lower()], _literal(m.group(3))
+            clauses.append(lambda d, f=field, op=op, v=value: op(d.get(f), v))
+        pos = m.end()
+        if pos == len(expr):
+            break
+        m = _AND.match(expr, pos)
+        if not m:
+            raise ValueError(f"Unsupported filter expression: {expr!r}")
+        pos = m.end()
+
+    return lambda doc: all(c(doc) for c in clauses)
@@ -0,0 +1,285 @@
+import asyncio
+import json
+import time
+import uuid
+from collections import deque
+from typing import Dict, Any, Optional, Set
+
+from fastapi import WebSocket
+
+from metrics import Histogram, Counter
+
+# ---------------------------------------------
+# Websocket Fan-Out
+# ---------------------------------------------
+# Each payload is serialized once and offered to every client's bounded send
+# queue; a per-client task drains the queue, so one slow dashboard never
+# holds up the replay loop or the other clients.
+#
+# Slow-consumer policies when a client's queue is full:
+#   drop_oldest - discard the oldest queued KPI-carrying message (tick/frame)
+#   coalesce    - discard every queued KPI-carrying message in favour of the
+#                 newest one; for other messages, behave like drop_oldest
+#   disconnect  - close the client
+# Only ticks and frames are ever discarded: each one supersedes the KPIs of
+# the last. Anything else (explain streams, action updates, spikes) is never
+# dropped silently; a queue full of them closes the client, which then
+# reconnects and resumes or gets a fresh snapshot.
+#
+# Every broadcast message carries a per-mode sequence number ("seq") and is
+# kept in a bounded per-mode replay buffer, so a reconnecting client can ask
+# for just what it missed (resume) instead of a full snapshot. A mode keeps
+# producing for resume_grace_sec after its last client leaves; past that the
+# buffer is dropped and old sequence numbers can no longer resume.
+
+BROADCAST_SECONDS = Histogram(
+    "fraud_ws_broadcast_seconds", "Serializing one payload and queueing it for every client.", ["type"])
+SEND_SECONDS = Histogram(
+    "fraud_ws_send_seconds", "Per-client websocket send latency.", ["mode"])
+DROPPED_MESSAGES = Counter(
+    "fraud_ws_dropped_messages_total", "Messages discarded from full client queues.", ["mode"])
+
+POLICIES = {"drop_oldest", "coalesce", "disconnect"}
+COALESCABLE = {"tick", "frame"}
+MODES = ("tick", "frame")
+
+
+def dumps(payload: Dict[str, Any]) -> str:
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+
+
+class ClientConnection:
+    def __init__(self, ws: WebSocket, max_queue: int, policy: str, send_timeout: float, mode: str = "tick"):
+        self.ws = ws
+        self.mode = mode
+        self.max_queue = max_queue
+        self.policy = policy
+        self.send_timeout = send_timeout
+
+        self.queue: deque = deque()
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._close_task: Optional[asyncio.Task] = None
+        self.closed = False
+        self.slow = False
+
+        # stats
+        self.sent = 0
+        self.dropped = 0
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def offer(self, text: str, kind: Optional[str] = None):
+        if self.closed:
+            return
+
+        if len(self.queue) >= self.max_queue:
+            if self.policy == "coalesce" and kind in COALESCABLE:
+                kept = deque(item for item in self.queue if item[1] not in COALESCABLE)
+                self._count_dropped(len(self.queue) - len(kept))
+                self.queue = kept
+            elif self.policy != "disconnect":
+                oldest = next((i for i, item in enumerate(self.queue) if item[1] in COALESCABLE), None)
+                if oldest is not None:
+                    del self.queue[oldest]
+                    self._count_dropped(1)
+            if len(self.queue) >= self.max_queue:
+                self.slow = True
+                self.close()
+                return
+
+        self.queue.append((text, kind))
+        self._ready.set()
+
+    def _count_dropped(self, n: int):
+        if n:
+            DROPPED_MESSAGES.inc(self.mode, amount=n)
+            self.dropped += n
+
+    async def _run(self):
+        try:
+            while not self.closed:
+                if not self.queue:
+                    self._ready.clear()
+                    await self._ready.wait()
+                    continue
+                text, _ = self.queue.popleft()
+                start = time.perf_counter()
+                await asyncio.wait_for(self.ws.send_text(text), timeout=self.send_timeout)
+                SEND_SECONDS.observe(time.perf_counter() - start, self.mode)
+                self.sent += 1
+        except Exception:
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.clear()
+        self._ready.set()
+        # Held on self so the task is not garbage-collected before it runs.
+        self._close_task = asyncio.create_task(self._close_ws())
+
+    async def _close_ws(self):
+        try:
+            await self.ws.close()
+        except Exception:
+            pass
+
+
+class Broadcaster:
+    def __init__(
+        self,
+        max_queue: int = 256,
+        policy: str = "drop_oldest",
+        send_timeout: float = 5.0,
+        replay_max: int = 1024,
+        resume_grace_sec: float = 60.0,
+    ):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown slow-client policy: {policy}")
+        self.max_queue = max_queue
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self.resume_grace_sec = resume_grace_sec
+        self.clients: Set[ClientConnection] = set()
+
+        # Sequence numbers restart with the process; stream_id tells clients apart.
+        self.stream_id = uuid.uuid4().hex[:12]
+        self.seq: Dict[str, int] = {m: 0 for m in MODES}
+        self.history: Dict[str, deque] = {m: deque(maxlen=replay_max) for m in MODES}  # (seq, text, kind)
+        self._last_client_at: Dict[str, float] = {m: 0.0 for m in MODES}
+
+        # stats
+        self.broadcasts = 0
+        self.dropped_total = 0
+        self.disconnected_slow = 0
+        self.resumed = 0
+        self.resume_misses = 0
+
+    def __len__(self) -> int:
+        return len(self.clients)
+
+    def count(self, mode: Optional[str] = None) -> int:
+        if mode is None:
+            return len(self.clients)
+        return sum(1 for c in self.clients if c.mode == mode)
+
+    def wants(self, mode: str) -> bool:
+        """
+        Whether messages for this mode should be produced: a client is
+        connected, or one left recently enough to resume.
+        """
+        return bool(self.count(mode)) or time.time() - self._last_client_at[mode] < self.resume_grace_sec
+
+    def expire_idle(self, mode: str) -> bool:
+        """
+        wants(), and if the mode is idle past the grace period, drop its
+        replay buffer; the gap in seq makes any older resume fall back to a
+        snapshot.
+        """
+        if self.wants(mode):
+            return True
+        if self.history[mode]:
+            self.history[mode].clear()
+            self.seq[mode] += 1
+        return False
+
+    def add(self, ws: WebSocket, mode: str = "tick") -> ClientConnection:
+        """
+        Register a client. Messages broadcast from now on are queued; the
+        sender task starts with conn.start(), so a snapshot can be sent first.
+        mode is the client's stream format: "tick" (per event) or "frame".
+        """
+        self.expire_idle(mode)  # before anyone resumes from a stale buffer
+        conn = ClientConnection(ws, self.max_queue, self.policy, self.send_timeout, mode)
+        self.clients.add(conn)
+        self._last_client_at[mode] = time.time()
+        return conn
+
+    def replay(self, conn: ClientConnection, since: int) -> bool:
+        """
+        Queue the buffered messages after `since` for a freshly added client
+        (call before conn.start(), with no await since add()). Returns False
+        if the buffer no longer reaches back that far, or the backlog would
+        overflow the client's queue.
+        """
+        history = self.history[conn.mode]
+        current = self.seq[conn.mode]
+        oldest = history[0][0] if history else current + 1
+        if since > current or since + 1 < oldest or current - since > conn.max_queue:
+            return False
+        for seq, text, kind in history:
+            if seq > since:
+                conn.offer(text, kind)
+        return True
+
+    def resume(self, conn: ClientConnection, since: int, stream_id: Optional[str] = None) -> bool:
+        """replay() for a reconnecting client's ?since=, counted in stats."""
+        ok = stream_id in (None, self.stream_id) and self.replay(conn, since)
+        if ok:
+            self.resumed += 1
+        else:
+            self.resume_misses += 1
+        return ok
+
+    def remove(self, conn: ClientConnection):
+        if conn in self.clients:
+            self.clients.discard(conn)
+            self.dropped_total += conn.dropped
+            self._last_client_at[conn.mode] = time.time()
+        conn.close()
+
+    async def broadcast(self, payload: Dict[str, Any], mode: Optional[str] = None):
+        """
+        Send to every client, or only to clients of the given stream mode.
+        Each mode gets its own sequence number and replay buffer entry.
+        """
+        start = time.perf_counter()
+        kind = payload.get("type")
+        self.broadcasts += 1
+
+        texts = {}
+        for m in (mode,) if mode is not None else MODES:
+            if not self.expire_idle(m):
+                continue
+            self.seq[m] += 1
+            text = dumps(dict(payload, seq=self.seq[m]))
+            self.history[m].append((self.seq[m], text, kind))
+            texts[m] = text
+
+        dead = []
+        for conn in self.clients:
+            text = texts.get(conn.mode)
+            if text is None:
+                continue
+            conn.offer(text, kind)
+            if conn.closed:
+                dead.append(conn)
+        for conn in dead:
+            if conn.slow:
+                self.disconnected_slow += 1
+            self.remove(conn)
+        BROADCAST_SECONDS.observe(time.perf_counter() - start, kind or "")
+
+    def stats(self) -> Dict[str, Any]:
+        queued = [len(c.queue) for c in self.clients]
+        return {
+            "clients": len(self.clients),
+            "clients_by_mode": {m: self.count(m) for m in MODES},
+            "policy": self.policy,
+            "max_queue": self.max_queue,
+            "broadcasts": self.broadcasts,
+            "queued_total": sum(queued),
+            "queued_max": max(queued) if queued else 0,
+            "dropped_total": self.dropped_total + sum(c.dropped for c in self.clients),
+            "disconnected_slow": self.disconnected_slow,
+            "stream_id": self.stream_id,
+            "seq": dict(self.seq),
+            "replay_buffered": {m: len(h) for m, h in self.history.items()},
+            "resumed": self.resumed,
+            "resume_misses": self.resume_misses,
+        }